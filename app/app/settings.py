@@ -36,6 +36,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'core.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -70,14 +72,110 @@ WSGI_APPLICATION = 'app.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'core.backends.postgresql_pool',
         'HOST': os.environ.get('DB_HOST'),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
-        'PASSWORD': os.environ.get('DB_PASS')
+        'PASSWORD': os.environ.get('DB_PASS'),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': bool(
+            int(os.environ.get('DB_CONN_HEALTH_CHECKS', 1))
+        ),
+        'POOL': None,
     }
 }
 
+if int(os.environ.get('DB_POOL', 0)):
+    # Pooled connections go back to the pool at the end of each request.
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['POOL'] = {
+        'MAX_SIZE': int(os.environ.get('DB_POOL_MAX_SIZE', 4)),
+        'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 5)),
+        'MAX_LIFETIME': int(os.environ.get('DB_POOL_MAX_LIFETIME', 1800)),
+        'MAX_IDLE': int(os.environ.get('DB_POOL_MAX_IDLE', 600)),
+        'CHECK_AFTER': float(os.environ.get('DB_POOL_CHECK_AFTER', 0)),
+    }
+
+# Read replicas, e.g. DB_REPLICA_HOSTS=replica1,replica2
+DATABASE_REPLICAS = []
+for index, host in enumerate(
+    filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(','))
+):
+    alias = f'replica_{index}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# The pin keeping a user on the primary after a write must be visible to
+# every worker, so replicas require a shared cache (see core.routers).
+REPLICA_ROUTING = {
+    'STICKY_SECONDS': int(os.environ.get('DB_REPLICA_STICKY_SECONDS', 5)),
+    'CACHE_ALIAS': os.environ.get('DB_REPLICA_CACHE_ALIAS', 'recipe'),
+    'HEALTH_CHECK_INTERVAL': int(
+        os.environ.get('DB_REPLICA_HEALTH_CHECK_INTERVAL', 10)
+    ),
+}
+
+
+# Caches
+
+# LocMemCache is private to each process: fine for a single process, but
+# with several uWSGI workers every worker caches separately. Set a shared
+# backend such as Redis or Memcached in production (see recipe/cache.py).
+RECIPE_CACHE_BACKEND = os.environ.get(
+    'RECIPE_CACHE_BACKEND',
+    'django.core.cache.backends.locmem.LocMemCache',
+)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'recipe': {
+        'BACKEND': RECIPE_CACHE_BACKEND,
+        'LOCATION': os.environ.get('RECIPE_CACHE_LOCATION', 'recipe-api'),
+        'TIMEOUT': int(os.environ.get('RECIPE_CACHE_TTL', 300)),
+        'KEY_PREFIX': 'recipe-api',
+    },
+}
+
+if RECIPE_CACHE_BACKEND.endswith('LocMemCache'):
+    CACHES['recipe']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.environ.get('RECIPE_CACHE_MAX_ENTRIES', 5000)),
+    }
+
+RECIPE_CACHE_ENABLED = bool(int(os.environ.get('RECIPE_CACHE_ENABLED', 1)))
+
+AUTH_TOKEN_CACHE = {
+    'LOCAL_MAX_SIZE': int(os.environ.get('AUTH_TOKEN_CACHE_SIZE', 1024)),
+    'LOCAL_TTL': int(os.environ.get('AUTH_TOKEN_CACHE_LOCAL_TTL', 5)),
+    'SHARED_ALIAS': os.environ.get('AUTH_TOKEN_CACHE_ALIAS', ''),
+    'SHARED_TTL': int(os.environ.get('AUTH_TOKEN_CACHE_TTL', 60)),
+}
+
+
+METRICS = {
+    'ENABLED': bool(int(os.environ.get('METRICS_ENABLED', 1))),
+    # Required as a bearer token on /metrics when set
+    'TOKEN': os.environ.get('METRICS_TOKEN', ''),
+}
+
+REQUEST_PROFILING = {
+    'ENABLED': bool(int(os.environ.get('REQUEST_PROFILING', 0))),
+    'SAMPLE_RATE': float(
+        os.environ.get('REQUEST_PROFILING_SAMPLE_RATE', 0.01)
+    ),
+    'SLOW_MS': float(os.environ.get('REQUEST_PROFILING_SLOW_MS', 1000)),
+    'SERVER_TIMING': bool(
+        int(os.environ.get('REQUEST_PROFILING_SERVER_TIMING', 1))
+    ),
+}
+
 
 # Password validation
 
@@ -97,6 +195,19 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Admission control for the user API: at most HOST_SLOTS sign-ins, signups
+# and password changes hash at once per machine, see core.hashing
+PASSWORD_HASHING = {
+    'ENABLED': bool(int(os.environ.get('PASSWORD_HASHING_ADMISSION', 1))),
+    'HOST_SLOTS': int(os.environ.get('PASSWORD_HASHING_HOST_SLOTS', 2)),
+    'LOCK_DIR': os.environ.get(
+        'PASSWORD_HASHING_LOCK_DIR',
+        '/tmp/password-hashing',
+    ),
+    'RETRY_AFTER': int(os.environ.get('PASSWORD_HASHING_RETRY_AFTER', 1)),
+}
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/3.2/topics/i18n/
 
@@ -120,6 +231,22 @@ MEDIA_URL = '/static/media/'
 MEDIA_ROOT = '/vol/web/media/'
 STATIC_ROOT = '/vol/web/static/'
 
+# Media is sent by nginx from this internal location, see recipe.media
+MEDIA_X_ACCEL = {
+    'ENABLED': bool(int(
+        os.environ.get('MEDIA_X_ACCEL_REDIRECT', int(not DEBUG))
+    )),
+    'LOCATION': os.environ.get('MEDIA_X_ACCEL_LOCATION', '/protected-media/'),
+}
+
+IMAGE_UPLOAD = {
+    'MAX_BYTES': int(
+        os.environ.get('IMAGE_UPLOAD_MAX_BYTES', 10 * 1024 * 1024)
+    ),
+    'MAX_PIXELS': int(os.environ.get('IMAGE_UPLOAD_MAX_PIXELS', 40000000)),
+    'DRAFT_SIZE': int(os.environ.get('IMAGE_UPLOAD_DRAFT_SIZE', 2048)),
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
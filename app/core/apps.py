@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from django.core import checks
+
+        from core import signals  # noqa: F401
+        from core.routers import check_pin_cache
+
+        checks.register(check_pin_cache, checks.Tags.caches)
@@ -0,0 +1,124 @@
+"""
+Token authentication with a cached token to user lookup
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from rest_framework.authentication import TokenAuthentication
+
+from core.metrics import record_cache_lookup
+
+
+class LRUCache:
+    """Thread-safe, size bounded in-process cache with a TTL"""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the value for key, or None if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Store value under key, evicting the least recently used"""
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_local_cache = None
+
+
+def _get_local_cache():
+    global _local_cache
+    if _local_cache is None:
+        options = settings.AUTH_TOKEN_CACHE
+        _local_cache = LRUCache(
+            options['LOCAL_MAX_SIZE'],
+            options['LOCAL_TTL'],
+        )
+    return _local_cache
+
+
+def _get_shared_cache():
+    alias = settings.AUTH_TOKEN_CACHE['SHARED_ALIAS']
+    return caches[alias] if alias else None
+
+
+def _shared_key(key):
+    return f'auth-token:{key}'
+
+
+def invalidate_token(key):
+    """Forget the cached user for a token key"""
+    _get_local_cache().delete(key)
+    shared = _get_shared_cache()
+    if shared is not None:
+        shared.delete(_shared_key(key))
+
+
+def clear_token_cache():
+    """Forget every token in this process's cache"""
+    _get_local_cache().clear()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that caches the token and user lookup.
+
+    Lookups hit a per-process LRU first, then the optional shared cache,
+    then the database. Entries are dropped when the token is deleted or
+    its user is saved with a new password or active flag. Other processes
+    only see the change once their local entry expires, so LOCAL_TTL
+    should stay short.
+    """
+
+    def authenticate_credentials(self, key):
+        local = _get_local_cache()
+        shared = _get_shared_cache()
+
+        cached = local.get(key)
+        if cached is None and shared is not None:
+            cached = shared.get(_shared_key(key))
+            if cached is not None:
+                local.set(key, cached)
+
+        record_cache_lookup('auth_token', cached is not None)
+        if cached is None:
+            cached = super().authenticate_credentials(key)
+            local.set(key, cached)
+            if shared is not None:
+                shared.set(
+                    _shared_key(key),
+                    cached,
+                    settings.AUTH_TOKEN_CACHE['SHARED_TTL'],
+                )
+
+        user, token = cached
+        return copy.copy(user), token
@@ -0,0 +1,120 @@
+"""
+PostgreSQL backend with connection health checks and an optional pool
+
+Settings, on top of the stock postgresql backend:
+
+- CONN_HEALTH_CHECKS: before a persistent connection is first used in a
+  request, check it with SELECT 1 and reconnect if it is broken.
+- POOL: a dict of ConnectionPool options (MAX_SIZE, TIMEOUT,
+  MAX_LIFETIME, MAX_IDLE, CHECK_AFTER), or None to disable pooling.
+  With a pool, CONN_MAX_AGE should be 0 so each request hands its
+  connection back when it finishes. Pool wait times and timeouts are
+  exported by core.metrics.
+"""
+from functools import partial
+
+import psycopg2
+from psycopg2 import extensions
+
+from django.db.backends.postgresql import base
+
+from core import metrics
+from core.backends.postgresql_pool.creation import DatabaseCreation
+from core.backends.postgresql_pool.pool import (
+    PoolTimeout,
+    get_pool,
+)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_done = False
+        self._pool = None
+
+    def _get_pool(self, conn_params):
+        options = self.settings_dict.get('POOL')
+        if not options:
+            return None
+
+        key = (self.alias,) + tuple(sorted(
+            (name, str(value)) for name, value in conn_params.items()
+        ))
+        return get_pool(
+            key,
+            max_size=options.get('MAX_SIZE', 4),
+            timeout=options.get('TIMEOUT', 5),
+            max_lifetime=options.get('MAX_LIFETIME'),
+            max_idle=options.get('MAX_IDLE'),
+            check=self._check_connection,
+            check_after=options.get('CHECK_AFTER', 0),
+            on_wait=partial(metrics.record_pool_wait, self.alias),
+            on_timeout=partial(metrics.record_pool_timeout, self.alias),
+        )
+
+    @staticmethod
+    def _check_connection(connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except psycopg2.Error:
+            return False
+        return True
+
+    def get_new_connection(self, conn_params):
+        pool = self._pool = self._get_pool(conn_params)
+        if pool is None:
+            return super().get_new_connection(conn_params)
+
+        try:
+            connection = pool.get(
+                lambda: super(DatabaseWrapper, self).get_new_connection(
+                    conn_params,
+                )
+            )
+        except PoolTimeout as error:
+            raise psycopg2.OperationalError(str(error)) from error
+
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level,
+        )
+        return connection
+
+    def _close(self):
+        pool = self._pool
+        if pool is None or self.connection is None:
+            return super()._close()
+
+        connection = self.connection
+        reusable = not connection.closed
+        if reusable and connection.info.transaction_status != \
+                extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                connection.rollback()
+            except psycopg2.Error:
+                reusable = False
+        with self.wrap_database_errors:
+            pool.put(connection, reusable)
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def ensure_connection(self):
+        if (
+            self.connection is not None
+            and self.settings_dict.get('CONN_HEALTH_CHECKS')
+            and not self.health_check_done
+            and not self.in_atomic_block
+        ):
+            if not self.is_usable():
+                self.close()
+            self.health_check_done = True
+
+        super().ensure_connection()
+
+    def connect(self):
+        super().connect()
+        self.health_check_done = True
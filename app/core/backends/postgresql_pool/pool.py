@@ -0,0 +1,222 @@
+"""
+In-process database connection pool
+
+One pool is kept per database and process. Connections are handed to
+Django when a request first touches the database and are returned when
+Django closes them at the end of the request, so a uWSGI worker keeps a
+few warm connections instead of opening a new one per request.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection became free within the pool timeout"""
+
+
+class ConnectionPool:
+    """Thread-safe, size bounded pool of DB-API connections.
+
+    `check` is called with a connection that has been idle for at least
+    `check_after` seconds before it is reused and must return False if
+    the connection is broken. Connections older than `max_lifetime` or
+    idle longer than `max_idle` seconds are closed instead of reused.
+    `on_wait` is called with the seconds every get() took and `on_timeout`
+    whenever one times out.
+    """
+
+    def __init__(self, max_size, timeout, max_lifetime=None, max_idle=None,
+                 check=None, check_after=0, on_wait=None, on_timeout=None):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.check = check
+        self.check_after = check_after
+        self.on_wait = on_wait
+        self.on_timeout = on_timeout
+        self.pid = os.getpid()
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._created_at = {}
+        self._size = 0
+        self._stats = {
+            'acquired': 0,
+            'created': 0,
+            'discarded': 0,
+            'waits': 0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+            'timeouts': 0,
+        }
+
+    def _expired(self, connection, now):
+        if self.max_lifetime is None:
+            return False
+        return now - self._created_at[id(connection)] >= self.max_lifetime
+
+    def _discard(self, connection):
+        """Close a connection and free its slot. Call with the lock held."""
+        self._created_at.pop(id(connection), None)
+        self._size -= 1
+        self._stats['discarded'] += 1
+        self._cond.notify()
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _record_wait(self, started):
+        waited = time.monotonic() - started
+        self._stats['acquired'] += 1
+        if self.on_wait is not None:
+            self.on_wait(waited)
+        if waited > 0.001:
+            self._stats['waits'] += 1
+            self._stats['wait_seconds_total'] += waited
+            self._stats['wait_seconds_max'] = max(
+                self._stats['wait_seconds_max'], waited,
+            )
+
+    def _take_idle(self, now):
+        """Pop a reusable idle connection. Call with the lock held."""
+        while self._idle:
+            connection, last_used = self._idle.pop()
+            idle_for = now - last_used
+            if self._expired(connection, now) or (
+                self.max_idle is not None and idle_for >= self.max_idle
+            ):
+                self._discard(connection)
+                continue
+            return connection, idle_for
+
+        return None, None
+
+    def get(self, connect):
+        """Return a connection, opening one with connect() if needed"""
+        started = time.monotonic()
+        deadline = started + self.timeout
+
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    connection, idle_for = self._take_idle(now)
+                    if connection is not None:
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        if self.on_timeout is not None:
+                            self.on_timeout()
+                        logger.warning(
+                            'No database connection free after %.1fs '
+                            '(pool size %d)', self.timeout, self.max_size,
+                        )
+                        raise PoolTimeout(
+                            f'No database connection free after '
+                            f'{self.timeout}s'
+                        )
+                    self._cond.wait(remaining)
+
+            if connection is None:
+                try:
+                    connection = connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._created_at[id(connection)] = time.monotonic()
+                    self._stats['created'] += 1
+                    self._record_wait(started)
+                return connection
+
+            if self.check is not None and idle_for >= self.check_after \
+                    and not self.check(connection):
+                with self._cond:
+                    self._discard(connection)
+                continue
+
+            with self._cond:
+                self._record_wait(started)
+            return connection
+
+    def put(self, connection, reusable=True):
+        """Return a connection to the pool, or close it if not reusable"""
+        with self._cond:
+            if id(connection) not in self._created_at:
+                connection.close()
+                return
+            if not reusable or self._expired(connection, time.monotonic()):
+                self._discard(connection)
+                return
+            self._idle.append((connection, time.monotonic()))
+            self._cond.notify()
+
+    def close(self):
+        """Close every idle connection"""
+        with self._cond:
+            while self._idle:
+                connection, _ = self._idle.pop()
+                self._discard(connection)
+
+    def stats(self):
+        """Return the pool's size and counters"""
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'max_size': self.max_size,
+                **self._stats,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, **options):
+    """Return the pool for key in this process, creating it if needed.
+
+    Pools inherited across a fork are dropped without closing their
+    connections, since the sockets still belong to the parent.
+    """
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.pid != os.getpid():
+            pool = _pools[key] = ConnectionPool(**options)
+        return pool
+
+
+def close_pools(alias=None):
+    """Close the idle connections of every pool, or only alias's pools"""
+    with _pools_lock:
+        pools = [
+            pool for key, pool in _pools.items()
+            if alias is None or key[0] == alias
+        ]
+    for pool in pools:
+        pool.close()
+
+
+def pool_stats():
+    """Return the stats of every pool in this process, by alias"""
+    with _pools_lock:
+        items = list(_pools.items())
+    stats = {}
+    for key, pool in items:
+        stats.setdefault(key[0], []).append(pool.stats())
+    return stats
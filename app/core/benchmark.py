@@ -0,0 +1,307 @@
+"""
+Helpers for seeding data and timing queries in benchmarks
+"""
+import math
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import (
+    Counter,
+    defaultdict,
+)
+from decimal import Decimal
+from uuid import uuid4
+
+from django.contrib.auth import (
+    get_user_model,
+    hashers,
+)
+
+from rest_framework.authtoken.models import Token
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+)
+
+
+WORDS = (
+    'spicy sweet sour smoky crispy creamy fresh roasted grilled baked '
+    'steamed tangy herby zesty rich light quick slow classic rustic'
+).split()
+
+
+def _sentence(rng, words):
+    """Return a random sentence of `words` words"""
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def _chunks(total, size):
+    """Yield the sizes of consecutive chunks that add up to total"""
+    while total > 0:
+        yield min(total, size)
+        total -= size
+
+
+def seed_recipes(user, recipes, tags, ingredients, tags_per_recipe=3,
+                 ingredients_per_recipe=5, batch_size=2000, rng=None):
+    """Bulk create recipes, tags and ingredients for one user.
+
+    Rows are inserted in batches of `batch_size` so memory stays flat for
+    large seeds, and each recipe is linked to a random sample of the
+    user's tags and ingredients. Returns the number of recipes created.
+    """
+    rng = rng or random.Random(0)
+
+    Tag.objects.bulk_create(
+        [Tag(user=user, name=f'tag-{i}') for i in range(tags)],
+        batch_size=batch_size,
+    )
+    Ingredient.objects.bulk_create(
+        [Ingredient(user=user, name=f'ingredient-{i}')
+         for i in range(ingredients)],
+        batch_size=batch_size,
+    )
+    tag_ids = list(
+        Tag.objects.filter(user=user).values_list('id', flat=True)
+    )
+    ingredient_ids = list(
+        Ingredient.objects.filter(user=user).values_list('id', flat=True)
+    )
+
+    RecipeTag = Recipe.tags.through
+    RecipeIngredient = Recipe.ingredients.through
+    last_id = Recipe.objects.filter(user=user).order_by('-id') \
+        .values_list('id', flat=True).first() or 0
+
+    for size in _chunks(recipes, batch_size):
+        Recipe.objects.bulk_create([
+            Recipe(
+                user=user,
+                title=_sentence(rng, 3).title(),
+                description=_sentence(rng, 40),
+                time_minutes=rng.randint(5, 180),
+                price=Decimal(rng.randint(100, 9999)) / 100,
+            )
+            for _ in range(size)
+        ])
+        recipe_ids = list(
+            Recipe.objects.filter(user=user, id__gt=last_id)
+            .order_by('id').values_list('id', flat=True)
+        )
+        last_id = recipe_ids[-1]
+
+        RecipeTag.objects.bulk_create([
+            RecipeTag(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in rng.sample(
+                tag_ids, min(tags_per_recipe, len(tag_ids))
+            )
+        ], batch_size=batch_size)
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe_id=recipe_id, ingredient_id=item_id)
+            for recipe_id in recipe_ids
+            for item_id in rng.sample(
+                ingredient_ids,
+                min(ingredients_per_recipe, len(ingredient_ids)),
+            )
+        ], batch_size=batch_size)
+
+    return recipes
+
+
+DISTRIBUTIONS = ('fixed', 'uniform', 'pareto')
+PARETO_ALPHA = 1.5
+# Keeps one unlucky draw from seeding most of the database
+PARETO_CAP = 100
+
+
+def sample_counts(size, mean, distribution='fixed', rng=None):
+    """Return `size` non-negative counts averaging about `mean`.
+
+    'fixed' gives every user `mean`, 'uniform' spreads counts evenly
+    between 0 and 2 * mean, and 'pareto' gives a long tail where a few
+    users own most of the rows, as in real traffic.
+    """
+    rng = rng or random.Random(0)
+    if distribution == 'fixed':
+        return [mean] * size
+    if distribution == 'uniform':
+        return [rng.randint(0, 2 * mean) for _ in range(size)]
+    if distribution == 'pareto':
+        scale = mean * (PARETO_ALPHA - 1) / PARETO_ALPHA
+        return [
+            min(int(scale * rng.paretovariate(PARETO_ALPHA)),
+                mean * PARETO_CAP)
+            for _ in range(size)
+        ]
+    raise ValueError(f'Unknown distribution: {distribution}')
+
+
+def seed_users(count, email_prefix, password, batch_size=2000):
+    """Bulk create users sharing one password, each with an API token.
+
+    The password is hashed once for all users. Returns the users.
+    """
+    run = uuid4().hex[:8]
+    encoded = hashers.make_password(password)
+    users = get_user_model().objects.bulk_create(
+        [
+            get_user_model()(
+                email=f'{email_prefix}-{run}-{i}@example.com',
+                name=f'Benchmark user {i}',
+                password=encoded,
+            )
+            for i in range(count)
+        ],
+        batch_size=batch_size,
+    )
+    users = list(
+        get_user_model().objects.filter(
+            email__startswith=f'{email_prefix}-{run}-',
+        ).order_by('id')
+    )
+    Token.objects.bulk_create(
+        [Token(user=user, key=Token.generate_key()) for user in users],
+        batch_size=batch_size,
+    )
+    return users
+
+
+def parse_mix(text, choices):
+    """Parse 'name=weight,...' into a dict of positive weights"""
+    mix = {}
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in choices:
+            raise ValueError(
+                f'Unknown operation "{name}", expected one of: '
+                f'{", ".join(choices)}'
+            )
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise ValueError(f'Invalid weight for "{name}": {weight!r}')
+        if mix[name] < 0:
+            raise ValueError(f'Weight for "{name}" must not be negative')
+
+    mix = {name: weight for name, weight in mix.items() if weight}
+    if not mix:
+        raise ValueError('The mix needs at least one positive weight')
+    return mix
+
+
+def multipart_body(field, filename, content, content_type):
+    """Return (body, content type header) for a one-file form upload"""
+    boundary = uuid4().hex
+    body = (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="{field}"; '
+        f'filename="{filename}"\r\n'
+        f'Content-Type: {content_type}\r\n\r\n'
+    ).encode() + content + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def time_call(func, repeat=5):
+    """Call `func` `repeat` times and return the durations in ms"""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append((time.perf_counter() - start) * 1000)
+
+    return durations
+
+
+def summarize(durations):
+    """Return the median and max of a list of durations"""
+    return {
+        'median': statistics.median(durations),
+        'max': max(durations),
+    }
+
+
+def percentile(values, pct):
+    """Return the nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def http_request(method, url, body=None, headers=None, timeout=30):
+    """Send an HTTP request and return (status, elapsed ms)"""
+    request = urllib.request.Request(
+        url,
+        data=body,
+        headers=headers or {},
+        method=method,
+    )
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as error:
+        error.read()
+        status = error.code
+    except (urllib.error.URLError, OSError):
+        status = 0
+
+    return status, (time.perf_counter() - start) * 1000
+
+
+class LatencyRecorder:
+    """Thread-safe collection of request latencies per endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = defaultdict(list)
+        self._statuses = defaultdict(Counter)
+
+    def record(self, name, status, elapsed_ms):
+        with self._lock:
+            self._samples[name].append(elapsed_ms)
+            self._statuses[name][status] += 1
+
+    def report(self, duration):
+        """Return one summary row per endpoint for a run of duration s"""
+        with self._lock:
+            return [
+                {
+                    'endpoint': name,
+                    'requests': len(samples),
+                    'rps': len(samples) / duration if duration else 0.0,
+                    'p50': percentile(samples, 50),
+                    'p95': percentile(samples, 95),
+                    'p99': percentile(samples, 99),
+                    'statuses': dict(self._statuses[name]),
+                }
+                for name, samples in sorted(self._samples.items())
+            ]
+
+
+def format_report(rows):
+    """Format report rows as a fixed width table"""
+    lines = [
+        f'{"endpoint":<28}{"requests":>9}{"rps":>9}'
+        f'{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}  statuses'
+    ]
+    for row in rows:
+        statuses = ' '.join(
+            f'{code}:{count}'
+            for code, count in sorted(row['statuses'].items())
+        )
+        lines.append(
+            f'{row["endpoint"]:<28}{row["requests"]:>9}{row["rps"]:>9.1f}'
+            f'{row["p50"]:>9.1f}{row["p95"]:>9.1f}{row["p99"]:>9.1f}'
+            f'  {statuses}'
+        )
+    return '\n'.join(lines)
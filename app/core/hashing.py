@@ -0,0 +1,106 @@
+"""
+Admission control for password hashing
+
+PBKDF2 keeps a CPU busy for a long time per call. Before hashing, a
+request must claim one of HOST_SLOTS host-wide slots, file locks shared by
+every uWSGI worker on the machine. Once all slots are taken, callers get
+PasswordHashingBusy right away instead of piling onto busy CPUs, which
+leaves the other workers free to serve other traffic.
+
+Only the user API views claim slots, and turn PasswordHashingBusy into a
+503 with Retry-After. Hashing elsewhere, such as the admin login or the
+password management commands, is never turned away.
+"""
+import fcntl
+import os
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+class PasswordHashingBusy(Exception):
+    """Raised when every password hashing slot is in use"""
+
+    def __init__(self, wait):
+        super().__init__(f'No free password hashing slot, retry in {wait}s')
+        self.wait = wait
+
+
+class PasswordHashingSlots:
+    """Host-wide file lock slots admitting a bounded number of hashes"""
+
+    def __init__(self, host_slots, lock_dir, retry_after):
+        self.retry_after = retry_after
+        self._slots = []
+        if host_slots:
+            os.makedirs(lock_dir, exist_ok=True)
+            for index in range(host_slots):
+                path = os.path.join(lock_dir, f'slot-{index}.lock')
+                # flock is held per open file, so threads of one process
+                # sharing it also need a thread lock
+                self._slots.append((
+                    open(path, 'a'),
+                    threading.Lock(),
+                ))
+
+    @contextmanager
+    def hold(self):
+        """Hold one free host slot, or raise if all are taken"""
+        if not self._slots:
+            yield
+            return
+
+        for lock_file, thread_lock in random.sample(
+            self._slots, len(self._slots),
+        ):
+            if not thread_lock.acquire(blocking=False):
+                continue
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                thread_lock.release()
+                continue
+
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                thread_lock.release()
+            return
+
+        raise PasswordHashingBusy(self.retry_after)
+
+
+_slots = None
+_slots_lock = threading.Lock()
+
+
+def get_slots():
+    """Return this process's hashing slots, or None when disabled"""
+    global _slots
+    options = settings.PASSWORD_HASHING
+    if not options['ENABLED']:
+        return None
+
+    with _slots_lock:
+        if _slots is None:
+            _slots = PasswordHashingSlots(
+                options['HOST_SLOTS'],
+                options['LOCK_DIR'],
+                options['RETRY_AFTER'],
+            )
+    return _slots
+
+
+@contextmanager
+def admission():
+    """Hold a hashing slot for the block, unless admission is disabled"""
+    slots = get_slots()
+    if slots is None:
+        yield
+        return
+
+    with slots.hold():
+        yield
@@ -0,0 +1,95 @@
+"""
+Seed users with recipes, tags and ingredients for load testing
+"""
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+
+from core.benchmark import (
+    DISTRIBUTIONS,
+    sample_counts,
+    seed_recipes,
+    seed_users,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk create users, each with an API token and a number of recipes, '
+        'tags and ingredients drawn from the chosen distribution.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument(
+            '--recipes', type=int, default=50,
+            help='Mean number of recipes per user.',
+        )
+        parser.add_argument(
+            '--tags', type=int, default=10,
+            help='Mean number of tags per user.',
+        )
+        parser.add_argument(
+            '--ingredients', type=int, default=20,
+            help='Mean number of ingredients per user.',
+        )
+        parser.add_argument(
+            '--distribution', choices=DISTRIBUTIONS, default='pareto',
+        )
+        parser.add_argument('--email-prefix', default='bench')
+        parser.add_argument('--password', default='benchpass123')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Delete users from earlier seeds with the same prefix.',
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('--users must be at least 1.')
+        rng = random.Random(options['seed'])
+        prefix = options['email_prefix']
+
+        if options['clear']:
+            deleted, _ = get_user_model().objects.filter(
+                email__startswith=f'{prefix}-',
+                email__endswith='@example.com',
+            ).delete()
+            self.stdout.write(f'Deleted {deleted} rows from earlier seeds.')
+
+        start = time.perf_counter()
+        users = seed_users(
+            options['users'], prefix, options['password'],
+            batch_size=options['batch_size'],
+        )
+        counts = zip(
+            sample_counts(
+                len(users), options['recipes'], options['distribution'], rng,
+            ),
+            sample_counts(
+                len(users), options['tags'], options['distribution'], rng,
+            ),
+            sample_counts(
+                len(users), options['ingredients'], options['distribution'],
+                rng,
+            ),
+        )
+
+        recipes = 0
+        for user, (user_recipes, tags, ingredients) in zip(users, counts):
+            recipes += seed_recipes(
+                user, user_recipes, tags, ingredients,
+                batch_size=options['batch_size'], rng=rng,
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {len(users)} users and {recipes} recipes in '
+            f'{time.perf_counter() - start:.1f}s. Log in as '
+            f'{prefix}-*@example.com with password "{options["password"]}".'
+        ))
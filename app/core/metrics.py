@@ -0,0 +1,193 @@
+"""
+Prometheus metrics for the API, database, caches and image queue
+
+Under uWSGI each worker is a separate process, so metrics are kept with
+prometheus_client's multiprocess mode when PROMETHEUS_MULTIPROC_DIR is
+set (see scripts/run.sh): every process writes its own mmap'd file and
+/metrics adds the files up when scraped. Updating a metric only takes a
+lock private to the process, so workers never wait on each other. Without
+the variable, metrics are kept in memory for the current process.
+
+The image job queue depth is read from the database at scrape time. The
+pooled database backend reports its wait times and timeouts here too, so
+this module must not import models at load time: the backend is loaded
+while the models are being defined.
+"""
+import os
+import time
+from contextlib import ExitStack
+from secrets import compare_digest
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.models import Count
+from django.http import (
+    Http404,
+    HttpResponse,
+)
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+
+REQUEST_LATENCY = Histogram(
+    'recipe_api_request_duration_seconds',
+    'Time to respond to an API request',
+    ['route', 'method'],
+)
+REQUESTS = Counter(
+    'recipe_api_requests',
+    'API responses by status code',
+    ['route', 'method', 'status'],
+)
+DB_QUERY_DURATION = Histogram(
+    'recipe_api_db_query_duration_seconds',
+    'Time spent in one SQL query during a request',
+    ['database'],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1),
+)
+DB_POOL_WAIT = Histogram(
+    'recipe_api_db_pool_wait_seconds',
+    'Time to get a pooled database connection, including opening one',
+    ['database'],
+    buckets=(.0005, .001, .005, .01, .05, .1, .25, .5, 1, 2.5, 5, 10),
+)
+DB_POOL_TIMEOUTS = Counter(
+    'recipe_api_db_pool_timeouts',
+    'Times no pooled database connection became free in time',
+    ['database'],
+)
+CACHE_REQUESTS = Counter(
+    'recipe_api_cache_requests',
+    'Cache lookups by cache and result',
+    ['cache', 'result'],
+)
+
+
+def record_cache_lookup(cache, hit):
+    """Count one cache lookup as a hit or miss"""
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def record_pool_wait(database, seconds):
+    """Observe the time one connection took to get from the pool"""
+    DB_POOL_WAIT.labels(database).observe(seconds)
+
+
+def record_pool_timeout(database):
+    """Count one wait for a pooled connection that timed out"""
+    DB_POOL_TIMEOUTS.labels(database).inc()
+
+
+class _QueryTimer:
+    """Execute wrapper observing query durations for one database"""
+
+    def __init__(self, alias):
+        self.histogram = DB_QUERY_DURATION.labels(alias)
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.histogram.observe(time.perf_counter() - start)
+
+
+class MetricsMiddleware:
+    """Record the latency and status of every request, and the time of
+    every query it runs"""
+
+    def __init__(self, get_response):
+        if not settings.METRICS['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self._timers = {}
+
+    def _timer(self, alias):
+        timer = self._timers.get(alias)
+        if timer is None:
+            timer = self._timers[alias] = _QueryTimer(alias)
+        return timer
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(self._timer(alias))
+                )
+            response = self.get_response(request)
+
+        match = request.resolver_match
+        route = match.view_name if match else 'unmatched'
+        REQUEST_LATENCY.labels(route, request.method).observe(
+            time.perf_counter() - start
+        )
+        REQUESTS.labels(
+            route, request.method, str(response.status_code),
+        ).inc()
+        return response
+
+
+class ImageQueueCollector:
+    """Report the number of image jobs in each status"""
+
+    def collect(self):
+        ImageJob = apps.get_model('core', 'ImageJob')
+        gauge = GaugeMetricFamily(
+            'recipe_api_image_jobs',
+            'Image derivative jobs by status',
+            labels=['status'],
+        )
+        counts = dict(
+            ImageJob.objects.order_by().values_list('status')
+            .annotate(Count('id'))
+        )
+        for status, _label in ImageJob.STATUS_CHOICES:
+            gauge.add_metric([status], counts.get(status, 0))
+        yield gauge
+
+
+class _ProcessCollector:
+    """Metrics of this process, when not in multiprocess mode"""
+
+    def collect(self):
+        return REGISTRY.collect()
+
+
+def build_registry():
+    """Return a registry collecting every worker's metrics"""
+    registry = CollectorRegistry()
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry.register(_ProcessCollector())
+    registry.register(ImageQueueCollector())
+    return registry
+
+
+def metrics_view(request):
+    """Expose the metrics in the Prometheus text format"""
+    options = settings.METRICS
+    if not options['ENABLED']:
+        raise Http404
+    if options['TOKEN']:
+        supplied = request.META.get('HTTP_AUTHORIZATION', '').encode()
+        expected = f'Bearer {options["TOKEN"]}'.encode()
+        if not compare_digest(supplied, expected):
+            return HttpResponse(status=401)
+
+    return HttpResponse(
+        generate_latest(build_registry()),
+        content_type=CONTENT_TYPE_LATEST,
+    )
@@ -0,0 +1,66 @@
+# Generated by Django 3.2.25 on 2026-10-17 05:57
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_names(apps, schema_editor):
+    """Fold tags and ingredients sharing a user and name into the oldest"""
+    Recipe = apps.get_model('core', 'Recipe')
+    for model_name, relation in [('Tag', 'tags'), ('Ingredient', 'ingredients')]:
+        model = apps.get_model('core', model_name)
+        through = getattr(Recipe, relation).through
+        column = f'{model_name.lower()}_id'
+
+        duplicates = model.objects.values('user_id', 'name').annotate(
+            keep_id=Min('id'),
+            total=Count('id'),
+        ).filter(total__gt=1)
+        for duplicate in duplicates:
+            keep_id = duplicate['keep_id']
+            drop_ids = list(model.objects.filter(
+                user_id=duplicate['user_id'],
+                name=duplicate['name'],
+            ).exclude(id=keep_id).values_list('id', flat=True))
+
+            linked = set(through.objects.filter(
+                **{column: keep_id}
+            ).values_list('recipe_id', flat=True))
+            relink = set(through.objects.filter(
+                **{f'{column}__in': drop_ids}
+            ).values_list('recipe_id', flat=True)) - linked
+            through.objects.bulk_create([
+                through(recipe_id=recipe_id, **{column: keep_id})
+                for recipe_id in relink
+            ])
+            model.objects.filter(id__in=drop_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_per_user_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_names,
+            reverse_code=migrations.RunPython.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='core_ingredient_unique_user_name'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='core_tag_unique_user_name'),
+        ),
+        migrations.RemoveIndex(
+            model_name='ingredient',
+            name='core_ingredient_user_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='tag',
+            name='core_tag_user_name_idx',
+        ),
+    ]
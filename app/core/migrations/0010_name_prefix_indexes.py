@@ -0,0 +1,45 @@
+# Generated by Django 3.2.25 on 2026-10-17 06:50
+
+from django.db import migrations
+
+
+PREFIX_INDEXES = [
+    ('core_tag_name_prefix_idx', 'core_tag'),
+    ('core_ingr_name_prefix_idx', 'core_ingredient'),
+]
+
+
+def create_prefix_indexes(apps, schema_editor):
+    """Index UPPER(name) for istartswith lookups, on PostgreSQL only.
+
+    istartswith compiles to UPPER(name::text) LIKE UPPER('abc%'), which
+    can only use a btree index on the same expression with
+    text_pattern_ops, whatever the database collation.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    for index, table in PREFIX_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX {index} ON {table} '
+            f'(user_id, UPPER(name::text) text_pattern_ops);'
+        )
+
+
+def drop_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    for index, _table in PREFIX_INDEXES:
+        schema_editor.execute(f'DROP INDEX {index};')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_prefix_indexes, drop_prefix_indexes),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 3.2.25 on 2026-10-17 06:32
+
+import core.models
+import core.storage
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_existing_images(apps, schema_editor):
+    """Create a blob for each image already in use"""
+    Recipe = apps.get_model('core', 'Recipe')
+    ImageBlob = apps.get_model('core', 'ImageBlob')
+    images = Recipe.objects.exclude(image__isnull=True).exclude(image='') \
+        .order_by().values('image').annotate(refs=Count('id'))
+    ImageBlob.objects.bulk_create(
+        [
+            ImageBlob(name=row['image'], ref_count=row['refs'])
+            for row in images.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_image_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(null=True, storage=core.storage.ContentAddressedStorage(), upload_to=core.models.recipe_image_file_path),
+        ),
+        migrations.AddIndex(
+            model_name='imageblob',
+            index=models.Index(fields=['ref_count', 'updated_at'], name='core_imageblob_unused_idx'),
+        ),
+        migrations.RunPython(
+            count_existing_images,
+            migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 3.2.25 on 2026-10-17 09:12
+
+from django.db import migrations
+
+
+PREFIX_INDEXES = [
+    ('core_tag_name_prefix_idx', 'core_tag'),
+    ('core_ingr_name_prefix_idx', 'core_ingredient'),
+]
+
+
+def create_sort_indexes(apps, schema_editor):
+    """Index UPPER(name) in the "C" collation for autocomplete.
+
+    A text_pattern_ops index serves LIKE 'abc%' but not ORDER BY, so
+    Postgres sorted every match before applying the LIMIT. A plain btree
+    in the "C" collation serves both the prefix range and the sort, and
+    id is included for the tie-break. The query must use the same
+    expression, see recipe.filters.filter_name_prefix.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    for index, table in PREFIX_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {index};')
+        schema_editor.execute(
+            f'CREATE INDEX {index} ON {table} '
+            f'(user_id, (UPPER(name::text) COLLATE "C"), id);'
+        )
+
+
+def restore_pattern_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    for index, table in PREFIX_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {index};')
+        schema_editor.execute(
+            f'CREATE INDEX {index} ON {table} '
+            f'(user_id, UPPER(name::text) text_pattern_ops);'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_image_blobs'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_sort_indexes, restore_pattern_indexes),
+    ]
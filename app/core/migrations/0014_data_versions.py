@@ -0,0 +1,51 @@
+# Generated by Django 3.2.25 on 2026-10-17 07:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_data_versions(apps, schema_editor):
+    """Start every existing user at version 0"""
+    User = apps.get_model('core', 'User')
+    DataVersion = apps.get_model('core', 'DataVersion')
+    DataVersion.objects.bulk_create(
+        [
+            DataVersion(user_id=user_id)
+            for user_id in User.objects.values_list('id', flat=True)
+            .iterator()
+        ],
+        batch_size=1000,
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_name_prefix_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='core.user')),
+                ('version', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.RunPython(
+            create_data_versions,
+            migrations.RunPython.noop,
+        ),
+        migrations.RemoveIndex(
+            model_name='ingredient',
+            name='core_ingr_user_updated_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='recipe',
+            name='core_recipe_user_updated_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='tag',
+            name='core_tag_user_updated_idx',
+        ),
+    ]
@@ -3,6 +3,7 @@ import uuid
 import os
 
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.contrib.auth.models import (
     AbstractBaseUser,
@@ -10,6 +11,8 @@ from django.contrib.auth.models import (
     PermissionsMixin,
 )
 
+from core.storage import ContentAddressedStorage
+
 
 def recipe_image_file_path(instance, filename):
     """Generate file path for new recipe image"""
@@ -68,11 +71,47 @@ class Recipe(models.Model):
     link = models.CharField(max_length=255, blank=True)
     tags = models.ManyToManyField('Tag')
     ingredients = models.ManyToManyField('Ingredient')
-    image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    # Files are shared between recipes, see ImageBlob
+    image = models.ImageField(
+        null=True,
+        upload_to=recipe_image_file_path,
+        storage=ContentAddressedStorage(),
+    )
+    # {size: {format: storage name}}, filled in by the image job worker
+    image_derivatives = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Maintained by a database trigger on PostgreSQL, see migration 0009.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', '-id'],
+                name='core_recipe_user_id_desc_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_loaded_image()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        if fields is None or 'image' in fields:
+            self._remember_loaded_image()
+
+    def _remember_loaded_image(self):
+        """Note the stored image name so a save can tell if it changed,
+        see recipe.signals"""
+        if 'image' in self.__dict__:
+            value = self.__dict__['image']
+            self._loaded_image = getattr(value, 'name', value) or None
+
 
 class Tag(models.Model):
     """Tags for filtering recipes"""
@@ -81,6 +120,15 @@ class Tag(models.Model):
         on_delete=models.CASCADE,
     )
     name = models.CharField(max_length=255)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'name'],
+                name='core_tag_unique_user_name',
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -93,6 +141,91 @@ class Ingredient(models.Model):
         on_delete=models.CASCADE,
     )
     name = models.CharField(max_length=255)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'name'],
+                name='core_ingredient_unique_user_name',
+            ),
+        ]
 
     def __str__(self):
         return self.name
+
+
+class DataVersion(models.Model):
+    """Counter moved on by every write to a user's recipes, tags and
+    ingredients, see recipe.conditional"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+    )
+    version = models.BigIntegerField(default=0)
+    # Time of the last write, None until the first one
+    updated_at = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return f'{self.user_id} v{self.version}'
+
+
+class ImageJob(models.Model):
+    """Queued job building resized copies of a recipe image"""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    recipe = models.ForeignKey(
+        'Recipe',
+        on_delete=models.CASCADE,
+        related_name='image_jobs',
+    )
+    source = models.CharField(max_length=255)
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['status', 'id'],
+                name='core_imagejob_status_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.source} ({self.status})'
+
+
+class ImageBlob(models.Model):
+    """A stored image file and the number of recipes using it"""
+    name = models.CharField(max_length=255, unique=True)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['ref_count', 'updated_at'],
+                name='core_imageblob_unused_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.ref_count})'
@@ -0,0 +1,171 @@
+"""
+Sampled request profiling with Server-Timing headers
+
+ProfilingMiddleware is opt-in through REQUEST_PROFILING['ENABLED'] and
+removes itself from the stack when off. For a sampled request it times
+every SQL query on every database connection, counts queries repeated
+with the same parameters, and adds up the time spent in serializers that
+use ProfiledSerializerMixin. The totals are sent back in a Server-Timing
+header and logged as one JSON line. Requests that are not sampled only
+have their wall time measured, and are logged when slower than SLOW_MS.
+
+Queries run while a streaming response is iterated happen after the
+middleware returns and are not counted.
+"""
+import json
+import logging
+import random
+import time
+from contextlib import (
+    ExitStack,
+    contextmanager,
+)
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from rest_framework.fields import empty
+
+
+logger = logging.getLogger(__name__)
+
+_profile = ContextVar('request_profile', default=None)
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+class RequestProfile:
+    """Database and serializer time spent by one request"""
+
+    def __init__(self):
+        self.db_time = 0.0
+        self.queries = 0
+        self.duplicate_queries = 0
+        self.serializer_time = 0.0
+        self.serializing = False
+        self._seen = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        """Time one query, installed with connection.execute_wrapper()"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+            key = hash((sql, repr(params)))
+            if key in self._seen:
+                self.duplicate_queries += 1
+            else:
+                self._seen.add(key)
+
+    @contextmanager
+    def timing_serializer(self):
+        """Add the enclosed time to the serializer time. Nested serializers
+        check `serializing` so their time is not counted twice."""
+        self.serializing = True
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.serializer_time += time.perf_counter() - start
+            self.serializing = False
+
+    def as_dict(self):
+        return {
+            'db_ms': _ms(self.db_time),
+            'queries': self.queries,
+            'duplicate_queries': self.duplicate_queries,
+            'serializer_ms': _ms(self.serializer_time),
+        }
+
+
+class ProfiledSerializerMixin:
+    """Count a serializer's representation and validation time toward
+    the request profile"""
+
+    def to_representation(self, instance):
+        profile = _profile.get()
+        if profile is None or profile.serializing:
+            return super().to_representation(instance)
+        with profile.timing_serializer():
+            return super().to_representation(instance)
+
+    def run_validation(self, data=empty):
+        profile = _profile.get()
+        if profile is None or profile.serializing:
+            return super().run_validation(data)
+        with profile.timing_serializer():
+            return super().run_validation(data)
+
+
+def server_timing(total, profile):
+    """Return the Server-Timing header value for a profiled request"""
+    duplicates = (
+        f', {profile.duplicate_queries} duplicate'
+        if profile.duplicate_queries else ''
+    )
+    return ', '.join([
+        f'total;dur={_ms(total)}',
+        f'db;dur={_ms(profile.db_time)};'
+        f'desc="{profile.queries} queries{duplicates}"',
+        f'serializer;dur={_ms(profile.serializer_time)}',
+    ])
+
+
+class ProfilingMiddleware:
+    """Profile a sample of requests, see the module docstring"""
+
+    def __init__(self, get_response):
+        options = settings.REQUEST_PROFILING
+        if not options['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = options['SAMPLE_RATE']
+        self.slow_ms = options['SLOW_MS']
+        self.server_timing = options['SERVER_TIMING']
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        if random.random() >= self.sample_rate:
+            response = self.get_response(request)
+            total = time.perf_counter() - start
+            if self.slow_ms is not None and _ms(total) >= self.slow_ms:
+                self._log(request, response, total, None)
+            return response
+
+        profile = RequestProfile()
+        token = _profile.set(profile)
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(
+                        connections[alias].execute_wrapper(profile)
+                    )
+                response = self.get_response(request)
+        finally:
+            _profile.reset(token)
+
+        total = time.perf_counter() - start
+        if self.server_timing:
+            response['Server-Timing'] = server_timing(total, profile)
+        self._log(request, response, total, profile)
+        return response
+
+    def _log(self, request, response, total, profile):
+        match = request.resolver_match
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': _ms(total),
+            'sampled': profile is not None,
+        }
+        if profile is not None:
+            record.update(profile.as_dict())
+        logger.info(json.dumps(record))
@@ -0,0 +1,179 @@
+"""
+Database router sending safe API reads to read replicas
+
+Reads go to a replica only inside a view that opted in with
+`replica_reads()`, and only while the user has not written recently:
+after a write the user is pinned to the primary for STICKY_SECONDS so
+they read their own writes. The pin lives in a shared cache so every
+worker sees it; a system check refuses replicas when the configured
+cache is private to each process. Replicas failing a health check are
+skipped until the next check, falling back to the primary when none are
+left.
+"""
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.db import (
+    DEFAULT_DB_ALIAS,
+    DatabaseError,
+    connections,
+)
+
+
+# Backends whose entries other worker processes cannot see
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+_health = {}
+_health_lock = threading.Lock()
+_stats = Counter()
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Allow or forbid replica reads within this context"""
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def enable_replica_reads():
+    """Allow replica reads until the enclosing replica_reads() exits"""
+    _replica_reads.set(True)
+
+
+def _pin_key(user_id):
+    return f'db-pin:{user_id}'
+
+
+def _pin_cache():
+    return caches[settings.REPLICA_ROUTING['CACHE_ALIAS']]
+
+
+def pin_to_primary(user_id):
+    """Send the user's reads to the primary for the sticky window"""
+    _pin_cache().set(
+        _pin_key(user_id),
+        True,
+        settings.REPLICA_ROUTING['STICKY_SECONDS'],
+    )
+
+
+def is_pinned(user_id):
+    """Return True if the user wrote within the sticky window"""
+    return _pin_cache().get(_pin_key(user_id)) is not None
+
+
+def check_pin_cache(app_configs=None, **kwargs):
+    """System check that the primary pin is stored in a shared cache"""
+    if not settings.DATABASE_REPLICAS:
+        return []
+
+    alias = settings.REPLICA_ROUTING['CACHE_ALIAS']
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+    if backend is None:
+        return [checks.Error(
+            f'REPLICA_ROUTING cache alias "{alias}" is not in CACHES.',
+            id='core.E001',
+        )]
+    if backend in PROCESS_LOCAL_CACHES:
+        return [checks.Error(
+            f'Read replicas need a shared cache for the primary pin, but '
+            f'cache "{alias}" uses {backend.rsplit(".", 1)[-1]}.',
+            hint=(
+                'Point DB_REPLICA_CACHE_ALIAS at a cache shared by all '
+                'workers, e.g. set RECIPE_CACHE_BACKEND to Redis or '
+                'Memcached.'
+            ),
+            id='core.E002',
+        )]
+    return []
+
+
+def _check(alias):
+    connection = connections[alias]
+    try:
+        connection.ensure_connection()
+        healthy = connection.is_usable()
+    except DatabaseError:
+        healthy = False
+
+    if not healthy:
+        try:
+            connection.close()
+        except DatabaseError:
+            pass
+    return healthy
+
+
+def is_healthy(alias):
+    """Return the replica's health, checking it at most once per interval"""
+    now = time.monotonic()
+    interval = settings.REPLICA_ROUTING['HEALTH_CHECK_INTERVAL']
+    with _health_lock:
+        cached = _health.get(alias)
+    if cached is not None and now - cached[1] < interval:
+        return cached[0]
+
+    healthy = _check(alias)
+    with _health_lock:
+        _health[alias] = (healthy, now)
+    return healthy
+
+
+def reset_health():
+    """Forget every cached health check result"""
+    with _health_lock:
+        _health.clear()
+
+
+def routing_stats():
+    """Return how many reads went to replicas and to the primary"""
+    return dict(_stats)
+
+
+def reset_routing_stats():
+    _stats.clear()
+
+
+class ReplicaRouter:
+    """Route opted-in reads to a healthy replica, everything else to the
+    primary"""
+
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get():
+            return None
+
+        healthy = [
+            alias for alias in settings.DATABASE_REPLICAS
+            if is_healthy(alias)
+        ]
+        if not healthy:
+            _stats['primary_fallback'] += 1
+            return DEFAULT_DB_ALIAS
+
+        _stats['replica'] += 1
+        return random.choice(healthy)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
@@ -0,0 +1,36 @@
+"""
+Signal handlers for core models
+"""
+from django.conf import settings
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+)
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from core.authentication import invalidate_token
+
+
+AUTH_FIELDS = {'password', 'is_active'}
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    """Drop a deleted token from the authentication cache"""
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def forget_user_tokens(sender, instance, created, update_fields, **kwargs):
+    """Drop a user's tokens from the cache when their credentials change"""
+    if created:
+        return
+    if update_fields is not None and not AUTH_FIELDS & set(update_fields):
+        return
+
+    for key in Token.objects.filter(user=instance).values_list(
+        'key', flat=True,
+    ):
+        invalidate_token(key)
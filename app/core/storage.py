@@ -0,0 +1,43 @@
+"""
+File storage that names files after a hash of their content
+"""
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+
+
+def hash_content(content):
+    """Return the SHA-256 hex digest of a file, read in chunks"""
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage that keeps one copy of each distinct file.
+
+    A saved file is named <directory>/<xx>/<sha256><ext> after its
+    content, so saving the same bytes again returns the existing name
+    without writing anything. Uploads hashed while they streamed in carry
+    the digest as `content_hash` and are not read a second time.
+    """
+
+    def _save(self, name, content):
+        digest = getattr(content, 'content_hash', None) or \
+            hash_content(content)
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        name = os.path.join(directory, digest[:2], f'{digest}{extension}')
+        if self.exists(name):
+            return name
+
+        return super()._save(name, content)
+
+    def restore(self, name, content):
+        """Write content under its content-addressed name if missing"""
+        if not self.exists(name):
+            content.seek(0)
+            super()._save(name, content)
@@ -0,0 +1,124 @@
+"""
+Tests for cached token authentication
+"""
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import (
+    TestCase,
+    override_settings,
+)
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.authentication import (
+    LRUCache,
+    clear_token_cache,
+)
+
+
+ME_URL = reverse('user:me')
+
+
+class LRUCacheTests(TestCase):
+    """Tests for the in-process LRU cache"""
+
+    def test_evicts_least_recently_used(self):
+        """Test the oldest unused entry is evicted at capacity"""
+        cache = LRUCache(max_size=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_expires_entries(self):
+        """Test entries past their TTL are not returned"""
+        cache = LRUCache(max_size=2, ttl=-1)
+        cache.set('a', 1)
+
+        self.assertIsNone(cache.get('a'))
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Tests for authenticating with cached tokens"""
+
+    def setUp(self):
+        clear_token_cache()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='sample123',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_token_lookup_is_cached(self):
+        """Test the second request does not query the token table"""
+        self.client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+
+    def test_deleted_token_is_rejected(self):
+        """Test a deleted token stops working immediately"""
+        self.client.get(ME_URL)
+
+        self.token.delete()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_is_rejected(self):
+        """Test deactivating a user stops their cached token working"""
+        self.client.get(ME_URL)
+
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_invalidates(self):
+        """Test changing the password drops the cached user"""
+        self.client.get(ME_URL)
+
+        self.user.set_password('newpass123')
+        self.user.save(update_fields=['password'])
+
+        with self.assertNumQueries(1):
+            self.client.get(ME_URL)
+
+    def test_unrelated_update_keeps_cache(self):
+        """Test saving other fields only does not drop the cache"""
+        self.client.get(ME_URL)
+
+        self.user.save(update_fields=['last_login'])
+
+        with self.assertNumQueries(0):
+            self.client.get(ME_URL)
+
+    @override_settings(AUTH_TOKEN_CACHE={
+        'LOCAL_MAX_SIZE': 10,
+        'LOCAL_TTL': 5,
+        'SHARED_ALIAS': 'default',
+        'SHARED_TTL': 60,
+    })
+    def test_shared_cache_is_used(self):
+        """Test a lookup cached by another process skips the database"""
+        caches['default'].clear()
+        self.client.get(ME_URL)
+        clear_token_cache()
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
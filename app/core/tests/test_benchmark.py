@@ -0,0 +1,107 @@
+"""
+Tests for the benchmark seeding helpers and seed_benchmark command
+"""
+import random
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+)
+
+from rest_framework.authtoken.models import Token
+
+from core.benchmark import (
+    multipart_body,
+    parse_mix,
+    sample_counts,
+)
+from core.models import (
+    Recipe,
+    Tag,
+)
+
+
+class HelperTests(SimpleTestCase):
+    """Test the count distributions, mix parser and form encoder"""
+
+    def test_sample_counts(self):
+        """Test every distribution stays non-negative around the mean"""
+        rng = random.Random(1)
+        self.assertEqual(sample_counts(3, 7, 'fixed', rng), [7, 7, 7])
+        for distribution in ('uniform', 'pareto'):
+            counts = sample_counts(5000, 20, distribution, rng)
+            self.assertGreaterEqual(min(counts), 0)
+            self.assertAlmostEqual(sum(counts) / len(counts), 20, delta=4)
+
+    def test_pareto_long_tail(self):
+        """Test a few users get far more rows than the mean"""
+        counts = sample_counts(5000, 20, 'pareto', random.Random(1))
+
+        self.assertGreater(max(counts), 200)
+        self.assertLess(sorted(counts)[len(counts) // 2], 20)
+
+    def test_unknown_distribution(self):
+        with self.assertRaises(ValueError):
+            sample_counts(1, 1, 'normal')
+
+    def test_parse_mix(self):
+        """Test weights are parsed and zero weights dropped"""
+        mix = parse_mix(
+            'list=3, detail=1.5,create=0', ('list', 'detail', 'create'),
+        )
+
+        self.assertEqual(mix, {'list': 3.0, 'detail': 1.5})
+        for text in ('list=x', 'list=-1', 'delete=1', 'list=0'):
+            with self.assertRaises(ValueError):
+                parse_mix(text, ('list',))
+
+    def test_multipart_body(self):
+        """Test the body holds the file under the given field"""
+        body, content_type = multipart_body(
+            'image', 'a.jpg', b'\xff\xd8data', 'image/jpeg',
+        )
+
+        boundary = content_type.split('boundary=')[1]
+        self.assertTrue(body.startswith(f'--{boundary}\r\n'.encode()))
+        self.assertIn(b'name="image"; filename="a.jpg"', body)
+        self.assertIn(b'\r\n\r\n\xff\xd8data\r\n', body)
+        self.assertTrue(body.endswith(f'--{boundary}--\r\n'.encode()))
+
+
+class SeedBenchmarkCommandTests(TestCase):
+    """Test the seed_benchmark command"""
+
+    def test_seed(self):
+        """Test users get tokens, a usable password and their recipes"""
+        call_command(
+            'seed_benchmark',
+            users=4, recipes=3, tags=2, ingredients=2,
+            distribution='fixed', password='pass12345', stdout=StringIO(),
+        )
+
+        users = get_user_model().objects.filter(email__startswith='bench-')
+        self.assertEqual(users.count(), 4)
+        self.assertEqual(Token.objects.filter(user__in=users).count(), 4)
+        self.assertTrue(users.first().check_password('pass12345'))
+        for user in users:
+            self.assertEqual(Recipe.objects.filter(user=user).count(), 3)
+            self.assertEqual(Tag.objects.filter(user=user).count(), 2)
+
+    def test_clear(self):
+        """Test --clear removes users from an earlier seed"""
+        options = {
+            'users': 2, 'recipes': 1, 'distribution': 'fixed',
+            'stdout': StringIO(),
+        }
+        call_command('seed_benchmark', **options)
+        call_command('seed_benchmark', clear=True, **options)
+
+        self.assertEqual(
+            get_user_model().objects.filter(email__startswith='bench-')
+            .count(),
+            2,
+        )
+        self.assertEqual(Recipe.objects.count(), 2)
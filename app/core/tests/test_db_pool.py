@@ -0,0 +1,229 @@
+"""
+Tests for the database connection pool
+"""
+import threading
+import time
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import SimpleTestCase
+
+from prometheus_client import REGISTRY
+
+from core.backends.postgresql_pool.base import (
+    DatabaseWrapper as PooledDatabaseWrapper,
+)
+from core.backends.postgresql_pool.pool import (
+    ConnectionPool,
+    PoolTimeout,
+    close_pools,
+)
+
+
+class FakeConnection:
+    """Stand-in for a DB-API connection"""
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """Tests for connection reuse, limits and health checks"""
+
+    def test_reuses_returned_connection(self):
+        """Test a returned connection is handed out again"""
+        pool = ConnectionPool(max_size=2, timeout=1)
+        first = pool.get(FakeConnection)
+        pool.put(first)
+
+        self.assertIs(pool.get(FakeConnection), first)
+        self.assertEqual(pool.stats()['created'], 1)
+
+    def test_times_out_when_exhausted(self):
+        """Test get raises once max_size connections are in use"""
+        pool = ConnectionPool(max_size=1, timeout=0.05)
+        pool.get(FakeConnection)
+
+        with self.assertRaises(PoolTimeout), \
+                self.assertLogs('core.backends.postgresql_pool', 'WARNING'):
+            pool.get(FakeConnection)
+
+        stats = pool.stats()
+        self.assertEqual(stats['timeouts'], 1)
+        self.assertEqual(stats['in_use'], 1)
+
+    def test_waiter_gets_released_connection(self):
+        """Test a waiting caller receives a connection put back later"""
+        pool = ConnectionPool(max_size=1, timeout=2)
+        held = pool.get(FakeConnection)
+        timer = threading.Timer(0.05, pool.put, args=[held])
+        timer.start()
+
+        self.assertIs(pool.get(FakeConnection), held)
+        timer.join()
+        stats = pool.stats()
+        self.assertEqual(stats['waits'], 1)
+        self.assertGreater(stats['wait_seconds_max'], 0)
+
+    def test_wait_and_timeout_reported(self):
+        """Test every get reports its wait and timeouts are reported"""
+        waits, timeouts = [], []
+        pool = ConnectionPool(
+            max_size=1,
+            timeout=0.05,
+            on_wait=waits.append,
+            on_timeout=lambda: timeouts.append(True),
+        )
+        pool.get(FakeConnection)
+
+        with self.assertRaises(PoolTimeout), \
+                self.assertLogs('core.backends.postgresql_pool', 'WARNING'):
+            pool.get(FakeConnection)
+
+        self.assertEqual(len(waits), 1)
+        self.assertGreaterEqual(waits[0], 0)
+        self.assertEqual(timeouts, [True])
+
+    def test_failed_health_check_replaces_connection(self):
+        """Test a connection failing its check is closed and replaced"""
+        pool = ConnectionPool(
+            max_size=1,
+            timeout=1,
+            check=lambda connection: False,
+        )
+        stale = pool.get(FakeConnection)
+        pool.put(stale)
+
+        fresh = pool.get(FakeConnection)
+
+        self.assertIsNot(fresh, stale)
+        self.assertTrue(stale.closed)
+        self.assertEqual(pool.stats()['discarded'], 1)
+
+    def test_recently_used_connection_skips_check(self):
+        """Test connections idle less than check_after are not checked"""
+        checked = []
+        pool = ConnectionPool(
+            max_size=1,
+            timeout=1,
+            check=checked.append,
+            check_after=60,
+        )
+        pool.put(pool.get(FakeConnection))
+        pool.get(FakeConnection)
+
+        self.assertEqual(checked, [])
+
+    @patch('core.backends.postgresql_pool.pool.time.monotonic')
+    def test_expired_connection_is_closed(self, monotonic):
+        """Test connections past max_lifetime are not reused"""
+        monotonic.return_value = 100
+        pool = ConnectionPool(max_size=1, timeout=1, max_lifetime=30)
+        old = pool.get(FakeConnection)
+        monotonic.return_value = 131
+
+        pool.put(old)
+
+        self.assertTrue(old.closed)
+        self.assertIsNot(pool.get(FakeConnection), old)
+
+    def test_unusable_connection_is_not_pooled(self):
+        """Test a connection returned as broken frees its slot"""
+        pool = ConnectionPool(max_size=1, timeout=1)
+        broken = pool.get(FakeConnection)
+
+        pool.put(broken, reusable=False)
+
+        self.assertTrue(broken.closed)
+        self.assertEqual(pool.stats()['size'], 0)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Needs PostgreSQL')
+class PooledBackendTests(SimpleTestCase):
+    """Tests for the backend handing connections to and from the pool"""
+    alias = 'pool_test'
+
+    def make_wrapper(self, **settings):
+        """Return a backend connection to the test database"""
+        wrapper = PooledDatabaseWrapper(
+            {**connection.settings_dict, **settings}, self.alias,
+        )
+        self.addCleanup(close_pools, self.alias)
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def run_request(self, wrapper):
+        """Query like a request would, then end it like request_finished,
+        and return the server process that answered"""
+        wrapper.close_if_unusable_or_obsolete()
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT pg_backend_pid()')
+            pid = cursor.fetchone()[0]
+        wrapper.close_if_unusable_or_obsolete()
+        return pid
+
+    def terminate(self, pid):
+        """End a server process and wait until it is gone"""
+        admin = self.make_wrapper(POOL=None)
+        with admin.cursor() as cursor:
+            cursor.execute('SELECT pg_terminate_backend(%s)', [pid])
+            for _ in range(100):
+                cursor.execute(
+                    'SELECT 1 FROM pg_stat_activity WHERE pid = %s', [pid],
+                )
+                if cursor.fetchone() is None:
+                    return
+                time.sleep(0.05)
+        self.fail(f'Server process {pid} did not exit')
+
+    def test_request_returns_connection_to_pool(self):
+        """Test each request gets the pooled connection and gives it back"""
+        name = 'recipe_api_db_pool_wait_seconds_count'
+        labels = {'database': self.alias}
+        before = REGISTRY.get_sample_value(name, labels) or 0
+        wrapper = self.make_wrapper(
+            CONN_MAX_AGE=0, POOL={'MAX_SIZE': 1, 'TIMEOUT': 1},
+        )
+
+        first = self.run_request(wrapper)
+        self.assertIsNone(wrapper.connection)
+        second = self.run_request(wrapper)
+
+        self.assertEqual(first, second)
+        stats = wrapper._pool.stats()
+        self.assertEqual(stats['created'], 1)
+        self.assertEqual(stats['acquired'], 2)
+        self.assertEqual(stats['in_use'], 0)
+        self.assertEqual(stats['idle'], 1)
+        self.assertEqual(REGISTRY.get_sample_value(name, labels), before + 2)
+
+    def test_pool_replaces_broken_connection(self):
+        """Test a pooled connection whose server went away is replaced"""
+        wrapper = self.make_wrapper(
+            CONN_MAX_AGE=0, POOL={'MAX_SIZE': 1, 'TIMEOUT': 1},
+        )
+        first = self.run_request(wrapper)
+        self.terminate(first)
+
+        second = self.run_request(wrapper)
+
+        self.assertNotEqual(first, second)
+        self.assertEqual(wrapper._pool.stats()['discarded'], 1)
+
+    def test_health_check_reconnects(self):
+        """Test a persistent connection is checked and reopened when the
+        next request starts"""
+        wrapper = self.make_wrapper(
+            CONN_MAX_AGE=None, CONN_HEALTH_CHECKS=True, POOL=None,
+        )
+        first = self.run_request(wrapper)
+        self.assertIsNotNone(wrapper.connection)
+        self.terminate(first)
+
+        second = self.run_request(wrapper)
+
+        self.assertNotEqual(first, second)
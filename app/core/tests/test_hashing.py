@@ -0,0 +1,188 @@
+"""
+Tests for password hashing admission control
+"""
+import fcntl
+import os
+import tempfile
+from unittest.mock import patch
+
+from django.contrib.auth import (
+    authenticate,
+    get_user_model,
+)
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.hashing import (
+    PasswordHashingBusy,
+    PasswordHashingSlots,
+)
+
+
+TOKEN_URL = reverse('user:token')
+CREATE_USER_URL = reverse('user:create')
+ME_URL = reverse('user:me')
+
+
+class PasswordHashingSlotsTests(SimpleTestCase):
+    """Tests for admission control with host slots"""
+
+    def setUp(self):
+        self.lock_dir = tempfile.mkdtemp()
+        self.slots = PasswordHashingSlots(
+            host_slots=1,
+            lock_dir=self.lock_dir,
+            retry_after=3,
+        )
+
+    def _lock_from_other_process(self):
+        path = os.path.join(self.lock_dir, 'slot-0.lock')
+        other_process = open(path, 'a')
+        self.addCleanup(other_process.close)
+        fcntl.flock(other_process, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return other_process
+
+    def test_hold_takes_slot(self):
+        """Test a held slot is locked for other processes and threads"""
+        with self.slots.hold():
+            with self.assertRaises(BlockingIOError):
+                self._lock_from_other_process()
+            with self.assertRaises(PasswordHashingBusy):
+                with self.slots.hold():
+                    pass
+
+        self._lock_from_other_process()
+
+    def test_rejects_when_host_slots_taken(self):
+        """Test a slot held by another process rejects new work"""
+        other_process = self._lock_from_other_process()
+
+        with self.assertRaises(PasswordHashingBusy) as ctx:
+            with self.slots.hold():
+                pass
+
+        self.assertEqual(ctx.exception.wait, 3)
+        fcntl.flock(other_process, fcntl.LOCK_UN)
+        with self.slots.hold():
+            pass
+
+    def test_slot_released_after_error(self):
+        """Test a failing block releases its slot"""
+        with self.assertRaises(ZeroDivisionError):
+            with self.slots.hold():
+                1 / 0
+
+        with self.slots.hold():
+            pass
+
+
+class PasswordHashingApiTests(TestCase):
+    """Tests for hashing on the login and signup paths"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='sample123',
+        )
+
+    @patch('core.hashing.PasswordHashingSlots.hold')
+    def test_login_returns_503_when_busy(self, patched_hold):
+        """Test taken slots turn logins away with Retry-After"""
+        patched_hold.side_effect = PasswordHashingBusy(2)
+
+        res = self.client.post(
+            TOKEN_URL,
+            {'email': 'user@example.com', 'password': 'sample123'},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res['Retry-After'], '2')
+
+    @patch('core.hashing.PasswordHashingSlots.hold')
+    def test_signup_returns_503_when_busy(self, patched_hold):
+        """Test taken slots turn signups away"""
+        patched_hold.side_effect = PasswordHashingBusy(1)
+
+        res = self.client.post(CREATE_USER_URL, {
+            'email': 'new@example.com',
+            'password': 'sample123',
+            'name': 'New',
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertFalse(
+            get_user_model().objects.filter(email='new@example.com').exists()
+        )
+
+    def test_outdated_hash_is_upgraded(self):
+        """Test logging in rehashes a password with outdated settings"""
+        old_hash = PBKDF2PasswordHasher().encode(
+            'sample123', 'oldsalt', iterations=1000,
+        )
+        self.user.password = old_hash
+        self.user.save()
+
+        res = self.client.post(
+            TOKEN_URL,
+            {'email': 'user@example.com', 'password': 'sample123'},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertNotEqual(self.user.password, old_hash)
+        self.assertTrue(self.user.check_password('sample123'))
+
+    @patch('core.hashing.PasswordHashingSlots.hold')
+    def test_password_change_returns_503_when_busy(self, patched_hold):
+        """Test taken slots turn password changes away, but not other
+        profile updates"""
+        patched_hold.side_effect = PasswordHashingBusy(1)
+        self.client.force_authenticate(self.user)
+
+        res = self.client.patch(ME_URL, {'password': 'newpass123'})
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        res = self.client.patch(ME_URL, {'name': 'Renamed'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.name, 'Renamed')
+        self.assertTrue(self.user.check_password('sample123'))
+
+    @patch('core.hashing.PasswordHashingSlots.hold')
+    def test_hashing_outside_api_is_not_admitted(self, patched_hold):
+        """Test the model and auth backends hash without a slot"""
+        patched_hold.side_effect = PasswordHashingBusy(1)
+
+        self.user.set_password('newpass123')
+        self.user.save()
+
+        self.assertTrue(self.user.check_password('newpass123'))
+        self.assertEqual(
+            authenticate(username='user@example.com', password='newpass123'),
+            self.user,
+        )
+        self.assertIsNone(
+            authenticate(username='nobody@example.com', password='x'),
+        )
+        patched_hold.assert_not_called()
+
+    @override_settings(PASSWORD_HASHING={'ENABLED': False})
+    @patch('core.hashing.PasswordHashingSlots.hold')
+    def test_admission_can_be_disabled(self, patched_hold):
+        """Test logins take no slot with admission control off"""
+        res = self.client.post(
+            TOKEN_URL,
+            {'email': 'user@example.com', 'password': 'sample123'},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        patched_hold.assert_not_called()
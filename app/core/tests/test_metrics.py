@@ -0,0 +1,159 @@
+"""
+Tests for the Prometheus metrics
+"""
+import tempfile
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import (
+    TestCase,
+    override_settings,
+)
+from django.urls import reverse
+
+from prometheus_client import REGISTRY
+from rest_framework.test import APIClient
+
+from core.metrics import (
+    build_registry,
+    record_pool_timeout,
+    record_pool_wait,
+)
+from core.models import (
+    ImageJob,
+    Recipe,
+)
+
+
+METRICS_URL = reverse('metrics')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class MetricsTests(TestCase):
+    """Test requests, queries and caches are measured and exposed"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=5,
+            price='5.00',
+        )
+
+    def test_request_latency_by_route(self):
+        """Test requests are counted per route, method and status"""
+        labels = {'route': 'recipe:recipe-list', 'method': 'GET'}
+        before = sample('recipe_api_request_duration_seconds_count', **labels)
+        before_ok = sample('recipe_api_requests_total', status='200', **labels)
+
+        self.client.get(RECIPES_URL)
+
+        self.assertEqual(
+            sample('recipe_api_request_duration_seconds_count', **labels),
+            before + 1,
+        )
+        self.assertEqual(
+            sample('recipe_api_requests_total', status='200', **labels),
+            before_ok + 1,
+        )
+
+    def test_db_queries_observed(self):
+        """Test queries run by a request are timed"""
+        name = 'recipe_api_db_query_duration_seconds_count'
+        before = sample(name, database='default')
+
+        self.client.get(RECIPES_URL)
+
+        self.assertGreater(sample(name, database='default'), before)
+
+    def test_pool_wait_and_timeouts(self):
+        """Test pooled connection waits and timeouts are exposed"""
+        wait = sample('recipe_api_db_pool_wait_seconds_count', database='x')
+        timeouts = sample('recipe_api_db_pool_timeouts_total', database='x')
+
+        record_pool_wait('x', 0.2)
+        record_pool_timeout('x')
+
+        self.assertEqual(
+            sample('recipe_api_db_pool_wait_seconds_count', database='x'),
+            wait + 1,
+        )
+        self.assertEqual(
+            sample('recipe_api_db_pool_timeouts_total', database='x'),
+            timeouts + 1,
+        )
+        body = APIClient().get(METRICS_URL).content.decode()
+        self.assertIn('recipe_api_db_pool_wait_seconds_bucket{', body)
+        self.assertIn('recipe_api_db_pool_timeouts_total{', body)
+
+    @override_settings(RECIPE_CACHE_ENABLED=True)
+    def test_cache_lookups_counted(self):
+        """Test response cache hits and misses are counted"""
+        name = 'recipe_api_cache_requests_total'
+        hits = sample(name, cache='recipe_response', result='hit')
+        misses = sample(name, cache='recipe_response', result='miss')
+
+        self.client.get(RECIPES_URL)
+        self.client.get(RECIPES_URL)
+
+        self.assertEqual(
+            sample(name, cache='recipe_response', result='miss'), misses + 1,
+        )
+        self.assertEqual(
+            sample(name, cache='recipe_response', result='hit'), hits + 1,
+        )
+
+    def test_metrics_endpoint(self):
+        """Test the endpoint exposes request and image queue metrics"""
+        ImageJob.objects.create(recipe=self.recipe, source='a.jpg')
+        self.client.get(RECIPES_URL)
+
+        res = APIClient().get(METRICS_URL)
+
+        self.assertEqual(res.status_code, 200)
+        body = res.content.decode()
+        self.assertIn('recipe_api_request_duration_seconds_bucket{', body)
+        self.assertIn('recipe_api_image_jobs{status="pending"} 1.0', body)
+        self.assertIn('recipe_api_image_jobs{status="failed"} 0.0', body)
+
+    def test_metrics_token(self):
+        """Test a configured token is required"""
+        with override_settings(METRICS={'ENABLED': True, 'TOKEN': 'secret'}):
+            missing = APIClient().get(METRICS_URL)
+            wrong = APIClient().get(
+                METRICS_URL, HTTP_AUTHORIZATION='Bearer nope',
+            )
+            right = APIClient().get(
+                METRICS_URL, HTTP_AUTHORIZATION='Bearer secret',
+            )
+
+        self.assertEqual(missing.status_code, 401)
+        self.assertEqual(wrong.status_code, 401)
+        self.assertEqual(right.status_code, 200)
+
+    def test_disabled(self):
+        """Test the endpoint is hidden when metrics are off"""
+        with override_settings(METRICS={'ENABLED': False, 'TOKEN': ''}):
+            res = APIClient().get(METRICS_URL)
+
+        self.assertEqual(res.status_code, 404)
+
+    def test_multiprocess_registry(self):
+        """Test worker files are read in multiprocess mode"""
+        with tempfile.TemporaryDirectory() as directory, \
+                patch.dict('os.environ', PROMETHEUS_MULTIPROC_DIR=directory):
+            names = {
+                metric.name for metric in build_registry().collect()
+            }
+
+        self.assertEqual(names, {'recipe_api_image_jobs'})
@@ -0,0 +1,136 @@
+"""
+Tests for request profiling
+"""
+import json
+from unittest.mock import Mock
+
+from django.contrib.auth import get_user_model
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import (
+    Recipe,
+    Tag,
+)
+from core.profiling import (
+    RequestProfile,
+    server_timing,
+)
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+ME_URL = reverse('user:me')
+
+
+def profiling(**options):
+    return override_settings(REQUEST_PROFILING={
+        'ENABLED': True,
+        'SAMPLE_RATE': 1.0,
+        'SLOW_MS': None,
+        'SERVER_TIMING': True,
+        **options,
+    })
+
+
+class RequestProfileTests(SimpleTestCase):
+    """Test the per-request counters"""
+
+    def test_counts_queries_and_duplicates(self):
+        """Test repeated queries with the same parameters are counted"""
+        profile = RequestProfile()
+        execute = Mock(return_value='rows')
+
+        for params in ((1,), (2,), (1,)):
+            result = profile(execute, 'SELECT %s', params, False, {})
+
+        self.assertEqual(result, 'rows')
+        self.assertEqual(profile.queries, 3)
+        self.assertEqual(profile.duplicate_queries, 1)
+        self.assertIn('desc="3 queries, 1 duplicate"',
+                      server_timing(0.01, profile))
+
+    def test_nested_serializer_time_counted_once(self):
+        """Test only the outermost serializer call is timed"""
+        profile = RequestProfile()
+
+        with profile.timing_serializer():
+            self.assertTrue(profile.serializing)
+
+        self.assertFalse(profile.serializing)
+        self.assertGreater(profile.serializer_time, 0)
+
+
+class ProfilingMiddlewareTests(TestCase):
+    """Test sampled requests report their timings"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=5,
+            price='5.00',
+        )
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+
+    def test_disabled_by_default(self):
+        """Test no header is sent unless profiling is enabled"""
+        res = self.client.get(RECIPES_URL)
+
+        self.assertNotIn('Server-Timing', res)
+
+    def test_recipe_list_profiled(self):
+        """Test a sampled request gets Server-Timing and a log line"""
+        with profiling(), self.assertLogs('core.profiling') as logs:
+            res = self.client.get(RECIPES_URL)
+
+        timing = res['Server-Timing']
+        self.assertIn('total;dur=', timing)
+        self.assertIn('db;dur=', timing)
+        self.assertIn('serializer;dur=', timing)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'recipe:recipe-list')
+        self.assertEqual(record['status'], 200)
+        self.assertTrue(record['sampled'])
+        self.assertGreater(record['queries'], 0)
+        self.assertGreater(record['serializer_ms'], 0)
+
+    def test_user_view_profiled(self):
+        """Test the user views are covered"""
+        with profiling(), self.assertLogs('core.profiling') as logs:
+            res = self.client.get(ME_URL)
+
+        self.assertIn('Server-Timing', res)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'user:me')
+        self.assertGreater(record['serializer_ms'], 0)
+
+    def test_header_can_be_disabled(self):
+        """Test timings can be logged without being sent to clients"""
+        with profiling(SERVER_TIMING=False), \
+                self.assertLogs('core.profiling'):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertNotIn('Server-Timing', res)
+
+    def test_unsampled_request(self):
+        """Test unsampled requests are only logged when slow"""
+        with profiling(SAMPLE_RATE=0.0, SLOW_MS=0), \
+                self.assertLogs('core.profiling') as logs:
+            res = self.client.get(RECIPES_URL)
+
+        self.assertNotIn('Server-Timing', res)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertFalse(record['sampled'])
+        self.assertNotIn('queries', record)
@@ -0,0 +1,188 @@
+"""
+Tests for read replica routing
+"""
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DatabaseError
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import routers
+from core.models import Recipe
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0', 'replica_1'])
+class ReplicaRouterTests(SimpleTestCase):
+    """Tests for the router's choice of database"""
+
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+        routers.reset_health()
+
+    def test_reads_use_primary_by_default(self):
+        """Test reads outside replica_reads() are not routed"""
+        self.assertIsNone(self.router.db_for_read(Recipe))
+
+    @patch('core.routers._check', return_value=True)
+    def test_opted_in_reads_use_replica(self, _check):
+        """Test reads inside replica_reads() go to a replica"""
+        with routers.replica_reads():
+            db = self.router.db_for_read(Recipe)
+
+        self.assertIn(db, ['replica_0', 'replica_1'])
+        self.assertEqual(self.router.db_for_write(Recipe), 'default')
+
+    @patch('core.routers._check')
+    def test_unhealthy_replica_skipped(self, _check):
+        """Test a failing replica is skipped and the result is cached"""
+        _check.side_effect = lambda alias: alias == 'replica_1'
+
+        with routers.replica_reads():
+            dbs = {self.router.db_for_read(Recipe) for _ in range(10)}
+
+        self.assertEqual(dbs, {'replica_1'})
+        self.assertEqual(_check.call_count, 2)
+
+    @patch('core.routers._check', return_value=False)
+    def test_falls_back_to_primary(self, _check):
+        """Test reads go to the primary when no replica is healthy"""
+        with routers.replica_reads():
+            self.assertEqual(self.router.db_for_read(Recipe), 'default')
+
+    def test_check_handles_connection_error(self):
+        """Test a replica that cannot connect is reported unhealthy"""
+        with patch('core.routers.connections') as connections:
+            connection = connections.__getitem__.return_value
+            connection.ensure_connection.side_effect = DatabaseError
+
+            self.assertFalse(routers._check('replica_0'))
+            connection.close.assert_called_once()
+
+    def test_no_migrations_on_replicas(self):
+        """Test migrations only run on the primary"""
+        self.assertTrue(self.router.allow_migrate('default', 'core'))
+        self.assertFalse(self.router.allow_migrate('replica_0', 'core'))
+
+
+class PinCacheCheckTests(SimpleTestCase):
+    """Test replicas are refused without a shared cache for the pin"""
+
+    def test_no_replicas(self):
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(routers.check_pin_cache(), [])
+
+    def test_process_local_cache_refused(self):
+        """Test a LocMemCache pin cache is an error"""
+        with override_settings(
+            DATABASE_REPLICAS=['replica_0'],
+            REPLICA_ROUTING={'CACHE_ALIAS': 'default'},
+        ):
+            errors = routers.check_pin_cache()
+
+        self.assertEqual([error.id for error in errors], ['core.E002'])
+
+    def test_unknown_alias_refused(self):
+        with override_settings(
+            DATABASE_REPLICAS=['replica_0'],
+            REPLICA_ROUTING={'CACHE_ALIAS': 'missing'},
+        ):
+            errors = routers.check_pin_cache()
+
+        self.assertEqual([error.id for error in errors], ['core.E001'])
+
+    def test_shared_cache_allowed(self):
+        with override_settings(
+            DATABASE_REPLICAS=['replica_0'],
+            REPLICA_ROUTING={'CACHE_ALIAS': 'shared'},
+            CACHES={'shared': {
+                'BACKEND': 'django.core.cache.backends.memcached'
+                           '.PyMemcacheCache',
+            }},
+        ):
+            self.assertEqual(routers.check_pin_cache(), [])
+
+
+@override_settings(DATABASE_REPLICAS=['default'])
+@patch('core.routers._check', return_value=True)
+class ReplicaReadApiTests(TestCase):
+    """Tests for replica routing of recipe API requests.
+
+    'default' stands in for the replica so reads can actually run.
+    """
+
+    def setUp(self):
+        caches['recipe'].clear()
+        routers.reset_health()
+        routers.reset_routing_stats()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='sample123',
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_reads_go_to_replica(self, _check):
+        """Test a GET is served from the replica"""
+        self.client.get(RECIPES_URL)
+
+        self.assertGreater(routers.routing_stats()['replica'], 0)
+
+    def test_user_pinned_after_write(self, _check):
+        """Test reads after a write stay on the primary"""
+        self.client.post(RECIPES_URL, {
+            'title': 'Sample recipe',
+            'time_minutes': 30,
+            'price': Decimal('5.99'),
+        })
+        routers.reset_routing_stats()
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(len(res.data), 1)
+        self.assertTrue(routers.is_pinned(self.user.pk))
+        self.assertEqual(routers.routing_stats(), {})
+
+    def test_pin_is_per_user(self, _check):
+        """Test one user's write does not pin another user"""
+        routers.pin_to_primary(self.user.pk + 1)
+
+        self.client.get(RECIPES_URL)
+
+        self.assertGreater(routers.routing_stats()['replica'], 0)
+
+
+class ReplicaReadDisabledTests(TestCase):
+    """Tests for requests when no replicas are configured"""
+
+    def test_write_does_not_pin(self):
+        """Test writes skip the pin cache without replicas"""
+        user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='sample123',
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+
+        with override_settings(DATABASE_REPLICAS=[]), \
+                patch('core.routers.pin_to_primary') as pin:
+            res = client.post(RECIPES_URL, {
+                'title': 'Sample recipe',
+                'time_minutes': 30,
+                'price': Decimal('5.99'),
+            })
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        pin.assert_not_called()
@@ -0,0 +1,66 @@
+"""
+Tests for content addressed storage
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase
+
+from core.storage import ContentAddressedStorage
+
+
+class ContentAddressedStorageTests(SimpleTestCase):
+    """Test files are named after and stored once per content"""
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location, True)
+        self.storage = ContentAddressedStorage(location=self.location)
+
+    def test_name_from_content(self):
+        """Test the stored name is the content's SHA-256"""
+        digest = hashlib.sha256(b'image data').hexdigest()
+
+        name = self.storage.save(
+            'uploads/recipe/photo.JPG', ContentFile(b'image data'),
+        )
+
+        self.assertEqual(name, f'uploads/recipe/{digest[:2]}/{digest}.jpg')
+        with self.storage.open(name) as file:
+            self.assertEqual(file.read(), b'image data')
+
+    def test_same_content_stored_once(self):
+        """Test saving the same bytes twice returns the same name"""
+        first = self.storage.save('a/one.jpg', ContentFile(b'same'))
+        second = self.storage.save('a/two.jpg', ContentFile(b'same'))
+        other = self.storage.save('a/three.jpg', ContentFile(b'other'))
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        directory = os.path.dirname(first)
+        self.assertEqual(self.storage.listdir(directory)[1], [
+            os.path.basename(first),
+        ])
+
+    def test_precomputed_hash_used(self):
+        """Test a content_hash set while uploading is trusted"""
+        content = ContentFile(b'image data')
+        content.content_hash = 'ab' * 32
+
+        name = self.storage.save('a/photo.png', content)
+
+        self.assertEqual(name, f'a/ab/{"ab" * 32}.png')
+
+    def test_restore_missing_file(self):
+        """Test restore writes a deleted file back under the same name"""
+        name = self.storage.save('a/photo.jpg', ContentFile(b'image data'))
+        self.storage.delete(name)
+
+        self.storage.restore(name, ContentFile(b'image data'))
+        self.storage.restore(name, ContentFile(b'ignored'))
+
+        with self.storage.open(name) as file:
+            self.assertEqual(file.read(), b'image data')
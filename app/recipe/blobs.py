@@ -0,0 +1,103 @@
+"""reference counting and garbage collection of stored recipe images
+
+Recipe images are stored once per distinct content (see
+core.storage.ContentAddressedStorage), so one file may back many recipes.
+Each file has an ImageBlob row counting the recipes that use it, kept up
+to date by the Recipe signal handlers. Files no recipe has used for a
+grace period are deleted in batches by the collect_image_blobs command.
+"""
+from datetime import timedelta
+
+from django.db import (
+    connections,
+    router,
+    transaction,
+)
+from django.db.models import F
+from django.utils import timezone
+
+from core.models import (
+    ImageBlob,
+    Recipe,
+)
+from recipe.images import delete_derivatives
+
+
+# Covers the time between a file being stored and counted
+GRACE_PERIOD = timedelta(hours=1)
+
+
+def acquire(name, content=None):
+    """Count one more recipe using the stored file.
+
+    Saving content that is already stored writes nothing, so the file may
+    have been collected between that save and this call. Once counted it
+    is safe from collection, and is written again from `content` if gone.
+
+    The row is inserted or incremented by one upsert. A separate insert
+    and update could lose the count: the update waits on a row that
+    collect_garbage has locked, then matches nothing once it is deleted.
+    The upsert instead inserts a new row when the locked one goes away.
+    """
+    connection = connections[router.db_for_write(ImageBlob)]
+    quote = connection.ops.quote_name
+    table = quote(ImageBlob._meta.db_table)
+    name_column, ref_count, created_at, updated_at = (
+        quote(ImageBlob._meta.get_field(field).column)
+        for field in ('name', 'ref_count', 'created_at', 'updated_at')
+    )
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} '
+            f'({name_column}, {ref_count}, {created_at}, {updated_at}) '
+            f'VALUES (%s, 1, %s, %s) '
+            f'ON CONFLICT ({name_column}) DO UPDATE SET '
+            f'{ref_count} = {table}.{ref_count} + 1, '
+            f'{updated_at} = EXCLUDED.{updated_at}',
+            [name, now, now],
+        )
+
+    if content is not None:
+        Recipe._meta.get_field('image').storage.restore(name, content)
+
+
+def release(name):
+    """Count one less recipe using the stored file"""
+    ImageBlob.objects.filter(name=name, ref_count__gt=0).update(
+        ref_count=F('ref_count') - 1,
+        updated_at=timezone.now(),
+    )
+
+
+def collect_garbage(batch_size=500, grace_period=GRACE_PERIOD):
+    """Delete stored images no recipe uses and return how many.
+
+    Each batch of unused rows is locked with SELECT ... FOR UPDATE, which
+    re-checks ref_count = 0 on the locked rows, and kept locked while
+    their files are deleted. An upload acquiring the same content either
+    wins the row first, so the row is skipped, or its upsert waits until
+    the file and row are gone, then inserts a new row and restores the
+    file.
+    """
+    storage = Recipe._meta.get_field('image').storage
+    cutoff = timezone.now() - grace_period
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            blobs = list(
+                ImageBlob.objects.select_for_update(skip_locked=True)
+                .filter(ref_count=0, updated_at__lt=cutoff)
+                .order_by('ref_count', 'updated_at')
+                .values_list('id', 'name')[:batch_size]
+            )
+            if not blobs:
+                return deleted
+
+            for _blob_id, name in blobs:
+                storage.delete(name)
+                delete_derivatives(name)
+            ImageBlob.objects.filter(
+                id__in=[blob_id for blob_id, _name in blobs],
+            ).delete()
+        deleted += len(blobs)
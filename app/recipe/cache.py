@@ -0,0 +1,119 @@
+"""per-user response cache for recipe api
+
+Cached responses are keyed on the user's data version read from the
+database (see recipe.conditional) and on a per-user generation number.
+The data version changes with every write no matter which process made
+it, so responses stay fresh even when each uWSGI worker has its own
+LocMemCache. The generation, bumped on every write, additionally drops
+entries at once when the cache is shared; stale entries age out through
+the backend's TTL and LRU eviction.
+
+With LocMemCache each worker fills its own copy of the cache, so use a
+shared backend (RECIPE_CACHE_BACKEND) whenever more than one process
+serves the API.
+"""
+import hashlib
+import time
+from collections import Counter
+from functools import partial
+
+from django.core.cache import caches
+from django.db import (
+    connection,
+    transaction,
+)
+
+from core.metrics import record_cache_lookup
+from recipe import conditional
+
+
+CACHE_ALIAS = 'recipe'
+
+_stats = Counter()
+
+
+def _get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def _generation_key(user_id):
+    return f'gen:{user_id}'
+
+
+def get_generation(user_id):
+    """Return the current cache generation for a user"""
+    cache = _get_cache()
+    key = _generation_key(user_id)
+    generation = cache.get(key)
+    if generation is None:
+        # Start from the clock so a generation lost to eviction never
+        # comes back with a number that older entries were stored under.
+        cache.add(key, time.time_ns(), timeout=None)
+        generation = cache.get(key)
+
+    return generation
+
+
+def _bump_generation(user_id):
+    cache = _get_cache()
+    key = _generation_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def invalidate_user(user_id):
+    """Move a user's data version on and drop their cached responses.
+
+    The data version is updated in the write's transaction. Inside a
+    transaction the generation is bumped again on commit, so a read that
+    raced the write cannot leave pre-commit data cached.
+    """
+    conditional.bump_data_version(user_id)
+    _bump_generation(user_id)
+    if connection.in_atomic_block:
+        transaction.on_commit(partial(_bump_generation, user_id))
+
+
+def response_key(request, version):
+    """Return the cache key for a request's response.
+
+    `version` is the user's data version read from the database. It is
+    required: the generation alone is not seen by other workers when the
+    cache is private to each process.
+    """
+    generation = get_generation(request.user.pk)
+    url = hashlib.md5(
+        f'{version}|{request.build_absolute_uri()}'.encode()
+    ).hexdigest()
+    return f'resp:{request.user.pk}:{generation}:{url}'
+
+
+def get_cached(key):
+    """Return cached response data, counting the hit or miss"""
+    data = _get_cache().get(key)
+    _stats['hits' if data is not None else 'misses'] += 1
+    record_cache_lookup('recipe_response', data is not None)
+    return data
+
+
+def set_cached(key, data):
+    """Store response data in the cache"""
+    _get_cache().set(key, data)
+
+
+def cache_stats():
+    """Return the response cache hit and miss counts of this process"""
+    hits, misses = _stats['hits'], _stats['misses']
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / total if total else 0.0,
+    }
+
+
+def reset_cache_stats():
+    """Reset the response cache hit and miss counts"""
+    _stats.clear()
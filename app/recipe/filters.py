@@ -0,0 +1,117 @@
+"""query filters for recipe api"""
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+)
+from django.db import connections
+from django.db.models import (
+    Count,
+    Exists,
+    F,
+    FloatField,
+    Func,
+    OuterRef,
+    Q,
+    Value,
+)
+from django.db.models.functions import (
+    Cast,
+    Collate,
+    Upper,
+)
+
+from core.models import Recipe
+
+
+MATCH_ANY = 'any'
+MATCH_ALL = 'all'
+MATCH_MODES = (MATCH_ANY, MATCH_ALL)
+
+# Must match the text search config used by the trigger in migration 0009
+SEARCH_CONFIG = 'english'
+
+
+def _links(relation):
+    """Return the through model and target column of a recipe M2M"""
+    field = Recipe._meta.get_field(relation)
+    through = field.remote_field.through
+    return through, f'{field.m2m_reverse_field_name()}_id'
+
+
+def filter_recipes_by_related(queryset, relation, ids, mode=MATCH_ANY):
+    """Filter recipes linked to `ids` through `relation` with EXISTS.
+
+    A semi-join on the through table never duplicates recipe rows, so the
+    result needs no DISTINCT. `any` keeps recipes linked to at least one of
+    the ids, `all` keeps recipes linked to every one of them.
+    """
+    through, column = _links(relation)
+    links = through.objects.filter(recipe_id=OuterRef('pk'))
+
+    if mode == MATCH_ALL:
+        for item_id in set(ids):
+            queryset = queryset.filter(
+                Exists(links.filter(**{column: item_id}))
+            )
+        return queryset
+
+    return queryset.filter(Exists(links.filter(**{f'{column}__in': ids})))
+
+
+def filter_assigned(queryset, relation):
+    """Keep tags or ingredients used by at least one recipe, via EXISTS"""
+    through, column = _links(relation)
+    return queryset.filter(
+        Exists(through.objects.filter(**{column: OuterRef('pk')}))
+    )
+
+
+def annotate_recipe_counts(queryset, user):
+    """Annotate tags or ingredients with the number of the user's recipes
+    using them, computed by one GROUP BY instead of per-row lookups"""
+    return queryset.annotate(
+        recipe_count=Count('recipe', filter=Q(recipe__user=user)),
+    )
+
+
+def filter_name_prefix(queryset, prefix):
+    """Keep names starting with prefix, ignoring case, sorted by name.
+
+    On PostgreSQL the filter and the sort both use UPPER(name) in the "C"
+    collation, the expression indexed with the user and id by migration
+    0013. The scan then reads matches in index order and stops at the
+    LIMIT instead of sorting every match. Names sort by code point.
+    """
+    if connections[queryset.db].vendor != 'postgresql':
+        return queryset.filter(name__istartswith=prefix).order_by(
+            Upper('name'), 'id',
+        )
+
+    # Parenthesized so the ::text cast added by LIKE lookups applies to
+    # the collated value rather than to the collation name
+    name_key = Func(Collate(Upper('name'), 'C'), template='(%(expressions)s)')
+    return queryset.alias(name_key=name_key).filter(
+        name_key__startswith=Upper(Value(prefix)),
+    ).order_by('name_key', 'id')
+
+
+def search_recipes(queryset, text):
+    """Filter recipes matching a web-style search and annotate their rank.
+
+    On PostgreSQL this matches the trigger-maintained `search_vector`
+    through its GIN index and ranks by ts_rank, cast to double precision
+    so the value round-trips exactly through a pagination cursor. Other
+    databases fall back to an unranked substring match.
+    """
+    if connections[queryset.db].vendor != 'postgresql':
+        return queryset.filter(
+            Q(title__icontains=text) | Q(description__icontains=text)
+        ).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+    return queryset.filter(search_vector=query).annotate(
+        search_rank=Cast(
+            SearchRank(F('search_vector'), query),
+            FloatField(),
+        ),
+    )
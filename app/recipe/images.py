@@ -0,0 +1,196 @@
+"""resized copies of recipe images, built off the request path
+
+Uploads queue an ImageJob row. The process_image_jobs command, started
+next to uWSGI with attach-daemon, claims jobs with SELECT ... FOR UPDATE
+SKIP LOCKED, so any number of workers can share the queue without a
+separate broker. Each job writes thumb, medium and large copies as JPEG
+and, when Pillow supports it, WebP. The copies carry no EXIF data; the
+EXIF orientation is applied to the pixels first.
+"""
+import logging
+import os
+from datetime import timedelta
+from io import BytesIO
+
+from PIL import (
+    Image,
+    ImageOps,
+    features,
+)
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.models import (
+    ImageJob,
+    Recipe,
+)
+from recipe.cache import invalidate_user
+
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVE_SIZES = {
+    'thumb': 200,
+    'medium': 800,
+    'large': 1600,
+}
+QUALITY = 82
+MAX_ATTEMPTS = 3
+# A running job not updated for this long belongs to a dead worker
+STALE_AFTER = timedelta(minutes=10)
+
+
+FORMATS = ('webp', 'jpeg')
+
+
+def derivative_formats():
+    """Return the formats to encode, best first"""
+    return [
+        image_format for image_format in FORMATS
+        if image_format != 'webp' or features.check('webp')
+    ]
+
+
+def derivative_name(source, size, image_format):
+    """Return the storage name of one derivative of source"""
+    stem = os.path.splitext(os.path.basename(source))[0]
+    extension = 'jpg' if image_format == 'jpeg' else image_format
+    return os.path.join(
+        'uploads', 'recipe', 'derivatives', stem, f'{size}.{extension}',
+    )
+
+
+def _encode(image, image_format):
+    if image_format == 'jpeg' and image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    buffer = BytesIO()
+    image.save(buffer, format=image_format.upper(), quality=QUALITY)
+    return ContentFile(buffer.getvalue())
+
+
+def build_derivatives(source, storage):
+    """Write the resized copies of source, read from storage, and return
+    their names.
+
+    The copies are written to the default storage under fixed names, not
+    to the content addressed storage of the source image.
+    """
+    with storage.open(source) as file:
+        image = Image.open(file)
+        # JPEGs decode straight to a scale close to the largest size
+        edge = max(DERIVATIVE_SIZES.values())
+        image.draft('RGB', (edge, edge))
+        image.load()
+
+    image = ImageOps.exif_transpose(image)
+    has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    derivatives = {}
+    for size, edge in DERIVATIVE_SIZES.items():
+        resized = image.copy()
+        resized.thumbnail((edge, edge), Image.LANCZOS)
+        derivatives[size] = {}
+        for image_format in derivative_formats():
+            name = derivative_name(source, size, image_format)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            derivatives[size][image_format] = default_storage.save(
+                name, _encode(resized, image_format),
+            )
+
+    return derivatives
+
+
+def delete_derivatives(source):
+    """Delete every resized copy of source"""
+    for size in DERIVATIVE_SIZES:
+        for image_format in FORMATS:
+            default_storage.delete(
+                derivative_name(source, size, image_format),
+            )
+
+
+def enqueue(recipe):
+    """Queue derivatives for the recipe's current image"""
+    return ImageJob.objects.create(recipe=recipe, source=recipe.image.name)
+
+
+def claim_job():
+    """Mark the oldest runnable job as running and return it"""
+    stale = timezone.now() - STALE_AFTER
+    with transaction.atomic():
+        job = ImageJob.objects.select_for_update(
+            skip_locked=True,
+        ).filter(
+            Q(status=ImageJob.PENDING) |
+            Q(status=ImageJob.RUNNING, updated_at__lt=stale)
+        ).order_by('id').first()
+        if job is None:
+            return None
+
+        job.status = ImageJob.RUNNING
+        job.attempts += 1
+        job.save(update_fields=['status', 'attempts', 'updated_at'])
+
+    return job
+
+
+def _finish(job, status, error=''):
+    job.status = status
+    job.error = error
+    job.save(update_fields=['status', 'error', 'updated_at'])
+
+
+def run_job(job):
+    """Build the derivatives for a claimed job"""
+    try:
+        recipe = Recipe.objects.only('id', 'user_id', 'image').get(
+            id=job.recipe_id,
+        )
+    except Recipe.DoesNotExist:
+        # The recipe was deleted, and its jobs with it
+        return
+
+    if recipe.image.name != job.source:
+        # A newer upload replaced this image and has its own job
+        _finish(job, ImageJob.DONE)
+        return
+
+    try:
+        derivatives = build_derivatives(job.source, recipe.image.storage)
+    except Exception as error:
+        logger.exception('Image job %s failed', job.id)
+        retry = job.attempts < MAX_ATTEMPTS
+        _finish(
+            job,
+            ImageJob.PENDING if retry else ImageJob.FAILED,
+            repr(error),
+        )
+        return
+
+    updated = Recipe.objects.filter(
+        id=recipe.id,
+        image=job.source,
+    ).update(image_derivatives=derivatives, updated_at=timezone.now())
+    if updated:
+        invalidate_user(recipe.user_id)
+    _finish(job, ImageJob.DONE)
+
+
+def process_jobs(limit=None):
+    """Run queued jobs until none are left or limit is reached"""
+    processed = 0
+    while limit is None or processed < limit:
+        job = claim_job()
+        if job is None:
+            break
+        run_job(job)
+        processed += 1
+
+    return processed
@@ -0,0 +1,273 @@
+"""bulk import of recipes from JSON or NDJSON
+
+Records are parsed from the stream one at a time, validated with the
+recipe serializer rules and written in chunks: one bulk insert for the
+recipes of a chunk, one per through table, and tag and ingredient names
+resolved once per import. Invalid rows are reported and skipped, the
+rest of the import carries on.
+"""
+import json
+from itertools import chain
+
+from django.db import (
+    DatabaseError,
+    connections,
+    router,
+    transaction,
+)
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+)
+from recipe import cache
+from recipe.serializers import (
+    RecipeImportSerializer,
+    get_or_create_by_name,
+)
+
+
+READ_SIZE = 64 * 1024
+MAX_RECORD_SIZE = 1024 * 1024
+
+
+class RecordError:
+    """A record that could not be parsed"""
+
+    def __init__(self, message):
+        self.message = message
+
+
+def _iter_chunks(stream, size):
+    while True:
+        chunk = stream.read(size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _too_large():
+    return RecordError(f'Record is larger than {MAX_RECORD_SIZE} bytes')
+
+
+def _iter_lines(buffer, chunks):
+    """Yield NDJSON records, one per non-blank line.
+
+    A line longer than MAX_RECORD_SIZE is reported once and dropped up to
+    the next newline instead of being buffered.
+    """
+    pending = ''
+    skipping = False
+    for chunk in chain([buffer], chunks):
+        pending += chunk
+        *lines, pending = pending.split('\n')
+        for line in lines:
+            if skipping:
+                skipping = False
+            elif len(line) > MAX_RECORD_SIZE:
+                yield _too_large()
+            elif line.strip():
+                yield _decode_line(line)
+
+        if len(pending) > MAX_RECORD_SIZE:
+            if not skipping:
+                yield _too_large()
+            skipping = True
+            pending = ''
+
+    if pending.strip() and not skipping:
+        yield _decode_line(pending)
+
+
+def _decode_line(line):
+    try:
+        return json.loads(line)
+    except ValueError as error:
+        return RecordError(f'Invalid JSON: {error}')
+
+
+def _iter_array(buffer, chunks):
+    """Yield the elements of a JSON array without loading all of it"""
+    decoder = json.JSONDecoder()
+    expect_value = True
+    while True:
+        buffer = buffer.lstrip()
+        if not buffer:
+            chunk = next(chunks, None)
+            if chunk is None:
+                yield RecordError('Unexpected end of JSON array')
+                return
+            buffer = chunk
+            continue
+
+        if buffer[0] == ']':
+            return
+        if not expect_value:
+            if buffer[0] != ',':
+                yield RecordError('Invalid JSON: expected "," or "]"')
+                return
+            buffer = buffer[1:]
+            expect_value = True
+            continue
+
+        try:
+            record, end = decoder.raw_decode(buffer)
+        except ValueError as error:
+            chunk = next(chunks, None)
+            if chunk is None or len(buffer) > MAX_RECORD_SIZE:
+                yield RecordError(f'Invalid JSON: {error}')
+                return
+            buffer += chunk
+            continue
+
+        yield record
+        buffer = buffer[end:]
+        expect_value = False
+
+
+def iter_records(stream, read_size=READ_SIZE):
+    """Yield records from a text stream holding a JSON array or NDJSON.
+
+    Unparseable records are yielded as RecordError. A syntax error inside
+    a JSON array ends the stream since the parser cannot resync.
+    """
+    chunks = _iter_chunks(stream, read_size)
+    buffer = ''
+    for chunk in chunks:
+        buffer += chunk
+        if buffer.strip():
+            break
+
+    buffer = buffer.lstrip()
+    if buffer.startswith('['):
+        return _iter_array(buffer[1:], chunks)
+    return _iter_lines(buffer, chunks)
+
+
+class RecipeImporter:
+    """Validate and bulk insert recipes for one user"""
+
+    def __init__(self, user, chunk_size=500, max_errors=1000):
+        self.user = user
+        self.chunk_size = chunk_size
+        self.max_errors = max_errors
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+        self._ids = {Tag: {}, Ingredient: {}}
+
+    def _add_error(self, row, errors):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': row, 'errors': errors})
+
+    def run(self, records):
+        """Import every record and return the report"""
+        pending = []
+        for row, record in enumerate(records, start=1):
+            if isinstance(record, RecordError):
+                self._add_error(row, {'non_field_errors': [record.message]})
+                continue
+
+            serializer = RecipeImportSerializer(data=record)
+            if not serializer.is_valid():
+                self._add_error(row, serializer.errors)
+                continue
+
+            pending.append((row, serializer.validated_data))
+            if len(pending) >= self.chunk_size:
+                self._flush(pending)
+                pending = []
+
+        if pending:
+            self._flush(pending)
+        if self.created:
+            cache.invalidate_user(self.user.pk)
+
+        return self.report()
+
+    def report(self):
+        return {
+            'created': self.created,
+            'failed': self.failed,
+            'errors': self.errors,
+        }
+
+    def _flush(self, pending):
+        """Write one chunk in its own transaction"""
+        try:
+            with transaction.atomic():
+                recipes, related = self._write(
+                    [data for _row, data in pending]
+                )
+        except DatabaseError as error:
+            for row, _data in pending:
+                self._add_error(row, {'non_field_errors': [str(error)]})
+            return
+
+        self._commit(recipes, related)
+
+    def _commit(self, recipes, related):
+        self.created += len(recipes)
+        for model, ids in related.items():
+            self._ids[model].update(ids)
+
+    def create(self, validated_data):
+        """Write already validated recipes in the caller's transaction
+        and return them"""
+        recipes, related = self._write(validated_data)
+        self._commit(recipes, related)
+        return recipes
+
+    def _resolve(self, model, names):
+        """Return {name: id} for names not resolved by earlier chunks"""
+        missing = [name for name in names if name not in self._ids[model]]
+        found = get_or_create_by_name(model, self.user, missing)
+        return {name: obj.id for name, obj in found.items()}
+
+    def _create_recipes(self, recipes):
+        """Insert recipes and return them with primary keys set"""
+        using = router.db_for_write(Recipe)
+        if connections[using].features.can_return_rows_from_bulk_insert:
+            return Recipe.objects.bulk_create(recipes)
+
+        for recipe in recipes:
+            recipe.save()
+        return recipes
+
+    def _write(self, validated_data):
+        related = {}
+        for model, relation in ((Tag, 'tags'), (Ingredient, 'ingredients')):
+            names = list(dict.fromkeys(
+                item['name']
+                for data in validated_data
+                for item in data.get(relation, [])
+            ))
+            related[model] = self._resolve(model, names)
+
+        recipes = self._create_recipes([
+            Recipe(
+                user=self.user,
+                **{
+                    field: value for field, value in data.items()
+                    if field not in ('tags', 'ingredients')
+                },
+            )
+            for data in validated_data
+        ])
+
+        for model, relation in ((Tag, 'tags'), (Ingredient, 'ingredients')):
+            ids = {**self._ids[model], **related[model]}
+            field = Recipe._meta.get_field(relation)
+            through = field.remote_field.through
+            column = f'{field.m2m_reverse_field_name()}_id'
+            through.objects.bulk_create([
+                through(recipe_id=recipe.id, **{column: item_id})
+                for recipe, data in zip(recipes, validated_data)
+                for item_id in dict.fromkeys(
+                    ids[item['name']] for item in data.get(relation, [])
+                )
+            ])
+
+        return recipes, related
@@ -0,0 +1,241 @@
+"""
+Replay a weighted mix of recipe API traffic against a live server
+"""
+import io
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from core.benchmark import (
+    WORDS,
+    LatencyRecorder,
+    format_report,
+    http_request,
+    multipart_body,
+    parse_mix,
+)
+from core.models import (
+    Recipe,
+    Tag,
+)
+
+
+OPERATIONS = ('list', 'filter', 'detail', 'create', 'patch', 'upload')
+# Operations that need an existing recipe of the requesting user
+RECIPE_OPERATIONS = ('detail', 'patch', 'upload')
+DEFAULT_MIX = 'list=35,filter=20,detail=25,create=8,patch=10,upload=2'
+# Marks recipes created by the driver so they can be removed afterwards
+TITLE_PREFIX = 'Load test'
+
+
+class _Client:
+    """A seeded user's token and the ids the requests refer to"""
+
+    def __init__(self, token, recipe_ids, tag_ids):
+        self.headers = {'Authorization': f'Token {token}'}
+        self.recipe_ids = recipe_ids
+        self.tag_ids = tag_ids
+
+
+def _jpeg(rng):
+    """Return a small JPEG of a random colour, so uploads are not
+    deduplicated into the same stored file"""
+    colour = tuple(rng.randrange(256) for _ in range(3))
+    buffer = io.BytesIO()
+    Image.new('RGB', (256, 256), colour).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+class Command(BaseCommand):
+    help = (
+        'Run against a live server seeded with seed_benchmark: send a '
+        'weighted mix of list, filter, detail, create, patch and upload '
+        'requests as the seeded users and report throughput and latency '
+        'percentiles per endpoint.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://localhost:8001')
+        parser.add_argument('--duration', type=float, default=30)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--email-prefix', default='bench')
+        parser.add_argument(
+            '--mix', default=DEFAULT_MIX,
+            help=(
+                'Relative weight of each operation, one of: '
+                f'{", ".join(OPERATIONS)}. Default: {DEFAULT_MIX}'
+            ),
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--keep', action='store_true',
+            help='Keep the recipes created during the run.',
+        )
+
+    def _load_clients(self, prefix):
+        """Return a client for every seeded user with the given prefix"""
+        users = get_user_model().objects.filter(
+            email__startswith=f'{prefix}-',
+            email__endswith='@example.com',
+        )
+        tokens = dict(
+            Token.objects.filter(user__in=users)
+            .values_list('user_id', 'key')
+        )
+        recipes = defaultdict(list)
+        for user_id, recipe_id in Recipe.objects.filter(
+            user_id__in=tokens,
+        ).values_list('user_id', 'id').iterator():
+            recipes[user_id].append(recipe_id)
+        tags = defaultdict(list)
+        for user_id, tag_id in Tag.objects.filter(
+            user_id__in=tokens,
+        ).values_list('user_id', 'id').iterator():
+            tags[user_id].append(tag_id)
+
+        return [
+            _Client(key, recipes[user_id], tags[user_id])
+            for user_id, key in sorted(tokens.items())
+        ]
+
+    def _request(self, operation, client, base_url, rng):
+        """Return (endpoint, method, url, body, headers) for an operation"""
+        recipes_url = f'{base_url}/api/recipe/recipes/'
+        headers = dict(client.headers)
+        if operation == 'list':
+            return 'GET /recipes/', 'GET', recipes_url, None, headers
+
+        if operation == 'filter':
+            params = [f'search={rng.choice(WORDS)}']
+            if client.tag_ids:
+                tag_ids = rng.sample(
+                    client.tag_ids, min(2, len(client.tag_ids)),
+                )
+                params.append(f'tags={",".join(map(str, tag_ids))}')
+            return (
+                'GET /recipes/?tags&search', 'GET',
+                f'{recipes_url}?{"&".join(params)}', None, headers,
+            )
+
+        if operation == 'create':
+            headers['Content-Type'] = 'application/json'
+            body = {
+                'title': f'{TITLE_PREFIX} {rng.choice(WORDS)}',
+                'time_minutes': rng.randint(5, 180),
+                'price': f'{rng.randint(100, 9999) / 100:.2f}',
+                'tags': [{'name': f'tag-{rng.randrange(10)}'}],
+            }
+            return (
+                'POST /recipes/', 'POST', recipes_url,
+                json.dumps(body).encode(), headers,
+            )
+
+        detail_url = f'{recipes_url}{rng.choice(client.recipe_ids)}/'
+        if operation == 'detail':
+            return 'GET /recipes/{id}/', 'GET', detail_url, None, headers
+
+        if operation == 'patch':
+            headers['Content-Type'] = 'application/json'
+            body = {'time_minutes': rng.randint(5, 180)}
+            return (
+                'PATCH /recipes/{id}/', 'PATCH', detail_url,
+                json.dumps(body).encode(), headers,
+            )
+
+        body, headers['Content-Type'] = multipart_body(
+            'image', 'load.jpg', _jpeg(rng), 'image/jpeg',
+        )
+        return (
+            'POST /{id}/upload-image/', 'POST',
+            f'{detail_url}upload-image/', body, headers,
+        )
+
+    def _loop(self, stop, recorder, clients, mix, base_url, rng):
+        """Send one request after another until stop is set"""
+        operations = list(mix)
+        weights = list(mix.values())
+        with_recipes = [client for client in clients if client.recipe_ids]
+        while not stop.is_set():
+            operation = rng.choices(operations, weights)[0]
+            if operation in RECIPE_OPERATIONS:
+                client = rng.choice(with_recipes)
+            else:
+                client = rng.choice(clients)
+            name, method, url, body, headers = self._request(
+                operation, client, base_url, rng,
+            )
+            status, elapsed = http_request(method, url, body, headers)
+            recorder.record(name, status, elapsed)
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options['mix'], OPERATIONS)
+        except ValueError as error:
+            raise CommandError(str(error))
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency must be at least 1.')
+
+        clients = self._load_clients(options['email_prefix'])
+        if not clients:
+            raise CommandError(
+                'No seeded users found, run seed_benchmark first.'
+            )
+        if not any(client.recipe_ids for client in clients):
+            if any(operation in RECIPE_OPERATIONS for operation in mix):
+                raise CommandError(
+                    'The seeded users have no recipes for '
+                    f'{", ".join(RECIPE_OPERATIONS)} requests.'
+                )
+
+        base_url = options['base_url'].rstrip('/')
+        stop = threading.Event()
+        recorder = LatencyRecorder()
+        threads = [
+            threading.Thread(
+                target=self._loop,
+                args=(
+                    stop, recorder, clients, mix, base_url,
+                    random.Random(options['seed'] + index),
+                ),
+                daemon=True,
+            )
+            for index in range(options['concurrency'])
+        ]
+        start = time.perf_counter()
+        try:
+            for thread in threads:
+                thread.start()
+            time.sleep(options['duration'])
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            if not options['keep']:
+                Recipe.objects.filter(
+                    user__email__startswith=f'{options["email_prefix"]}-',
+                    user__email__endswith='@example.com',
+                    title__startswith=TITLE_PREFIX,
+                ).delete()
+
+        rows = recorder.report(elapsed)
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'{len(clients)} users, {options["concurrency"]} clients, '
+            f'{elapsed:.1f}s'
+        ))
+        self.stdout.write(format_report(rows))
+        total = sum(row['requests'] for row in rows)
+        self.stdout.write(
+            f'Total: {total} requests, {total / elapsed:.1f} rps'
+        )
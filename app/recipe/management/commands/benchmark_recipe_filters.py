@@ -0,0 +1,95 @@
+"""
+Compare the query plans of the recipe tag filters on seeded data
+"""
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import (
+    connection,
+    transaction,
+)
+
+from core.benchmark import (
+    seed_recipes,
+    summarize,
+    time_call,
+)
+from core.models import (
+    Recipe,
+    Tag,
+)
+from recipe.filters import (
+    MATCH_ALL,
+    filter_recipes_by_related,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed recipes for a throwaway user and compare JOIN + DISTINCT '
+        'against EXISTS tag filtering. All data is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=20000)
+        parser.add_argument('--tags', type=int, default=50)
+        parser.add_argument('--ingredients', type=int, default=200)
+        parser.add_argument('--filter-tags', type=int, default=3)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def _explain_options(self):
+        """Return the EXPLAIN options supported by the database"""
+        if connection.vendor == 'postgresql':
+            return {'analyze': True, 'buffers': True}
+        return {}
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(
+                email=f'benchmark-{uuid.uuid4().hex}@example.com',
+            )
+            self.stdout.write(f'Seeding {options["recipes"]} recipes...')
+            seed_recipes(
+                user,
+                recipes=options['recipes'],
+                tags=options['tags'],
+                ingredients=options['ingredients'],
+            )
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        'ANALYZE core_recipe, core_recipe_tags, core_tag'
+                    )
+
+            tag_ids = list(
+                Tag.objects.filter(user=user)
+                .values_list('id', flat=True)[:options['filter_tags']]
+            )
+            base = Recipe.objects.filter(user=user).order_by('-id')
+            plans = {
+                'JOIN + DISTINCT': base.filter(
+                    tags__id__in=tag_ids,
+                ).distinct(),
+                'EXISTS (any)': filter_recipes_by_related(
+                    base, 'tags', tag_ids,
+                ),
+                'EXISTS (all)': filter_recipes_by_related(
+                    base, 'tags', tag_ids, MATCH_ALL,
+                ),
+            }
+
+            for label, queryset in plans.items():
+                self.stdout.write(self.style.MIGRATE_HEADING(label))
+                self.stdout.write(queryset.explain(**self._explain_options()))
+                timings = summarize(time_call(
+                    lambda: list(queryset.iterator()),
+                    options['repeat'],
+                ))
+                self.stdout.write(self.style.SUCCESS(
+                    f'{queryset.count()} rows, '
+                    f'median {timings["median"]:.1f} ms, '
+                    f'max {timings["max"]:.1f} ms'
+                ))
+
+            transaction.set_rollback(True)
@@ -0,0 +1,107 @@
+"""
+Compare full-text recipe search against substring matching on seeded data
+"""
+import random
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import (
+    connection,
+    transaction,
+)
+from django.db.models import Value
+from django.db.models.functions import Concat
+
+from core.benchmark import (
+    seed_recipes,
+    summarize,
+    time_call,
+)
+from core.models import Recipe
+from recipe.filters import search_recipes
+
+
+RARE_TERM = 'saffron'
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed recipes for a throwaway user and compare ranked full-text '
+        'search with an icontains scan, for a rare and a common term. '
+        'All data is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1000000)
+        parser.add_argument('--matches', type=int, default=100)
+        parser.add_argument('--common-term', default='smoky')
+        parser.add_argument('--page-size', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def _explain_options(self):
+        """Return the EXPLAIN options supported by the database"""
+        if connection.vendor == 'postgresql':
+            return {'analyze': True, 'buffers': True}
+        return {}
+
+    def _report(self, label, queryset, repeat):
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        self.stdout.write(queryset.explain(**self._explain_options()))
+        timings = summarize(time_call(lambda: list(queryset), repeat))
+        self.stdout.write(self.style.SUCCESS(
+            f'median {timings["median"]:.1f} ms, '
+            f'max {timings["max"]:.1f} ms'
+        ))
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stderr.write(self.style.WARNING(
+                'Full-text search needs PostgreSQL, both plans below use '
+                'the substring fallback.'
+            ))
+
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(
+                email=f'benchmark-{uuid.uuid4().hex}@example.com',
+            )
+            self.stdout.write(f'Seeding {options["recipes"]} recipes...')
+            seed_recipes(
+                user,
+                recipes=options['recipes'],
+                tags=10,
+                ingredients=10,
+                tags_per_recipe=1,
+                ingredients_per_recipe=1,
+            )
+            ids = list(
+                Recipe.objects.filter(user=user).values_list('id', flat=True)
+            )
+            Recipe.objects.filter(
+                id__in=random.Random(0).sample(
+                    ids, min(options['matches'], len(ids)),
+                ),
+            ).update(title=Concat('title', Value(f' with {RARE_TERM}')))
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE core_recipe')
+
+            base = Recipe.objects.filter(user=user).defer(
+                'description', 'image', 'search_vector',
+            )
+            page = options['page_size']
+            for term in (RARE_TERM, options['common_term']):
+                self._report(
+                    f'Full-text "{term}", ranked, first {page}',
+                    search_recipes(base, term)
+                    .order_by('-search_rank', '-id')[:page],
+                    options['repeat'],
+                )
+                self._report(
+                    f'icontains "{term}", newest first {page}',
+                    base.filter(title__icontains=term)
+                    .order_by('-id')[:page],
+                    options['repeat'],
+                )
+
+            transaction.set_rollback(True)
@@ -0,0 +1,32 @@
+"""
+Delete stored recipe images that no recipe uses
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from recipe import blobs
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete image files, and their resized copies, that no recipe '
+        'has used for the grace period. Safe to run while the API is '
+        'serving; schedule it periodically.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--grace-minutes',
+            type=int,
+            default=int(blobs.GRACE_PERIOD.total_seconds() // 60),
+            help='Only delete files unused for at least this long',
+        )
+
+    def handle(self, *args, **options):
+        deleted = blobs.collect_garbage(
+            batch_size=options['batch_size'],
+            grace_period=timedelta(minutes=options['grace_minutes']),
+        )
+        self.stdout.write(f'Deleted {deleted} unused images')
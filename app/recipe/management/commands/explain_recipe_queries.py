@@ -0,0 +1,124 @@
+"""
+Print the query plans of the hot recipe API queries
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+from django.db import connection
+from django.db.models import Count
+from django.http import (
+    HttpRequest,
+    QueryDict,
+)
+
+from rest_framework.request import Request
+
+from core.models import (
+    Tag,
+    Ingredient,
+)
+from recipe import views
+
+
+class Command(BaseCommand):
+    help = (
+        'Run EXPLAIN on the queries behind the recipe, tag and ingredient '
+        'endpoints to confirm which indexes they use.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--email',
+            help='User to build the queries for, defaults to the user '
+                 'with the most recipes',
+        )
+        parser.add_argument(
+            '--analyze',
+            action='store_true',
+            help='Run EXPLAIN ANALYZE (PostgreSQL only)',
+        )
+
+    def _get_user(self, email):
+        """Return the user the queries are built for"""
+        users = get_user_model().objects
+        if email:
+            try:
+                return users.get(email=email)
+            except users.model.DoesNotExist:
+                raise CommandError(f'No user with email {email}')
+
+        user = users.annotate(
+            recipes=Count('recipe'),
+        ).order_by('-recipes').first()
+        if user is None:
+            raise CommandError('There are no users to explain queries for')
+        return user
+
+    def _get_queryset(self, viewset_class, action, user, params=None):
+        """Return the queryset a viewset builds for a GET request"""
+        http_request = HttpRequest()
+        http_request.method = 'GET'
+        http_request.GET = QueryDict(mutable=True)
+        http_request.GET.update(params or {})
+
+        view = viewset_class()
+        view.action = action
+        view.kwargs = {}
+        view.format_kwarg = None
+        view.request = Request(http_request)
+        view.request.user = user
+        return view.get_queryset()
+
+    def _get_queries(self, user):
+        """Return the labelled hot queries for a user"""
+        tag_ids = ','.join(str(pk) for pk in Tag.objects.filter(
+            user=user).values_list('id', flat=True)[:2])
+        ingredient_ids = ','.join(str(pk) for pk in Ingredient.objects.filter(
+            user=user).values_list('id', flat=True)[:2])
+        recipes = self._get_queryset(views.RecipeViewSet, 'list', user)
+
+        queries = {
+            'recipe list': recipes,
+            'recipe detail': self._get_queryset(
+                views.RecipeViewSet, 'retrieve', user,
+            ).filter(pk=recipes.values('pk')[:1]),
+            'tag list': self._get_queryset(views.TagViewSet, 'list', user),
+            'tag list assigned_only': self._get_queryset(
+                views.TagViewSet, 'list', user, {'assigned_only': '1'},
+            ),
+            'ingredient list': self._get_queryset(
+                views.IngredientViewSet, 'list', user,
+            ),
+            'ingredient list with_counts': self._get_queryset(
+                views.IngredientViewSet, 'list', user, {'with_counts': '1'},
+            ),
+        }
+        if tag_ids:
+            queries['recipe list filtered by tags'] = self._get_queryset(
+                views.RecipeViewSet, 'list', user, {'tags': tag_ids},
+            )
+        if ingredient_ids:
+            queries['recipe list filtered by ingredients (all)'] = \
+                self._get_queryset(
+                    views.RecipeViewSet, 'list', user, {
+                        'ingredients': ingredient_ids,
+                        'ingredients_mode': 'all',
+                    },
+                )
+
+        return queries
+
+    def handle(self, *args, **options):
+        user = self._get_user(options['email'])
+        explain_options = {}
+        if options['analyze']:
+            if connection.vendor != 'postgresql':
+                raise CommandError('--analyze requires PostgreSQL')
+            explain_options = {'analyze': True, 'buffers': True}
+
+        self.stdout.write(f'Explaining queries for {user.email}')
+        for label, queryset in self._get_queries(user).items():
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self.stdout.write(queryset.explain(**explain_options))
@@ -0,0 +1,51 @@
+"""
+Import recipes for a user from a JSON or NDJSON file
+"""
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+
+from recipe.importer import (
+    RecipeImporter,
+    iter_records,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Import recipes for a user from a JSON array or newline delimited '
+        'JSON file. Invalid rows are skipped and reported.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, - for stdin')
+        parser.add_argument('--email', required=True)
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'No user with email {options["email"]}')
+
+        importer = RecipeImporter(
+            user,
+            chunk_size=options['chunk_size'],
+            max_errors=sys.maxsize,
+        )
+        if options['path'] == '-':
+            report = importer.run(iter_records(sys.stdin))
+        else:
+            with open(options['path'], encoding='utf-8') as stream:
+                report = importer.run(iter_records(stream))
+
+        for error in report['errors']:
+            self.stderr.write(f'row {error["row"]}: {error["errors"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {report["created"]} recipes, '
+            f'{report["failed"]} rows failed'
+        ))
@@ -0,0 +1,44 @@
+"""
+Run the recipe image derivative worker
+"""
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from recipe.images import process_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        'Build resized copies of uploaded recipe images. Runs until '
+        'stopped, polling for new jobs, unless --once is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Process the queued jobs, then exit',
+        )
+        parser.add_argument('--poll-interval', type=float, default=2)
+
+    def _stop(self, signum, frame):
+        self.running = False
+
+    def handle(self, *args, **options):
+        self.running = True
+        if not options['once']:
+            signal.signal(signal.SIGTERM, self._stop)
+            signal.signal(signal.SIGINT, self._stop)
+
+        while self.running:
+            close_old_connections()
+            processed = process_jobs(limit=None if options['once'] else 10)
+            if processed:
+                self.stdout.write(f'Processed {processed} image jobs')
+            if options['once']:
+                break
+            if not processed:
+                time.sleep(options['poll_interval'])
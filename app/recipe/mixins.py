@@ -0,0 +1,249 @@
+"""viewset mixins for recipe api"""
+from django.conf import settings
+from django.db import (
+    IntegrityError,
+    transaction,
+)
+
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from core import routers
+from recipe import (
+    cache,
+    conditional,
+)
+
+
+class CachedResponseMixin:
+    """Answer GETs with 304, the per-user cache, or a fresh response"""
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        """Return a validated, cached response for a read action"""
+        version, last_modified = conditional.get_data_version(request.user)
+        etag = conditional.make_etag(request, version)
+        not_modified = conditional.not_modified_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+
+        key = None
+        response = None
+        if settings.RECIPE_CACHE_ENABLED:
+            key = cache.response_key(request, version)
+            data = cache.get_cached(key)
+            if data is not None:
+                response = Response(data)
+
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if key is not None and response.status_code == 200:
+                cache.set_cached(key, response.data)
+
+        if response.status_code == 200:
+            conditional.set_validators(response, etag, last_modified)
+
+        return response
+
+
+class CachedListMixin(CachedResponseMixin):
+    """Cache and validate list responses per user"""
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+
+class CachedRetrieveMixin(CachedResponseMixin):
+    """Cache and validate retrieve responses per user"""
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+
+class ReplicaReadMixin:
+    """Serve safe requests from a read replica.
+
+    Reads go to a replica unless the user wrote within the sticky window;
+    any other request pins the user to the primary once it finishes.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with routers.replica_reads(False):
+            try:
+                return super().dispatch(request, *args, **kwargs)
+            finally:
+                user = getattr(self.request, 'user', None)
+                if settings.DATABASE_REPLICAS and \
+                        self.request.method not in SAFE_METHODS and \
+                        user is not None and user.is_authenticated:
+                    routers.pin_to_primary(user.pk)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if settings.DATABASE_REPLICAS and \
+                request.method in SAFE_METHODS and \
+                not routers.is_pinned(request.user.pk):
+            routers.enable_replica_reads()
+
+
+class BulkMixin:
+    """Create, update or delete many objects in one request.
+
+    POST takes a list of objects to create, PATCH a list of partial
+    updates carrying an `id`, DELETE a list of ids. The whole list is
+    validated before anything is written, then written in a single
+    transaction. Viewsets implement perform_bulk_create and
+    perform_bulk_update, and may add checks in validate_bulk_create and
+    validate_bulk_update.
+    """
+    bulk_max_items = 500
+
+    def get_bulk_serializer_class(self):
+        return self.get_serializer_class()
+
+    def get_bulk_queryset(self):
+        """Return the user's objects, ignoring list filters in the query
+        string so every written object is found"""
+        return self.queryset.filter(user=self.request.user)
+
+    def _get_bulk_items(self, request):
+        """Return the list sent in the request body"""
+        items = request.data
+        if not isinstance(items, list) or not items:
+            raise ValidationError(
+                {'non_field_errors': ['Expected a non-empty list.']}
+            )
+        if len(items) > self.bulk_max_items:
+            raise ValidationError({'non_field_errors': [
+                f'At most {self.bulk_max_items} items per request.'
+            ]})
+
+        return items
+
+    def _get_bulk_ids(self, items):
+        """Return the ids of items, rejecting unknown or repeated ones"""
+        ids = [
+            item.get('id') if isinstance(item, dict) else item
+            for item in items
+        ]
+        owned = set(
+            self.queryset.filter(
+                user=self.request.user,
+                id__in=[i for i in ids if type(i) is int],
+            ).values_list('id', flat=True)
+        )
+
+        seen = set()
+        errors = []
+        for item_id in ids:
+            # JSON true and false are ints to isinstance()
+            if type(item_id) is not int or item_id not in owned:
+                errors.append({'id': ['Not found.']})
+            elif item_id in seen:
+                errors.append({'id': ['Duplicate id.']})
+            else:
+                errors.append({})
+            seen.add(item_id)
+        if any(errors):
+            raise ValidationError(errors)
+
+        return ids
+
+    def _bulk_response(self, ids, status_code):
+        """Return the objects with ids, in that order"""
+        cache.invalidate_user(self.request.user.pk)
+        objects = self.get_bulk_queryset().filter(id__in=ids).in_bulk()
+        serializer = self.get_serializer(
+            [objects[item_id] for item_id in ids],
+            many=True,
+        )
+        return Response(serializer.data, status=status_code)
+
+    def validate_bulk_create(self, validated_data):
+        """Return a list of per-item errors for items to create"""
+        return []
+
+    def validate_bulk_update(self, updates):
+        """Return a list of per-item errors for (instance, data) updates"""
+        return []
+
+    def _bulk_create(self, items):
+        serializer = self.get_bulk_serializer_class()(
+            data=items,
+            many=True,
+            context=self.get_serializer_context(),
+        )
+        serializer.is_valid(raise_exception=True)
+        errors = self.validate_bulk_create(serializer.validated_data)
+        if any(errors):
+            raise ValidationError(errors)
+
+        try:
+            with transaction.atomic():
+                objects = self.perform_bulk_create(serializer.validated_data)
+        except IntegrityError:
+            raise ValidationError({'non_field_errors': [
+                'The changes conflict with existing data.'
+            ]})
+
+        return self._bulk_response(
+            [obj.id for obj in objects],
+            status.HTTP_201_CREATED,
+        )
+
+    def _bulk_update(self, items):
+        ids = self._get_bulk_ids(items)
+        instances = self.queryset.filter(id__in=ids).in_bulk()
+        serializer_class = self.get_bulk_serializer_class()
+
+        updates = []
+        errors = []
+        for item_id, item in zip(ids, items):
+            serializer = serializer_class(
+                instances[item_id],
+                data=item,
+                partial=True,
+                context=self.get_serializer_context(),
+            )
+            if serializer.is_valid():
+                updates.append((instances[item_id], serializer.validated_data))
+                errors.append({})
+            else:
+                errors.append(serializer.errors)
+        if not any(errors):
+            errors = self.validate_bulk_update(updates)
+        if any(errors):
+            raise ValidationError(errors)
+
+        try:
+            with transaction.atomic():
+                self.perform_bulk_update(updates)
+        except IntegrityError:
+            raise ValidationError({'non_field_errors': [
+                'The changes conflict with existing data.'
+            ]})
+
+        return self._bulk_response(ids, status.HTTP_200_OK)
+
+    def _bulk_delete(self, items):
+        ids = self._get_bulk_ids(items)
+        with transaction.atomic():
+            self.queryset.filter(id__in=ids).delete()
+        cache.invalidate_user(self.request.user.pk)
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(methods=['POST', 'PATCH', 'DELETE'], detail=False)
+    def bulk(self, request):
+        """Create, update or delete a list of objects"""
+        items = self._get_bulk_items(request)
+        if request.method == 'POST':
+            return self._bulk_create(items)
+        elif request.method == 'PATCH':
+            return self._bulk_update(items)
+
+        return self._bulk_delete(items)
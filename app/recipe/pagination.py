@@ -0,0 +1,194 @@
+"""pagination for recipe api"""
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import (
+    ImproperlyConfigured,
+    ValidationError as DjangoValidationError,
+)
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Opt-in cursor pagination keyed on the queryset ordering.
+
+    Pagination only kicks in when the client sends `page_size` or
+    `cursor`. The cursor holds the ordering values of the last row on the
+    page and the next page is fetched with a WHERE clause on them, so
+    there is no OFFSET scan and no COUNT(*). The last ordering field of
+    the queryset must be unique to keep cursors stable.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 50
+    max_page_size = 200
+    invalid_cursor_message = _('Invalid cursor')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Return one page of rows, or None when not requested"""
+        if not self.is_requested(request):
+            return None
+
+        self.request = request
+        self.ordering = self.get_ordering(queryset)
+        page_size = self.get_page_size(request)
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            position = self.clean_position(queryset, position)
+            queryset = queryset.filter(self._seek_filter(position))
+
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.page = rows[:page_size]
+        return self.page
+
+    def is_requested(self, request):
+        """Check whether the client opted in to pagination"""
+        return (
+            self.cursor_query_param in request.query_params or
+            self.page_size_query_param in request.query_params
+        )
+
+    def get_page_size(self, request):
+        """Return the requested page size clamped to the maximum"""
+        try:
+            page_size = int(
+                request.query_params[self.page_size_query_param]
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+        if page_size <= 0:
+            return self.page_size
+
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, queryset):
+        """Return the (field, descending) pairs the queryset is sorted by"""
+        order_by = queryset.query.order_by
+        if not order_by or not all(isinstance(f, str) for f in order_by):
+            raise ImproperlyConfigured(
+                'KeysetPagination requires a queryset ordered by field '
+                'names, ending with a unique field.'
+            )
+
+        return [(field.lstrip('-'), field.startswith('-'))
+                for field in order_by]
+
+    def decode_cursor(self, request):
+        """Decode the cursor query param into a list of ordering values"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            position = json.loads(base64.urlsafe_b64decode(padded))
+        except (binascii.Error, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(position, list) or \
+                len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        return position
+
+    def clean_position(self, queryset, position):
+        """Convert cursor values with the ordering fields' to_python()"""
+        annotations = queryset.query.annotations
+        cleaned = []
+        for (name, _desc), value in zip(self.ordering, position):
+            if name in annotations:
+                field = annotations[name].output_field
+            else:
+                field = queryset.model._meta.get_field(name)
+            try:
+                value = field.to_python(value)
+            except (ValueError, TypeError, DjangoValidationError):
+                raise NotFound(self.invalid_cursor_message)
+            if value is None:
+                raise NotFound(self.invalid_cursor_message)
+            cleaned.append(value)
+
+        return cleaned
+
+    def encode_cursor(self, row):
+        """Encode the ordering values of a row into a cursor string"""
+        position = [getattr(row, field) for field, _desc in self.ordering]
+        data = json.dumps(position, cls=DjangoJSONEncoder).encode()
+        return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+    def _seek_filter(self, position):
+        """Build the lexicographic 'comes after' filter for a position"""
+        condition = Q()
+        for index, (field, descending) in enumerate(self.ordering):
+            lookup = 'lt' if descending else 'gt'
+            equal = {
+                name: value
+                for (name, _desc), value in zip(
+                    self.ordering[:index], position[:index]
+                )
+            }
+            condition |= Q(
+                **equal, **{f'{field}__{lookup}': position[index]}
+            )
+
+        return condition
+
+    def get_next_link(self):
+        """Return the URL of the next page, if there is one"""
+        if not self.has_next:
+            return None
+
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url,
+            self.cursor_query_param,
+            self.encode_cursor(self.page[-1]),
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                },
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Cursor returned in the `next` link',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Number of results per page, enables paging',
+                'schema': {'type': 'integer'},
+            },
+        ]
@@ -1,14 +1,57 @@
 """serializers for recipe api view"""
 
+from django.db import transaction
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema_field
+
 from rest_framework import serializers
 from core.models import (
     Recipe,
     Tag,
     Ingredient,
 )
-
-
-class IngredientsSerializer(serializers.ModelSerializer):
+from core.profiling import ProfiledSerializerMixin
+from recipe.media import media_url
+from recipe.uploads import check_image
+
+
+class RecipeMediaField(serializers.ImageField):
+    """Image field linking to the recipe's owner-only media action"""
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        return media_url(
+            value.instance.id, value.name, self.context.get('request'),
+        )
+
+
+def get_or_create_by_name(model, user, names):
+    """Return {name: obj} for the user's tags or ingredients, creating
+    the missing ones with a single bulk insert"""
+    if not names:
+        return {}
+
+    found = {
+        obj.name: obj
+        for obj in model.objects.filter(user=user, name__in=names)
+    }
+    missing = [name for name in names if name not in found]
+    if missing:
+        model.objects.bulk_create(
+            [model(user=user, name=name) for name in missing],
+            ignore_conflicts=True,
+        )
+        found.update(
+            (obj.name, obj)
+            for obj in model.objects.filter(user=user, name__in=missing)
+        )
+
+    return found
+
+
+class IngredientsSerializer(ProfiledSerializerMixin,
+                            serializers.ModelSerializer):
     """Serializer for ingredients"""
 
     class Meta:
@@ -17,7 +60,8 @@ class IngredientsSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(ProfiledSerializerMixin,
+                    serializers.ModelSerializer):
     """Serializer for tags"""
 
     class Meta:
@@ -26,7 +70,24 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class IngredientCountSerializer(IngredientsSerializer):
+    """Serializer for ingredients with the number of recipes using them"""
+    recipe_count = serializers.IntegerField(read_only=True)
+
+    class Meta(IngredientsSerializer.Meta):
+        fields = IngredientsSerializer.Meta.fields + ['recipe_count']
+
+
+class TagCountSerializer(TagSerializer):
+    """Serializer for tags with the number of recipes using them"""
+    recipe_count = serializers.IntegerField(read_only=True)
+
+    class Meta(TagSerializer.Meta):
+        fields = TagSerializer.Meta.fields + ['recipe_count']
+
+
+class RecipeSerializer(ProfiledSerializerMixin,
+                       serializers.ModelSerializer):
     """Serializer for recipes"""
     tags = TagSerializer(many=True, required=False)
     ingredients = IngredientsSerializer(many=True, required=False)
@@ -39,26 +100,26 @@ class RecipeSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id']
 
+    def _get_or_create_items(self, model, items):
+        """Return the user's tags or ingredients by name, creating the
+        missing ones with a single bulk insert"""
+        names = list(dict.fromkeys(item['name'] for item in items))
+        found = get_or_create_by_name(
+            model, self.context['request'].user, names,
+        )
+        return [found[name] for name in names]
+
     def _get_or_create_tags(self, tags, recipe):
         """handle getting or creating tags as needed"""
-        auth_user = self.context['request'].user
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(
-                user=auth_user,
-                **tag,
-            )
-            recipe.tags.add(tag_obj)
+        recipe.tags.add(*self._get_or_create_items(Tag, tags))
 
     def _get_or_create_ingredients(self, ingredients, recipe):
         """handle getting or creating ingredient as needed"""
-        auth_user = self.context['request'].user
-        for ingredient in ingredients:
-            ingredient_obj, created = Ingredient.objects.get_or_create(
-                user=auth_user,
-                **ingredient,
-            )
-            recipe.ingredients.add(ingredient_obj)
+        recipe.ingredients.add(
+            *self._get_or_create_items(Ingredient, ingredients)
+        )
 
+    @transaction.atomic
     def create(self, validated_data):
         "create a recipe"
         tags = validated_data.pop('tags', [])
@@ -69,17 +130,18 @@ class RecipeSerializer(serializers.ModelSerializer):
 
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """update a recipe"""
         tags = validated_data.pop('tags', None)
         ingredients = validated_data.pop('ingredients', None)
         if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
+            instance.tags.set(self._get_or_create_items(Tag, tags))
 
         if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients, instance)
+            instance.ingredients.set(
+                self._get_or_create_items(Ingredient, ingredients)
+            )
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
@@ -89,17 +151,59 @@ class RecipeSerializer(serializers.ModelSerializer):
 
 
 class RecipeDetailSerializer(RecipeSerializer):
-    """Serializer for recipe detail view"""
+    """Serializer for recipe detail view
+
+    The image is read-only here: it only changes through the upload-image
+    action, which checks the file and queues its resized copies.
+    """
+    image = RecipeMediaField(read_only=True)
+    image_derivatives = serializers.SerializerMethodField()
 
     class Meta(RecipeSerializer.Meta):
-        fields = RecipeSerializer.Meta.fields + ['description', 'image']
+        fields = RecipeSerializer.Meta.fields + [
+            'description', 'image', 'image_derivatives',
+        ]
+
+    def validate(self, attrs):
+        if 'image' in self.initial_data:
+            raise serializers.ValidationError({
+                'image': 'Upload images with the upload-image action.',
+            })
+        return super().validate(attrs)
+
+    @extend_schema_field(OpenApiTypes.OBJECT)
+    def get_image_derivatives(self, recipe):
+        """Return {size: {format: url}} once the resized images exist"""
+        if not recipe.image_derivatives:
+            return None
+
+        request = self.context.get('request')
+        return {
+            size: {
+                image_format: media_url(recipe.id, name, request)
+                for image_format, name in formats.items()
+            }
+            for size, formats in recipe.image_derivatives.items()
+        }
 
 
-class RecipeImageSerializer(serializers.ModelSerializer):
+class RecipeImportSerializer(RecipeSerializer):
+    """Serializer validating one imported recipe"""
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ['description']
+
+
+class RecipeImageSerializer(ProfiledSerializerMixin,
+                            serializers.ModelSerializer):
     """Serializer for uploading images to recipes"""
+    image = RecipeMediaField(required=True)
 
     class Meta:
         model = Recipe
         fields = ['id', 'image']
         read_only_fields = ['id']
-        extra_kwargs = {'image': {'required': 'True'}}
+
+    def validate_image(self, value):
+        check_image(value)
+        return value
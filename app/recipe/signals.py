@@ -0,0 +1,161 @@
+"""signal handlers for recipe api"""
+from django.conf import settings
+from django.core.files import File
+from django.db.models.fields.files import FieldFile
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+)
+from recipe import blobs
+from recipe.cache import invalidate_user
+from recipe.conditional import create_data_version
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+@receiver([post_save, post_delete], sender=Tag)
+@receiver([post_save, post_delete], sender=Ingredient)
+def invalidate_owner_cache(sender, instance, **kwargs):
+    """Invalidate the owner's cached responses when an item changes"""
+    invalidate_user(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_links_cache(sender, instance, action, **kwargs):
+    """Invalidate the owner's cached responses when recipe links change"""
+    if action.startswith('post_'):
+        invalidate_user(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def touch_relinked_recipes(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    """Move updated_at of recipes whose tags or ingredients changed"""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            recipes = Recipe.objects.filter(pk=instance.pk)
+        else:
+            return
+    elif action in ('post_add', 'post_remove'):
+        recipes = Recipe.objects.filter(pk__in=pk_set)
+    elif action == 'pre_clear':
+        relation = 'tags' if isinstance(instance, Tag) else 'ingredients'
+        recipes = Recipe.objects.filter(**{relation: instance})
+    else:
+        return
+
+    recipes.update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def start_new_user_cache(sender, instance, created, **kwargs):
+    """Start new users on a data version and a fresh cache generation"""
+    if created:
+        create_data_version(instance.pk)
+        invalidate_user(instance.pk)
+
+
+_NOT_LOADED = object()
+
+
+def _stored_image(instance):
+    """Return the image name saved in the database for a recipe"""
+    return Recipe.objects.filter(pk=instance.pk).values_list(
+        'image', flat=True,
+    ).first() or None
+
+
+def _saves_image(instance, update_fields):
+    if 'image' not in instance.__dict__:
+        # Deferred and never set, so not written
+        return False
+    return update_fields is None or 'image' in update_fields
+
+
+def _image_name(instance):
+    value = instance.__dict__['image']
+    return getattr(value, 'name', value) or None
+
+
+def _image_changed(instance):
+    """Return False if the image is the one last loaded or saved, so the
+    row still holds it unless another process wrote it meanwhile"""
+    if instance._image_content is not None:
+        return True
+    loaded = instance.__dict__.get('_loaded_image', _NOT_LOADED)
+    return loaded is _NOT_LOADED or _image_name(instance) != loaded
+
+
+def _new_content(instance):
+    """Return the file this save will store as the image, if any"""
+    value = instance.__dict__['image']
+    if isinstance(value, FieldFile):
+        return None if value._committed else value.file
+    if isinstance(value, File):
+        return value
+    return None
+
+
+@receiver(pre_save, sender=Recipe)
+def load_replaced_image(sender, instance, update_fields, **kwargs):
+    """Look up the image a save is about to replace, skipping the query
+    when the image was not changed"""
+    instance._replaced_image = None
+    instance._image_content = None
+    if not _saves_image(instance, update_fields):
+        return
+
+    instance._image_content = _new_content(instance)
+    if instance._state.adding:
+        return
+    if _image_changed(instance):
+        instance._replaced_image = _stored_image(instance)
+    else:
+        instance._replaced_image = _image_name(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def count_image_references(sender, instance, update_fields, **kwargs):
+    """Move the image reference counts when a recipe's image changes"""
+    if not _saves_image(instance, update_fields):
+        return
+
+    current = _image_name(instance)
+    previous = instance._replaced_image
+    content, instance._image_content = instance._image_content, None
+    instance._loaded_image = current
+    if current != previous:
+        if current:
+            blobs.acquire(current, content)
+        if previous:
+            blobs.release(previous)
+
+
+@receiver(pre_delete, sender=Recipe)
+def load_deleted_image(sender, instance, **kwargs):
+    """Look up the image a deleted recipe holds"""
+    value = instance.__dict__.get('image')
+    if isinstance(value, str):
+        # Untouched since the row was loaded, as for cascading deletes
+        instance._deleted_image = value or None
+    else:
+        instance._deleted_image = _stored_image(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def release_deleted_image(sender, instance, **kwargs):
+    """Drop the reference a deleted recipe held on its image"""
+    if instance._deleted_image:
+        blobs.release(instance._deleted_image)
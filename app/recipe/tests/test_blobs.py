@@ -0,0 +1,275 @@
+"""
+Tests for image reference counting and garbage collection
+"""
+import hashlib
+import shutil
+import tempfile
+from io import (
+    BytesIO,
+    StringIO,
+)
+from unittest.mock import patch
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import (
+    TestCase,
+    override_settings,
+)
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    ImageBlob,
+    ImageJob,
+    Recipe,
+)
+from core.storage import ContentAddressedStorage
+from recipe import (
+    blobs,
+    images,
+)
+
+
+def encode(color='red'):
+    buffer = BytesIO()
+    Image.new('RGB', (10, 10), color).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+def create_recipe(user, **params):
+    return Recipe.objects.create(
+        user=user,
+        title='Sample recipe',
+        time_minutes=5,
+        price='5.00',
+        **params,
+    )
+
+
+class ImageBlobTests(TestCase):
+    """Test stored images are shared, counted and collected"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, recipe, content):
+        file = BytesIO(content)
+        file.name = 'photo.jpg'
+        return self.client.post(
+            reverse('recipe:recipe-upload-image', args=[recipe.id]),
+            {'image': file},
+            format='multipart',
+        )
+
+    def assertRefCount(self, name, count):
+        self.assertEqual(ImageBlob.objects.get(name=name).ref_count, count)
+
+    def expire(self):
+        ImageBlob.objects.update(
+            updated_at=timezone.now() - blobs.GRACE_PERIOD * 2,
+        )
+
+    def test_upload_named_by_streamed_hash(self):
+        """Test an upload is stored under the hash of its bytes"""
+        recipe = create_recipe(self.user)
+        content = encode()
+
+        res = self.upload(recipe, content)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        recipe.refresh_from_db()
+        digest = hashlib.sha256(content).hexdigest()
+        self.assertEqual(
+            recipe.image.name,
+            f'uploads/recipe/{digest[:2]}/{digest}.jpg',
+        )
+        self.assertRefCount(recipe.image.name, 1)
+
+    def test_shared_image_counted_once_per_recipe(self):
+        """Test recipes uploading the same bytes share one file"""
+        first = create_recipe(self.user)
+        second = create_recipe(self.user)
+
+        self.upload(first, encode())
+        self.upload(second, encode())
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRefCount(first.image.name, 2)
+        self.assertEqual(ImageBlob.objects.count(), 1)
+
+    def test_reupload_keeps_derivatives(self):
+        """Test uploading the same file again queues no new job"""
+        recipe = create_recipe(self.user)
+        self.upload(recipe, encode())
+        images.process_jobs()
+
+        self.upload(recipe, encode())
+
+        recipe.refresh_from_db()
+        self.assertEqual(ImageJob.objects.filter(recipe=recipe).count(), 1)
+        self.assertTrue(recipe.image_derivatives)
+        self.assertRefCount(recipe.image.name, 1)
+
+    def test_replace_and_delete_release(self):
+        """Test replacing or deleting a recipe's image drops its count"""
+        recipe = create_recipe(self.user)
+        self.upload(recipe, encode('red'))
+        recipe.refresh_from_db()
+        red = recipe.image.name
+
+        self.upload(recipe, encode('blue'))
+        recipe.refresh_from_db()
+        blue = recipe.image.name
+        self.assertRefCount(red, 0)
+        self.assertRefCount(blue, 1)
+
+        self.client.delete(reverse('recipe:recipe-detail', args=[recipe.id]))
+        self.assertRefCount(blue, 0)
+
+    def test_deferred_image_replaced(self):
+        """Test a recipe loaded without its image still moves counts"""
+        recipe = create_recipe(self.user)
+        self.upload(recipe, encode('red'))
+        red = Recipe.objects.get(id=recipe.id).image.name
+
+        recipe = Recipe.objects.defer('image').get(id=recipe.id)
+        recipe.image.save('photo.jpg', ContentFile(encode('blue')))
+
+        self.assertRefCount(red, 0)
+        self.assertRefCount(recipe.image.name, 1)
+
+    def test_save_without_image_change_skips_lookup(self):
+        """Test saving other fields does not read the stored image"""
+        recipe = create_recipe(self.user)
+        self.upload(recipe, encode())
+        recipe = Recipe.objects.get(id=recipe.id)
+        recipe.title = 'Renamed'
+
+        # The recipe update and the owner's data version bump
+        with self.assertNumQueries(2):
+            recipe.save()
+
+        self.assertRefCount(recipe.image.name, 1)
+
+    def test_refreshed_image_looked_up(self):
+        """Test an image changed since loading still moves counts"""
+        recipe = create_recipe(self.user)
+        self.upload(recipe, encode('red'))
+        stale = Recipe.objects.get(id=recipe.id)
+        red = stale.image.name
+        self.upload(recipe, encode('blue'))
+        stale.refresh_from_db()
+        blue = stale.image.name
+
+        stale.image = red
+        stale.save()
+
+        self.assertRefCount(red, 1)
+        self.assertRefCount(blue, 0)
+
+    def test_cascade_delete_releases(self):
+        """Test deleting a user releases the images of their recipes"""
+        recipe = create_recipe(self.user)
+        self.upload(recipe, encode())
+        recipe.refresh_from_db()
+
+        self.user.delete()
+
+        self.assertRefCount(recipe.image.name, 0)
+
+    def test_acquire_is_one_upsert(self):
+        """Test counting a file inserts or increments in one statement"""
+        with self.assertNumQueries(1):
+            blobs.acquire('uploads/recipe/ab/abc.jpg')
+        self.assertRefCount('uploads/recipe/ab/abc.jpg', 1)
+
+        blob = ImageBlob.objects.get(name='uploads/recipe/ab/abc.jpg')
+        with self.assertNumQueries(1):
+            blobs.acquire('uploads/recipe/ab/abc.jpg')
+        self.assertRefCount('uploads/recipe/ab/abc.jpg', 2)
+        self.assertGreater(
+            ImageBlob.objects.get(id=blob.id).updated_at, blob.updated_at,
+        )
+
+    def test_collect_garbage(self):
+        """Test unused files and their derivatives are deleted"""
+        recipe = create_recipe(self.user)
+        self.upload(recipe, encode('red'))
+        images.process_jobs()
+        recipe.refresh_from_db()
+        red = recipe.image.name
+        red_thumb = recipe.image_derivatives['thumb']['jpeg']
+        self.upload(recipe, encode('blue'))
+        recipe.refresh_from_db()
+        blue = recipe.image.name
+        self.expire()
+
+        out = StringIO()
+        call_command('collect_image_blobs', batch_size=1, stdout=out)
+
+        self.assertIn('Deleted 1 unused images', out.getvalue())
+        self.assertFalse(default_storage.exists(red))
+        self.assertFalse(default_storage.exists(red_thumb))
+        self.assertTrue(default_storage.exists(blue))
+        self.assertEqual(
+            list(ImageBlob.objects.values_list('name', flat=True)), [blue],
+        )
+
+    def test_upload_restores_collected_file(self):
+        """Test a file collected between its deduplicated save and being
+        counted is written again"""
+        recipe = create_recipe(self.user)
+        content = encode()
+        digest = hashlib.sha256(content).hexdigest()
+        stored = f'uploads/recipe/{digest[:2]}/{digest}.jpg'
+        exists = ContentAddressedStorage.exists
+        checks = []
+
+        def collected_after_first_check(storage, name):
+            if name == stored:
+                checks.append(name)
+                if len(checks) == 1:
+                    return True
+            return exists(storage, name)
+
+        with patch.object(
+            ContentAddressedStorage, 'exists', collected_after_first_check,
+        ):
+            res = self.upload(recipe, content)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        recipe.refresh_from_db()
+        self.assertTrue(default_storage.exists(recipe.image.name))
+        self.assertRefCount(recipe.image.name, 1)
+
+    def test_collect_garbage_grace_period(self):
+        """Test recently released files are kept"""
+        recipe = create_recipe(self.user)
+        self.upload(recipe, encode('red'))
+        recipe.refresh_from_db()
+        red = recipe.image.name
+        self.upload(recipe, encode('blue'))
+
+        self.assertEqual(blobs.collect_garbage(), 0)
+        self.assertTrue(default_storage.exists(red))
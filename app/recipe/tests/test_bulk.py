@@ -0,0 +1,334 @@
+"""
+Tests for the bulk create, update and delete endpoints
+"""
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import (
+    IntegrityError,
+    connection,
+)
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    Ingredient,
+    Recipe,
+    Tag,
+)
+from recipe.views import RecipeViewSet
+
+
+RECIPES_BULK_URL = reverse('recipe:recipe-bulk')
+TAGS_BULK_URL = reverse('recipe:tag-bulk')
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe"""
+    defaults = {
+        'title': 'Sample recipe title',
+        'time_minutes': 22,
+        'price': Decimal('5.25'),
+    }
+    defaults.update(params)
+
+    return Recipe.objects.create(user=user, **defaults)
+
+
+def create_user(email='user@example.com', password='sample123'):
+    """create and return a new user"""
+    return get_user_model().objects.create_user(
+        email=email,
+        password=password,
+    )
+
+
+class RecipeBulkTests(TestCase):
+    """Test bulk operations on recipes"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_create(self):
+        """Test creating several recipes in one request"""
+        payload = [
+            {'title': 'Dal', 'time_minutes': 20, 'price': '3.00',
+             'tags': [{'name': 'Indian'}]},
+            {'title': 'Naan', 'time_minutes': 40, 'price': '1.50',
+             'tags': [{'name': 'Indian'}, {'name': 'Bread'}]},
+        ]
+
+        res = self.client.post(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([r['title'] for r in res.data], ['Dal', 'Naan'])
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        naan = Recipe.objects.get(title='Naan', user=self.user)
+        self.assertEqual(naan.tags.count(), 2)
+
+    def test_bulk_create_all_or_nothing(self):
+        """Test one invalid item rejects the whole request"""
+        payload = [
+            {'title': 'Dal', 'time_minutes': 20, 'price': '3.00'},
+            {'title': 'Broken'},
+        ]
+
+        res = self.client.post(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('price', res.data[1])
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_bulk_update(self):
+        """Test patching several recipes and replacing their tags"""
+        old_tag = Tag.objects.create(user=self.user, name='Old')
+        r1 = create_recipe(user=self.user, title='One')
+        r1.tags.add(old_tag)
+        r2 = create_recipe(user=self.user, title='Two')
+        payload = [
+            {'id': r1.id, 'tags': [{'name': 'New'}]},
+            {'id': r2.id, 'title': 'Two, renamed'},
+        ]
+
+        res = self.client.patch(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        r1.refresh_from_db()
+        r2.refresh_from_db()
+        self.assertEqual(r1.title, 'One')
+        self.assertEqual([t.name for t in r1.tags.all()], ['New'])
+        self.assertEqual(r2.title, 'Two, renamed')
+        self.assertEqual(res.data[1]['title'], 'Two, renamed')
+
+    def _through_writes(self, queries):
+        """Return the INSERT and DELETE statements on the through tables"""
+        return [
+            query['sql'] for query in queries
+            if query['sql'].startswith(('INSERT', 'DELETE')) and
+            ('core_recipe_tags' in query['sql'] or
+             'core_recipe_ingredients' in query['sql'])
+        ]
+
+    def test_bulk_unchanged_update_skips_through_writes(self):
+        """Test a bulk PATCH with the same tags and ingredients writes no
+        links"""
+        payload = []
+        for title in ('One', 'Two'):
+            recipe = create_recipe(user=self.user, title=title)
+            recipe.tags.add(
+                Tag.objects.get_or_create(user=self.user, name='Lunch')[0]
+            )
+            recipe.ingredients.add(
+                Ingredient.objects.get_or_create(
+                    user=self.user, name='Rice',
+                )[0]
+            )
+            payload.append({
+                'id': recipe.id,
+                'tags': [{'name': 'Lunch'}],
+                'ingredients': [{'name': 'Rice'}],
+            })
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.patch(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._through_writes(queries), [])
+
+    def test_bulk_update_only_writes_changed_links(self):
+        """Test a bulk PATCH inserts and deletes only the changed links"""
+        lunch = Tag.objects.create(user=self.user, name='Lunch')
+        quick = Tag.objects.create(user=self.user, name='Quick')
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(lunch, quick)
+        link = recipe.tags.through.objects.get(recipe=recipe, tag=lunch)
+        payload = [
+            {'id': recipe.id, 'tags': [{'name': 'Lunch'}, {'name': 'Vegan'}]},
+        ]
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.patch(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        writes = self._through_writes(queries)
+        self.assertEqual(len(writes), 2)
+        self.assertEqual(
+            sorted(tag.name for tag in recipe.tags.all()), ['Lunch', 'Vegan'],
+        )
+        self.assertTrue(
+            recipe.tags.through.objects.filter(id=link.id).exists()
+        )
+
+    def test_bulk_update_other_users_recipe(self):
+        """Test ids of other users' recipes are rejected"""
+        mine = create_recipe(user=self.user)
+        other = create_recipe(user=create_user(email='other@example.com'))
+        payload = [
+            {'id': mine.id, 'title': 'Changed'},
+            {'id': other.id, 'title': 'Hijacked'},
+        ]
+
+        res = self.client.patch(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('id', res.data[1])
+        mine.refresh_from_db()
+        self.assertNotEqual(mine.title, 'Changed')
+
+    def test_bulk_delete(self):
+        """Test deleting several recipes by id"""
+        r1 = create_recipe(user=self.user)
+        r2 = create_recipe(user=self.user)
+        keep = create_recipe(user=self.user)
+
+        res = self.client.delete(
+            RECIPES_BULK_URL, [r1.id, {'id': r2.id}], format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(list(Recipe.objects.all()), [keep])
+
+    def test_bulk_delete_rejects_unknown_ids(self):
+        """Test nothing is deleted if any id is invalid"""
+        recipe = create_recipe(user=self.user)
+
+        res = self.client.delete(
+            RECIPES_BULK_URL, [recipe.id, recipe.id + 100, 'x'],
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(Recipe.objects.filter(id=recipe.id).exists())
+
+    def test_bulk_create_ignores_list_filters(self):
+        """Test created recipes are returned despite list filters"""
+        tag = Tag.objects.create(user=self.user, name='Other')
+        payload = [{'title': 'Dal', 'time_minutes': 20, 'price': '3.00'}]
+
+        res = self.client.post(
+            f'{RECIPES_BULK_URL}?tags={tag.id}&search=zzz', payload,
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([r['title'] for r in res.data], ['Dal'])
+
+    @patch.object(RecipeViewSet, 'bulk_max_items', 1)
+    def test_bulk_limits(self):
+        """Test empty, non-list and oversized bodies are rejected"""
+        for payload in [[], {'title': 'x'}, [1, 2]]:
+            res = self.client.delete(RECIPES_BULK_URL, payload, format='json')
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TagBulkTests(TestCase):
+    """Test bulk operations on tags"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_create_tags(self):
+        """Test creating several tags in one request"""
+        res = self.client.post(
+            TAGS_BULK_URL, [{'name': 'Vegan'}, {'name': 'Quick'}],
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([t['name'] for t in res.data], ['Vegan', 'Quick'])
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+    def test_bulk_create_duplicate_names(self):
+        """Test repeated or existing names are rejected"""
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.post(
+            TAGS_BULK_URL,
+            [{'name': 'Vegan'}, {'name': 'Quick'}, {'name': 'Quick'}],
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([bool(e) for e in res.data], [True, False, True])
+        self.assertEqual(Tag.objects.count(), 1)
+
+    def test_bulk_create_tags_assigned_only(self):
+        """Test unassigned new tags are returned despite assigned_only"""
+        res = self.client.post(
+            f'{TAGS_BULK_URL}?assigned_only=1', [{'name': 'x'}],
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([t['name'] for t in res.data], ['x'])
+
+    def test_bulk_create_conflict(self):
+        """Test a name created concurrently is a 400, not a 500"""
+        with patch(
+            'recipe.views.TagViewSet.perform_bulk_create',
+            side_effect=IntegrityError,
+        ):
+            res = self.client.post(
+                TAGS_BULK_URL, [{'name': 'Vegan'}], format='json',
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('non_field_errors', res.data)
+
+    def test_bulk_ids_reject_booleans(self):
+        """Test JSON true is not taken as id 1"""
+        tag = Tag.objects.create(id=1, user=self.user, name='A')
+
+        res = self.client.patch(
+            TAGS_BULK_URL, [{'id': True, 'name': 'zz'}], format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {'id': ['Not found.']})
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'A')
+
+    def test_bulk_rename_tags(self):
+        """Test renaming tags and rejecting a clash with an existing tag"""
+        t1 = Tag.objects.create(user=self.user, name='A')
+        t2 = Tag.objects.create(user=self.user, name='B')
+        Tag.objects.create(user=self.user, name='C')
+
+        res = self.client.patch(
+            TAGS_BULK_URL,
+            [{'id': t1.id, 'name': 'A2'}, {'id': t2.id, 'name': 'B2'}],
+            format='json',
+        )
+        clash = self.client.patch(
+            TAGS_BULK_URL, [{'id': t1.id, 'name': 'C'}], format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        t1.refresh_from_db()
+        self.assertEqual(t1.name, 'A2')
+        self.assertEqual(clash.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_delete_tags(self):
+        """Test deleting several tags"""
+        tags = [
+            Tag.objects.create(user=self.user, name=name)
+            for name in ['A', 'B']
+        ]
+
+        res = self.client.delete(
+            TAGS_BULK_URL, [tag.id for tag in tags], format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Tag.objects.exists())
@@ -0,0 +1,190 @@
+"""
+Tests for the per-user recipe response cache
+"""
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import (
+    TestCase,
+    override_settings,
+)
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    Recipe,
+    Tag,
+)
+from recipe.cache import (
+    CACHE_ALIAS,
+    cache_stats,
+    reset_cache_stats,
+)
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def detail_url(recipe_id):
+    """create and return a recipe detail URL"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe"""
+    defaults = {
+        'title': 'Sample recipe title',
+        'time_minutes': 22,
+        'price': Decimal('5.25'),
+    }
+    defaults.update(params)
+
+    return Recipe.objects.create(user=user, **defaults)
+
+
+def create_user(email='user@example.com', password='sample123'):
+    """create and return a new user"""
+    return get_user_model().objects.create_user(
+        email=email,
+        password=password,
+    )
+
+
+class ResponseCacheTests(TestCase):
+    """Test caching of recipe, tag and ingredient responses"""
+
+    def setUp(self):
+        caches[CACHE_ALIAS].clear()
+        reset_cache_stats()
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+
+    def test_repeated_list_is_served_from_cache(self):
+        """Test a second identical list request skips the list queries"""
+        create_recipe(user=self.user)
+        first = self.client.get(RECIPES_URL)
+
+        with self.assertNumQueries(1):
+            second = self.client.get(RECIPES_URL)
+
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(cache_stats()['hits'], 1)
+        self.assertEqual(cache_stats()['misses'], 1)
+
+    def test_query_params_are_cached_separately(self):
+        """Test different query strings get different entries"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(tag)
+        create_recipe(user=self.user)
+
+        self.client.get(RECIPES_URL)
+        res = self.client.get(RECIPES_URL, {'tags': tag.id})
+
+        self.assertEqual(len(res.data), 1)
+        self.assertEqual(cache_stats()['misses'], 2)
+
+    def test_create_invalidates(self):
+        """Test creating a recipe through the API invalidates the list"""
+        self.client.get(RECIPES_URL)
+
+        payload = {
+            'title': 'Sample recipe',
+            'time_minutes': 30,
+            'price': Decimal('5.99'),
+        }
+        self.client.post(RECIPES_URL, payload)
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(len(res.data), 1)
+
+    def test_update_invalidates_detail(self):
+        """Test a PATCH invalidates the cached detail"""
+        recipe = create_recipe(user=self.user)
+        url = detail_url(recipe.id)
+        self.client.get(url)
+
+        self.client.patch(url, {'title': 'New title'})
+        res = self.client.get(url)
+
+        self.assertEqual(res.data['title'], 'New title')
+
+    def test_write_in_other_worker_invalidates(self):
+        """Test a write whose generation bump this process never saw
+        still invalidates, as with a LocMemCache per uWSGI worker"""
+        recipe = create_recipe(user=self.user)
+        url = detail_url(recipe.id)
+        self.client.get(url)
+
+        with patch('recipe.cache._bump_generation'):
+            self.client.patch(url, {'title': 'New title'})
+        res = self.client.get(url)
+
+        self.assertEqual(res.data['title'], 'New title')
+
+    def test_tag_link_change_invalidates(self):
+        """Test adding a tag to a recipe invalidates the list"""
+        recipe = create_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.data[0]['tags'][0]['name'], 'Vegan')
+
+    def test_tag_rename_invalidates_recipes(self):
+        """Test renaming a tag invalidates recipes showing it"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        create_recipe(user=self.user).tags.add(tag)
+        self.client.get(RECIPES_URL)
+
+        self.client.patch(
+            reverse('recipe:tag-detail', args=[tag.id]),
+            {'name': 'Plant based'},
+        )
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.data[0]['tags'][0]['name'], 'Plant based')
+
+    def test_delete_invalidates(self):
+        """Test deleting a tag invalidates the tag list"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.client.get(TAGS_URL)
+
+        self.client.delete(reverse('recipe:tag-detail', args=[tag.id]))
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.data, [])
+
+    def test_cache_is_per_user(self):
+        """Test one user's writes do not invalidate or leak to another"""
+        other = create_user(email='other@example.com')
+        other_client = APIClient()
+        other_client.force_authenticate(other)
+        create_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+        other_client.get(RECIPES_URL)
+
+        create_recipe(user=other)
+        res = self.client.get(RECIPES_URL)
+        other_res = other_client.get(RECIPES_URL)
+
+        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(other_res.data), 1)
+        self.assertEqual(cache_stats()['hits'], 1)
+
+    @override_settings(RECIPE_CACHE_ENABLED=False)
+    def test_cache_can_be_disabled(self):
+        """Test nothing is cached when the cache is disabled"""
+        self.client.get(RECIPES_URL)
+        self.client.get(RECIPES_URL)
+
+        self.assertEqual(cache_stats()['hits'], 0)
+        self.assertEqual(cache_stats()['misses'], 0)
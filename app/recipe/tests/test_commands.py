@@ -0,0 +1,174 @@
+"""
+Tests for recipe management commands
+"""
+import re
+import shutil
+import tempfile
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import (
+    LiveServerTestCase,
+    TestCase,
+    override_settings,
+)
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+)
+
+
+class BenchmarkCommandTests(TestCase):
+    """Test the benchmark commands run and clean up after themselves"""
+
+    def test_benchmark_recipe_filters(self):
+        """Test the filter benchmark reports every plan and rolls back"""
+        out = StringIO()
+
+        call_command(
+            'benchmark_recipe_filters',
+            recipes=30, tags=5, ingredients=5, repeat=1,
+            stdout=out,
+        )
+
+        output = out.getvalue()
+        self.assertIn('JOIN + DISTINCT', output)
+        self.assertIn('EXISTS (any)', output)
+        self.assertIn('EXISTS (all)', output)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_benchmark_recipe_search(self):
+        """Test the search benchmark reports both terms and rolls back"""
+        out = StringIO()
+
+        call_command(
+            'benchmark_recipe_search',
+            recipes=30, matches=3, repeat=1,
+            stdout=out, stderr=StringIO(),
+        )
+
+        output = out.getvalue()
+        self.assertIn('Full-text "saffron"', output)
+        self.assertIn('icontains "smoky"', output)
+        self.assertFalse(Recipe.objects.exists())
+
+
+class BenchmarkApiLoadTests(LiveServerTestCase):
+    """Test the load driver against a live server"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, True)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_mixed_traffic(self):
+        """Test every operation is sent and created recipes removed"""
+        call_command(
+            'seed_benchmark',
+            users=2, recipes=3, tags=2, ingredients=2,
+            distribution='fixed', stdout=StringIO(),
+        )
+        out = StringIO()
+
+        call_command(
+            'benchmark_api_load',
+            base_url=self.live_server_url, duration=1.5, concurrency=1,
+            mix='list=1,filter=1,detail=1,create=1,patch=1,upload=1',
+            stdout=out,
+        )
+
+        output = out.getvalue()
+        for endpoint, status in [
+            ('GET /recipes/ ', 200),
+            ('GET /recipes/?tags&search', 200),
+            ('GET /recipes/{id}/', 200),
+            ('POST /recipes/', 201),
+            ('PATCH /recipes/{id}/', 200),
+            ('POST /{id}/upload-image/', 200),
+        ]:
+            self.assertRegex(output, rf'{re.escape(endpoint)}.* {status}:')
+        self.assertIn('Total:', output)
+        self.assertEqual(Recipe.objects.count(), 6)
+
+    def test_requires_seed(self):
+        """Test a helpful error is raised before seeding"""
+        with self.assertRaisesMessage(CommandError, 'seed_benchmark'):
+            call_command('benchmark_api_load', stdout=StringIO())
+
+
+class ImportCommandTests(TestCase):
+    """Test the import_recipes command"""
+
+    def test_import_file(self):
+        """Test recipes are imported from a file and errors reported"""
+        user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='sample123',
+        )
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson') as file:
+            file.write(
+                '{"title": "Dal", "time_minutes": 20, "price": "3.00"}\n'
+                '{"title": "Broken"}\n'
+            )
+            file.flush()
+            out, err = StringIO(), StringIO()
+
+            call_command(
+                'import_recipes', file.name, email=user.email,
+                stdout=out, stderr=err,
+            )
+
+        self.assertEqual(Recipe.objects.get(user=user).title, 'Dal')
+        self.assertIn('Created 1 recipes, 1 rows failed', out.getvalue())
+        self.assertIn('row 2', err.getvalue())
+
+    def test_unknown_user(self):
+        """Test importing for a missing user fails"""
+        with self.assertRaises(CommandError):
+            call_command('import_recipes', '-', email='nobody@example.com')
+
+
+class ExplainCommandTests(TestCase):
+    """Test the explain_recipe_queries command"""
+
+    def test_explain_hot_queries(self):
+        """Test a plan is printed for each hot query"""
+        user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='sample123',
+        )
+        recipe = Recipe.objects.create(
+            user=user,
+            title='Pongal',
+            time_minutes=5,
+            price=Decimal('4.50'),
+        )
+        recipe.tags.add(Tag.objects.create(user=user, name='Breakfast'))
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=user, name='Rice')
+        )
+        out = StringIO()
+
+        call_command('explain_recipe_queries', stdout=out)
+
+        output = out.getvalue()
+        for label in [
+            'recipe list',
+            'recipe detail',
+            'recipe list filtered by tags',
+            'tag list assigned_only',
+            'ingredient list with_counts',
+        ]:
+            self.assertIn(label, output)
+
+    def test_explain_unknown_user(self):
+        """Test an unknown email raises an error"""
+        with self.assertRaises(CommandError):
+            call_command('explain_recipe_queries', email='no@example.com')
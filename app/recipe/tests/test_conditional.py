@@ -0,0 +1,163 @@
+"""
+Tests for conditional GET support on the recipe APIs
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    DataVersion,
+    Recipe,
+    Tag,
+)
+from recipe.conditional import get_data_version
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def detail_url(recipe_id):
+    """create and return a recipe detail URL"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe"""
+    defaults = {
+        'title': 'Sample recipe title',
+        'time_minutes': 22,
+        'price': Decimal('5.25'),
+    }
+    defaults.update(params)
+
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class ConditionalGetTests(TestCase):
+    """Test ETag and Last-Modified handling"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='sample123',
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_list_has_validators(self):
+        """Test the list response carries ETag and Last-Modified"""
+        create_recipe(user=self.user)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', res)
+        self.assertIn('Authorization', res['Vary'])
+
+    def test_matching_etag_returns_not_modified(self):
+        """Test If-None-Match with the current ETag returns 304"""
+        create_recipe(user=self.user)
+        etag = self.client.get(RECIPES_URL)['ETag']
+
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+        self.assertEqual(res.content, b'')
+
+    def test_etag_changes_after_update(self):
+        """Test updating a recipe changes the ETag"""
+        recipe = create_recipe(user=self.user)
+        etag = self.client.get(detail_url(recipe.id))['ETag']
+
+        self.client.patch(detail_url(recipe.id), {'title': 'New title'})
+        res = self.client.get(detail_url(recipe.id), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['title'], 'New title')
+
+    def test_etag_changes_after_delete(self):
+        """Test deleting a recipe changes the list ETag"""
+        create_recipe(user=self.user)
+        recipe = create_recipe(user=self.user)
+        etag = self.client.get(RECIPES_URL)['ETag']
+
+        recipe.delete()
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
+
+    def test_etag_changes_after_link_change(self):
+        """Test linking a tag to a recipe changes the ETag"""
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        etag = self.client.get(RECIPES_URL)['ETag']
+
+        recipe.tags.add(tag)
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_etag_differs_per_url(self):
+        """Test different endpoints get different ETags"""
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        recipes_etag = self.client.get(RECIPES_URL)['ETag']
+        tags_etag = self.client.get(TAGS_URL)['ETag']
+        res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=recipes_etag)
+
+        self.assertNotEqual(recipes_etag, tags_etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_etag_differs_per_user(self):
+        """Test another user's ETag does not match"""
+        other = get_user_model().objects.create_user(
+            email='other@example.com',
+            password='sample123',
+        )
+        other_client = APIClient()
+        other_client.force_authenticate(other)
+        etag = other_client.get(RECIPES_URL)['ETag']
+
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_version_lookup_is_one_query(self):
+        """Test reading the data version does not scale with the data"""
+        with self.assertNumQueries(1):
+            empty = get_data_version(self.user)
+
+        for _ in range(5):
+            create_recipe(user=self.user)
+        with self.assertNumQueries(1):
+            version, last_modified = get_data_version(self.user)
+
+        self.assertNotEqual(version, empty[0])
+        self.assertIsNotNone(last_modified)
+
+    def test_user_without_version_row(self):
+        """Test users created without signals get a version on first read"""
+        user = get_user_model().objects.bulk_create([
+            get_user_model()(email='bulk@example.com'),
+        ])[0]
+        user = get_user_model().objects.get(email=user.email)
+        client = APIClient()
+        client.force_authenticate(user)
+
+        etag = client.get(RECIPES_URL)['ETag']
+        self.assertTrue(DataVersion.objects.filter(user=user).exists())
+        create_recipe(user=user)
+        res = client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
@@ -0,0 +1,145 @@
+"""
+Tests for the recipe export endpoint
+"""
+import csv
+import json
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+)
+from recipe.views import RecipeViewSet
+
+
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe"""
+    defaults = {
+        'title': 'Sample recipe title',
+        'time_minutes': 22,
+        'price': Decimal('5.25'),
+    }
+    defaults.update(params)
+
+    return Recipe.objects.create(user=user, **defaults)
+
+
+def create_user(email='user@example.com', password='sample123'):
+    """create and return a new user"""
+    return get_user_model().objects.create_user(
+        email=email,
+        password=password,
+    )
+
+
+def read_stream(response):
+    """Return the full body of a streaming response as text"""
+    return b''.join(response.streaming_content).decode()
+
+
+class PublicExportTests(TestCase):
+    """Test unauthenticated export requests"""
+
+    def test_auth_required(self):
+        """Test auth is required to export"""
+        res = APIClient().get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateExportTests(TestCase):
+    """Test exporting recipes"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+
+    def test_export_ndjson(self):
+        """Test recipes are streamed as one JSON document per line"""
+        recipe = create_recipe(user=self.user, title='Pongal')
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Breakfast'))
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Rice')
+        )
+        create_recipe(user=create_user(email='other@example.com'))
+
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        lines = read_stream(res).splitlines()
+        self.assertEqual(len(lines), 1)
+        exported = json.loads(lines[0])
+        self.assertEqual(exported['title'], 'Pongal')
+        self.assertEqual(exported['price'], '5.25')
+        self.assertEqual(exported['tags'][0]['name'], 'Breakfast')
+        self.assertEqual(exported['ingredients'][0]['name'], 'Rice')
+
+    def test_export_csv(self):
+        """Test recipes are streamed as CSV with joined names"""
+        recipe = create_recipe(user=self.user, title='Chili, hot')
+        recipe.tags.add(
+            Tag.objects.create(user=self.user, name='Spicy'),
+            Tag.objects.create(user=self.user, name='Dinner'),
+        )
+
+        res = self.client.get(EXPORT_URL, {'export_format': 'csv'})
+
+        self.assertEqual(res['Content-Type'], 'text/csv')
+        self.assertIn('recipes.csv', res['Content-Disposition'])
+        rows = list(csv.DictReader(StringIO(read_stream(res))))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['title'], 'Chili, hot')
+        self.assertEqual(rows[0]['tags'], 'Dinner; Spicy')
+
+    def test_export_applies_filters(self):
+        """Test the list filters also apply to the export"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = create_recipe(user=self.user, title='Salad')
+        recipe.tags.add(tag)
+        create_recipe(user=self.user, title='Steak')
+
+        res = self.client.get(EXPORT_URL, {'tags': tag.id})
+
+        lines = read_stream(res).splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines],
+                         [recipe.id])
+
+    def test_invalid_format(self):
+        """Test an unknown export format is rejected"""
+        res = self.client.get(EXPORT_URL, {'export_format': 'xml'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @patch.object(RecipeViewSet, 'export_chunk_size', 2)
+    def test_related_rows_fetched_per_chunk(self):
+        """Test tags and ingredients are loaded once per chunk"""
+        for i in range(5):
+            recipe = create_recipe(user=self.user, title=f'Recipe {i}')
+            recipe.tags.add(Tag.objects.create(user=self.user, name=f'T{i}'))
+        res = self.client.get(EXPORT_URL)
+
+        # One recipe query, then tags and ingredients for 3 chunks
+        with self.assertNumQueries(7):
+            lines = read_stream(res).splitlines()
+
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(
+            [json.loads(line)['tags'][0]['name'] for line in lines],
+            ['T4', 'T3', 'T2', 'T1', 'T0'],
+        )
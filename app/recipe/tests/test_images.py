@@ -0,0 +1,187 @@
+"""
+Tests for background image derivatives
+"""
+import shutil
+import tempfile
+from io import (
+    BytesIO,
+    StringIO,
+)
+from unittest.mock import patch
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import (
+    TestCase,
+    override_settings,
+)
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    ImageJob,
+    Recipe,
+)
+from recipe import images
+
+
+def image_upload_url(recipe_id):
+    return reverse('recipe:recipe-upload-image', args=[recipe_id])
+
+
+def detail_url(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def make_image(size=(2000, 1000), orientation=None, color='red'):
+    """Return JPEG bytes, optionally tagged with an EXIF orientation"""
+    image = Image.new('RGB', size, color)
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    buffer = BytesIO()
+    image.save(buffer, format='JPEG', exif=exif)
+    buffer.seek(0)
+    buffer.name = 'photo.jpg'
+    return buffer
+
+
+class ImageDerivativeTests(TestCase):
+    """Test uploads queue jobs and the worker builds derivatives"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=5,
+            price='5.00',
+        )
+
+    def upload(self, image=None):
+        return self.client.post(
+            image_upload_url(self.recipe.id),
+            {'image': image or make_image()},
+            format='multipart',
+        )
+
+    def test_upload_queues_job(self):
+        """Test uploading an image queues one pending job"""
+        res = self.upload()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        job = ImageJob.objects.get(recipe=self.recipe)
+        self.assertEqual(job.status, ImageJob.PENDING)
+        self.assertEqual(job.source, self.recipe.image.name)
+        self.assertEqual(self.recipe.image_derivatives, {})
+
+    def test_build_derivatives(self):
+        """Test derivatives fit each size and drop the EXIF data"""
+        self.upload(make_image(size=(2000, 1000), orientation=6))
+        self.recipe.refresh_from_db()
+
+        derivatives = images.build_derivatives(
+            self.recipe.image.name, default_storage,
+        )
+
+        self.assertEqual(set(derivatives), set(images.DERIVATIVE_SIZES))
+        for size, edge in images.DERIVATIVE_SIZES.items():
+            self.assertEqual(
+                set(derivatives[size]), set(images.derivative_formats()),
+            )
+            for name in derivatives[size].values():
+                with default_storage.open(name) as file:
+                    image = Image.open(file)
+                    # Orientation 6 is applied, so the image is portrait
+                    self.assertEqual(image.size, (edge // 2, edge))
+                    self.assertFalse(image.getexif())
+
+    def test_process_jobs_command(self):
+        """Test the worker fills in derivatives shown on the detail"""
+        self.upload()
+
+        call_command('process_image_jobs', once=True, stdout=StringIO())
+
+        job = ImageJob.objects.get(recipe=self.recipe)
+        self.assertEqual(job.status, ImageJob.DONE)
+        res = self.client.get(detail_url(self.recipe.id))
+        derivatives = res.data['image_derivatives']
+        self.assertEqual(set(derivatives), set(images.DERIVATIVE_SIZES))
+        self.assertTrue(
+            derivatives['thumb']['jpeg'].startswith('http://testserver/')
+        )
+
+    def test_detail_without_derivatives(self):
+        """Test the detail shows no derivatives before the job runs"""
+        self.upload()
+
+        res = self.client.get(detail_url(self.recipe.id))
+
+        self.assertIsNone(res.data['image_derivatives'])
+
+    def test_detail_update_keeps_image(self):
+        """Test the image cannot be cleared past its derivatives"""
+        self.upload()
+        call_command('process_image_jobs', once=True, stdout=StringIO())
+        self.recipe.refresh_from_db()
+        image = self.recipe.image.name
+        derivatives = self.recipe.image_derivatives
+
+        res = self.client.patch(
+            detail_url(self.recipe.id), {'image': None}, format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', res.data)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image.name, image)
+        self.assertEqual(self.recipe.image_derivatives, derivatives)
+
+    def test_superseded_job_skipped(self):
+        """Test a job for a replaced image finishes without work"""
+        self.upload()
+        self.upload(make_image(color='blue'))
+        first, second = ImageJob.objects.order_by('id')
+
+        with patch(
+            'recipe.images.build_derivatives',
+            wraps=images.build_derivatives,
+        ) as build:
+            self.assertEqual(images.process_jobs(), 2)
+
+        build.assert_called_once()
+        self.assertEqual(build.call_args.args[0], second.source)
+        first.refresh_from_db()
+        self.assertEqual(first.status, ImageJob.DONE)
+
+    def test_failed_job_retried(self):
+        """Test a failing job is retried, then marked failed"""
+        self.upload()
+
+        with patch(
+            'recipe.images.build_derivatives',
+            side_effect=OSError('broken'),
+        ), self.assertLogs('recipe.images', 'ERROR'):
+            self.assertEqual(images.process_jobs(), images.MAX_ATTEMPTS)
+
+        job = ImageJob.objects.get(recipe=self.recipe)
+        self.assertEqual(job.status, ImageJob.FAILED)
+        self.assertEqual(job.attempts, images.MAX_ATTEMPTS)
+        self.assertIn('broken', job.error)
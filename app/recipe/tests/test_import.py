@@ -0,0 +1,223 @@
+"""
+Tests for bulk recipe import
+"""
+import json
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+)
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+)
+from recipe.importer import (
+    RecipeImporter,
+    RecordError,
+    iter_records,
+)
+
+
+IMPORT_URL = reverse('recipe:recipe-import-recipes')
+
+
+def sample_record(**params):
+    """Return a valid recipe record"""
+    record = {
+        'title': 'Sample recipe',
+        'time_minutes': 10,
+        'price': '2.50',
+    }
+    record.update(params)
+    return record
+
+
+def create_user(email='user@example.com', password='sample123'):
+    """create and return a new user"""
+    return get_user_model().objects.create_user(
+        email=email,
+        password=password,
+    )
+
+
+class IterRecordsTests(SimpleTestCase):
+    """Test stream parsing of import files"""
+
+    def test_json_array_across_reads(self):
+        """Test array elements split across reads are parsed"""
+        records = [sample_record(title=f'Recipe {i}') for i in range(20)]
+        stream = StringIO(json.dumps(records, indent=2))
+
+        parsed = list(iter_records(stream, read_size=7))
+
+        self.assertEqual(parsed, records)
+
+    def test_ndjson_bad_line(self):
+        """Test a malformed NDJSON line is reported and parsing goes on"""
+        stream = StringIO('{"title": "a"}\n{oops\n\n{"title": "b"}')
+
+        parsed = list(iter_records(stream))
+
+        self.assertEqual(parsed[0], {'title': 'a'})
+        self.assertIsInstance(parsed[1], RecordError)
+        self.assertEqual(parsed[2], {'title': 'b'})
+
+    @patch('recipe.importer.MAX_RECORD_SIZE', 30)
+    def test_ndjson_line_too_large(self):
+        """Test an overlong line is reported once, not buffered whole"""
+        long_line = json.dumps({'title': 'x' * 200})
+        stream = StringIO(f'{{"title": "a"}}\n{long_line}\n{{"title": "b"}}')
+
+        parsed = list(iter_records(stream, read_size=8))
+
+        self.assertEqual(len(parsed), 3)
+        self.assertEqual(parsed[0], {'title': 'a'})
+        self.assertIsInstance(parsed[1], RecordError)
+        self.assertIn('larger than 30', parsed[1].message)
+        self.assertEqual(parsed[2], {'title': 'b'})
+
+    @patch('recipe.importer.MAX_RECORD_SIZE', 30)
+    def test_ndjson_unterminated_line_too_large(self):
+        """Test a long last line without a newline is reported"""
+        stream = StringIO('{"title": "' + 'x' * 200)
+
+        parsed = list(iter_records(stream, read_size=8))
+
+        self.assertEqual(len(parsed), 1)
+        self.assertIsInstance(parsed[0], RecordError)
+
+    def test_json_array_syntax_error_stops(self):
+        """Test a syntax error inside an array ends the stream"""
+        stream = StringIO('[{"title": "a"} {"title": "b"}]')
+
+        parsed = list(iter_records(stream))
+
+        self.assertEqual(len(parsed), 2)
+        self.assertIsInstance(parsed[1], RecordError)
+
+    def test_empty_input(self):
+        """Test empty input yields nothing"""
+        self.assertEqual(list(iter_records(StringIO('  \n'))), [])
+        self.assertEqual(list(iter_records(StringIO('[]'))), [])
+
+
+class RecipeImporterTests(TestCase):
+    """Test validating and writing imported recipes"""
+
+    def setUp(self):
+        self.user = create_user()
+
+    def test_import_dedupes_tags_and_ingredients(self):
+        """Test names are shared across recipes, chunks and existing rows"""
+        existing = Tag.objects.create(user=self.user, name='Vegan')
+        records = [
+            sample_record(
+                title=f'Recipe {i}',
+                tags=[{'name': 'Vegan'}, {'name': 'Quick'}, {'name': 'Quick'}],
+                ingredients=[{'name': 'Salt'}],
+            )
+            for i in range(5)
+        ]
+
+        report = RecipeImporter(self.user, chunk_size=2).run(records)
+
+        self.assertEqual(report, {'created': 5, 'failed': 0, 'errors': []})
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(Ingredient.objects.count(), 1)
+        for recipe in Recipe.objects.all():
+            self.assertEqual(
+                sorted(tag.name for tag in recipe.tags.all()),
+                ['Quick', 'Vegan'],
+            )
+        self.assertEqual(existing.recipe_set.count(), 5)
+
+    def test_invalid_rows_reported(self):
+        """Test invalid rows are skipped without aborting the import"""
+        records = [
+            sample_record(title='Good'),
+            sample_record(price='not a price'),
+            RecordError('Invalid JSON'),
+            ['not', 'an', 'object'],
+            sample_record(title='Also good', description='Tasty'),
+        ]
+
+        report = RecipeImporter(self.user).run(records)
+
+        self.assertEqual(report['created'], 2)
+        self.assertEqual(report['failed'], 3)
+        self.assertEqual([e['row'] for e in report['errors']], [2, 3, 4])
+        self.assertIn('price', report['errors'][0]['errors'])
+        self.assertEqual(
+            Recipe.objects.get(title='Also good').description, 'Tasty',
+        )
+
+    def test_error_list_capped(self):
+        """Test only max_errors errors are kept in the report"""
+        report = RecipeImporter(self.user, max_errors=1).run(
+            [{'title': ''}, {'title': ''}]
+        )
+
+        self.assertEqual(report['failed'], 2)
+        self.assertEqual(len(report['errors']), 1)
+
+
+class ImportApiTests(TestCase):
+    """Test the import endpoint"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+
+    def test_import_ndjson(self):
+        """Test importing newline delimited JSON for the user"""
+        body = '\n'.join([
+            json.dumps(sample_record(title='Pongal', tags=[{'name': 'Hot'}])),
+            json.dumps(sample_record(time_minutes='soon')),
+        ])
+
+        res = self.client.post(
+            IMPORT_URL, body, content_type='application/x-ndjson',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['created'], 1)
+        self.assertEqual(res.data['failed'], 1)
+        recipe = Recipe.objects.get(user=self.user)
+        self.assertEqual(recipe.tags.get().user, self.user)
+
+    def test_import_json_array(self):
+        """Test importing a JSON array"""
+        body = json.dumps([sample_record(), sample_record()])
+
+        res = self.client.post(
+            IMPORT_URL, body, content_type='application/json',
+        )
+
+        self.assertEqual(res.data['created'], 2)
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 2)
+
+    def test_import_empty_body(self):
+        """Test an empty body is rejected"""
+        res = self.client.post(
+            IMPORT_URL, '', content_type='application/json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_import_invalid_encoding(self):
+        """Test a body that is not UTF-8 is rejected"""
+        res = self.client.post(
+            IMPORT_URL, b'{"title": "\xff"}', content_type='application/json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
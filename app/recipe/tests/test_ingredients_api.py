@@ -17,6 +17,7 @@ from core.models import (
 from recipe.serializers import IngredientsSerializer
 
 INGREDIENTS_URL = reverse('recipe:ingredient-list')
+AUTOCOMPLETE_URL = reverse('recipe:ingredient-autocomplete')
 
 
 def detail_url(ingredient_id):
@@ -147,3 +148,55 @@ class PrivateIngredientsAPITests(TestCase):
         res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
 
         self.assertEqual(len(res.data), 1)
+
+    def test_list_ingredients_with_counts(self):
+        """Test listing ingredients with the number of recipes using each"""
+        item1 = Ingredient.objects.create(user=self.user, name='First')
+        item2 = Ingredient.objects.create(user=self.user, name='Second')
+        for title in ['Pongal', 'Khichdi']:
+            recipe = Recipe.objects.create(
+                title=title,
+                time_minutes=5,
+                price=Decimal('4.50'),
+                user=self.user,
+            )
+            recipe.ingredients.add(item1)
+
+        with self.assertNumQueries(2):
+            res = self.client.get(INGREDIENTS_URL, {'with_counts': 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        counts = {row['id']: row['recipe_count'] for row in res.data}
+        self.assertEqual(counts, {item1.id: 2, item2.id: 0})
+
+    def test_assigned_only_with_counts(self):
+        """Test assigned_only and with_counts can be combined"""
+        item1 = Ingredient.objects.create(user=self.user, name='First')
+        Ingredient.objects.create(user=self.user, name='Second')
+        recipe = Recipe.objects.create(
+            title='Pongal',
+            time_minutes=5,
+            price=Decimal('4.50'),
+            user=self.user,
+        )
+        recipe.ingredients.add(item1)
+
+        params = {'assigned_only': 1, 'with_counts': 1}
+        res = self.client.get(INGREDIENTS_URL, params)
+
+        self.assertEqual(len(res.data), 1)
+        self.assertEqual(res.data[0]['id'], item1.id)
+        self.assertEqual(res.data[0]['recipe_count'], 1)
+
+    def test_autocomplete_ingredients(self):
+        """Test autocomplete matches ingredient names case-insensitively"""
+        for name in ['Salt', 'salmon', 'Pepper']:
+            Ingredient.objects.create(user=self.user, name=name)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(AUTOCOMPLETE_URL, {'prefix': 'SAL'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item['name'] for item in res.data], ['salmon', 'Salt'],
+        )
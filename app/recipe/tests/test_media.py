@@ -0,0 +1,146 @@
+"""
+Tests for owner-only recipe media
+"""
+import shutil
+import tempfile
+from io import BytesIO
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import (
+    TestCase,
+    override_settings,
+)
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from recipe import media
+
+
+def media_url(recipe_id, name):
+    return reverse('recipe:recipe-media', args=[recipe_id, name])
+
+
+def image_content():
+    buffer = BytesIO()
+    Image.new('RGB', (10, 10)).save(buffer, format='JPEG')
+    return ContentFile(buffer.getvalue())
+
+
+def create_recipe(user):
+    recipe = Recipe.objects.create(
+        user=user,
+        title='Sample recipe',
+        time_minutes=5,
+        price='5.00',
+    )
+    recipe.image.save('photo.jpg', image_content())
+    return recipe
+
+
+class RecipeMediaTests(TestCase):
+    """Test images are only sent to their owner, through nginx"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        settings = override_settings(
+            MEDIA_ROOT=self.media_root,
+            MEDIA_X_ACCEL={'ENABLED': True, 'LOCATION': '/protected/'},
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(self.user)
+
+    def test_owner_gets_accel_redirect(self):
+        """Test the image is handed to nginx with cache headers"""
+        name = self.recipe.image.name
+
+        res = self.client.get(media_url(self.recipe.id, name))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['X-Accel-Redirect'], f'/protected/{name}')
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertEqual(res['Cache-Control'], media.CACHE_CONTROL)
+        self.assertEqual(res.content, b'')
+
+    def test_derivative_served(self):
+        """Test a derivative of the recipe's image is served"""
+        name = 'uploads/recipe/derivatives/abc/thumb.webp'
+        self.recipe.image_derivatives = {'thumb': {'webp': name}}
+        self.recipe.save()
+
+        res = self.client.get(media_url(self.recipe.id, name))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['X-Accel-Redirect'], f'/protected/{name}')
+        self.assertEqual(res['Content-Type'], 'image/webp')
+
+    def test_other_users_recipe(self):
+        """Test another user's image is not found"""
+        other = get_user_model().objects.create_user(
+            email='other@example.com',
+            password='testpass123',
+        )
+        recipe = create_recipe(other)
+
+        res = self.client.get(media_url(recipe.id, recipe.image.name))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertNotIn('X-Accel-Redirect', res)
+
+    def test_unknown_name(self):
+        """Test only the recipe's own files are served"""
+        for name in ('uploads/recipe/other.jpg', '../../etc/passwd'):
+            with self.subTest(name=name):
+                res = self.client.get(media_url(self.recipe.id, name))
+
+                self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_requires_authentication(self):
+        """Test anonymous requests are refused"""
+        res = APIClient().get(
+            media_url(self.recipe.id, self.recipe.image.name)
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_served_by_django_when_disabled(self):
+        """Test the file is streamed when X-Accel-Redirect is off"""
+        with override_settings(MEDIA_X_ACCEL={'ENABLED': False}):
+            res = self.client.get(
+                media_url(self.recipe.id, self.recipe.image.name)
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('X-Accel-Redirect', res)
+        self.recipe.image.open('rb')
+        with self.recipe.image:
+            self.assertEqual(
+                b''.join(res.streaming_content), self.recipe.image.read(),
+            )
+
+    def test_detail_links_to_media(self):
+        """Test the recipe detail links to the media action"""
+        res = self.client.get(
+            reverse('recipe:recipe-detail', args=[self.recipe.id])
+        )
+
+        self.assertEqual(
+            res.data['image'],
+            'http://testserver' + media_url(
+                self.recipe.id, self.recipe.image.name,
+            ),
+        )
@@ -0,0 +1,142 @@
+"""
+Tests for cursor pagination of the recipe APIs
+"""
+import base64
+import json
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+)
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENTS_URL = reverse('recipe:ingredient-list')
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe"""
+    defaults = {
+        'title': 'Sample recipe title',
+        'time_minutes': 22,
+        'price': Decimal('5.25'),
+    }
+    defaults.update(params)
+
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class PaginationTests(TestCase):
+    """Test keyset pagination on the list endpoints"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='sample123',
+        )
+        self.client.force_authenticate(self.user)
+
+    def _collect_pages(self, url, page_size):
+        """Follow next links and return the pages"""
+        pages = []
+        res = self.client.get(url, {'page_size': page_size})
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            pages.append(res.data['results'])
+            if res.data['next'] is None:
+                return pages
+            res = self.client.get(res.data['next'])
+
+    def test_unpaginated_by_default(self):
+        """Test the list stays a plain array without paging params"""
+        create_recipe(user=self.user)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsInstance(res.data, list)
+
+    def test_recipe_pages_cover_all_rows(self):
+        """Test walking recipe pages returns every recipe once in order"""
+        recipes = [create_recipe(user=self.user) for _ in range(7)]
+
+        pages = self._collect_pages(RECIPES_URL, 3)
+
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        ids = [row['id'] for page in pages for row in page]
+        self.assertEqual(ids, sorted((r.id for r in recipes), reverse=True))
+
+    def test_recipe_pages_are_stable_after_delete(self):
+        """Test a cursor still points to the right place after deletes"""
+        recipes = [create_recipe(user=self.user) for _ in range(5)]
+
+        res = self.client.get(RECIPES_URL, {'page_size': 2})
+        Recipe.objects.filter(id=recipes[-1].id).delete()
+        res = self.client.get(res.data['next'])
+
+        ids = [row['id'] for row in res.data['results']]
+        self.assertEqual(ids, [recipes[2].id, recipes[1].id])
+
+    def test_tag_pages(self):
+        """Test walking tag pages returns every tag once by name"""
+        for name in ['Vegan', 'Dinner', 'Brunch', 'Dessert', 'Apple']:
+            Tag.objects.create(user=self.user, name=name)
+
+        pages = self._collect_pages(TAGS_URL, 2)
+
+        self.assertEqual(
+            [row['name'] for page in pages for row in page],
+            ['Vegan', 'Dinner', 'Dessert', 'Brunch', 'Apple'],
+        )
+
+    def test_ingredient_pages(self):
+        """Test ingredients can be paged"""
+        for name in ['Salt', 'Pepper', 'Oil']:
+            Ingredient.objects.create(user=self.user, name=name)
+
+        pages = self._collect_pages(INGREDIENTS_URL, 2)
+
+        self.assertEqual(
+            [[row['name'] for row in page] for page in pages],
+            [['Salt', 'Pepper'], ['Oil']],
+        )
+
+    def test_page_query_count(self):
+        """Test a later page costs no more queries than the first"""
+        for _ in range(6):
+            create_recipe(user=self.user)
+
+        with self.assertNumQueries(4):
+            res = self.client.get(RECIPES_URL, {'page_size': 2})
+        with self.assertNumQueries(4):
+            self.client.get(res.data['next'])
+
+    def test_invalid_cursor(self):
+        """Test a malformed cursor returns 404"""
+        res = self.client.get(RECIPES_URL, {'cursor': 'not-a-cursor'})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cursor_with_wrong_types(self):
+        """Test a well-formed cursor with bad values returns 404"""
+        create_recipe(user=self.user)
+
+        for position in (['abc'], [None], [[1]], [{}]):
+            cursor = base64.urlsafe_b64encode(
+                json.dumps(position).encode()
+            ).decode()
+            with self.subTest(position=position):
+                res = self.client.get(RECIPES_URL, {'cursor': cursor})
+
+                self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
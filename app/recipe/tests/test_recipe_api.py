@@ -4,11 +4,17 @@ Tests for recipe APIs
 from decimal import Decimal
 import tempfile
 import os
+from unittest.mock import patch
 
 from PIL import Image
 
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.backends.postgresql.base import (
+    DatabaseWrapper as PostgresDatabaseWrapper,
+)
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
@@ -21,6 +27,7 @@ from core.models import (
 )
 
 
+from recipe import filters
 from recipe.serializers import (
     RecipeSerializer,
     RecipeDetailSerializer,
@@ -299,6 +306,56 @@ class PrivateRecipeAPITests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(recipe.tags.count(), 0)
 
+    def _through_writes(self, queries):
+        """Return the INSERT and DELETE statements on the through tables"""
+        return [
+            query['sql'] for query in queries
+            if query['sql'].startswith(('INSERT', 'DELETE')) and
+            ('core_recipe_tags' in query['sql'] or
+             'core_recipe_ingredients' in query['sql'])
+        ]
+
+    def test_unchanged_update_skips_through_writes(self):
+        """Test a PATCH with the same tags and ingredients writes no links"""
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Lunch'))
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Rice')
+        )
+
+        payload = {
+            'tags': [{'name': 'Lunch'}],
+            'ingredients': [{'name': 'Rice'}],
+        }
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.patch(
+                detail_url(recipe.id), payload, format='json',
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._through_writes(queries), [])
+
+    def test_update_only_writes_changed_links(self):
+        """Test a PATCH inserts and deletes only the changed links"""
+        recipe = create_recipe(user=self.user)
+        lunch = Tag.objects.create(user=self.user, name='Lunch')
+        quick = Tag.objects.create(user=self.user, name='Quick')
+        recipe.tags.add(lunch, quick)
+
+        payload = {'tags': [{'name': 'Lunch'}, {'name': 'Vegan'}]}
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.patch(
+                detail_url(recipe.id), payload, format='json',
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        writes = self._through_writes(queries)
+        self.assertEqual(len(writes), 2)
+        self.assertEqual(
+            set(recipe.tags.values_list('name', flat=True)),
+            {'Lunch', 'Vegan'},
+        )
+
     def test_create_recipe_with_new_ingredients(self):
         """Test creating recipe with new ingredients"""
         payload = {
@@ -388,6 +445,44 @@ class PrivateRecipeAPITests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(recipe.ingredients.count(), 0)
 
+    def test_create_recipe_ingredient_queries_are_batched(self):
+        """Test creating nested items costs the same for 5 or 30 names"""
+        def post_recipe(count):
+            payload = {
+                'title': f'Recipe with {count} ingredients',
+                'time_minutes': 30,
+                'price': Decimal('2.50'),
+                'tags': [{'name': f'Tag {count}'}],
+                'ingredients': [
+                    {'name': f'Ing {count}-{i}'} for i in range(count)
+                ],
+            }
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.post(RECIPES_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            return len(queries)
+
+        self.assertEqual(post_recipe(5), post_recipe(30))
+        self.assertEqual(
+            Ingredient.objects.filter(user=self.user).count(),
+            35,
+        )
+
+    def test_create_recipe_with_repeated_names(self):
+        """Test repeated names in a payload create a single item"""
+        payload = {
+            'title': 'Salted caramel',
+            'time_minutes': 30,
+            'price': Decimal('2.50'),
+            'ingredients': [{'name': 'Salt'}, {'name': 'Salt'}],
+        }
+        res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(recipe.ingredients.count(), 1)
+        self.assertEqual(Ingredient.objects.filter(name='Salt').count(), 1)
+
     def test_filter_by_tags(self):
         """test for filter by tags"""
         r1 = create_recipe(user=self.user, title="Thai curry")
@@ -428,6 +523,159 @@ class PrivateRecipeAPITests(TestCase):
         self.assertIn(s2.data, res.data)
         self.assertNotIn(s3.data, res.data)
 
+    def test_filter_by_tags_any_returns_each_recipe_once(self):
+        """test a recipe matching several tags is listed once"""
+        recipe = create_recipe(user=self.user)
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Dinner')
+        recipe.tags.add(tag1, tag2)
+
+        res = self.client.get(RECIPES_URL, {'tags': f'{tag1.id},{tag2.id}'})
+
+        self.assertEqual(len(res.data), 1)
+        self.assertEqual(res.data[0]['id'], recipe.id)
+
+    def test_filter_by_tags_all(self):
+        """test filtering recipes that have all of the tags"""
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Dinner')
+        r1 = create_recipe(user=self.user, title='Dal')
+        r1.tags.add(tag1, tag2)
+        r2 = create_recipe(user=self.user, title='Salad')
+        r2.tags.add(tag1)
+
+        params = {'tags': f'{tag1.id},{tag2.id}', 'tags_mode': 'all'}
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['id'] for r in res.data], [r1.id])
+
+    def test_filter_by_ingredients_all(self):
+        """test filtering recipes that have all of the ingredients"""
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        oil = Ingredient.objects.create(user=self.user, name='Oil')
+        r1 = create_recipe(user=self.user, title='Fries')
+        r1.ingredients.add(salt, oil)
+        r2 = create_recipe(user=self.user, title='Brine')
+        r2.ingredients.add(salt)
+
+        params = {
+            'ingredients': f'{salt.id},{oil.id}',
+            'ingredients_mode': 'all',
+        }
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual([r['id'] for r in res.data], [r1.id])
+
+    def test_filter_invalid_mode(self):
+        """test an unknown match mode is rejected"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+
+        params = {'tags': f'{tag.id}', 'tags_mode': 'some'}
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_recipes(self):
+        """Test searching recipes by title and description"""
+        r1 = create_recipe(user=self.user, title='Smoky chili')
+        r2 = create_recipe(
+            user=self.user,
+            title='Bean stew',
+            description='A smoky and rich stew',
+        )
+        create_recipe(user=self.user, title='Green salad')
+        create_recipe(user=create_user(email='other@example.com'),
+                      title='Smoky ribs')
+
+        res = self.client.get(RECIPES_URL, {'search': 'smoky'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            sorted(r['id'] for r in res.data), sorted([r1.id, r2.id])
+        )
+
+    def test_search_combines_with_filters_and_paging(self):
+        """Test search works with tag filters and cursor pagination"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        tagged = []
+        for i in range(3):
+            recipe = create_recipe(user=self.user, title=f'Smoky {i}')
+            recipe.tags.add(tag)
+            tagged.append(recipe.id)
+        create_recipe(user=self.user, title='Smoky untagged')
+
+        params = {'search': 'smoky', 'tags': tag.id, 'page_size': 2}
+        first = self.client.get(RECIPES_URL, params)
+        second = self.client.get(first.data['next'])
+
+        ids = [r['id'] for r in first.data['results'] + second.data['results']]
+        self.assertEqual(sorted(ids), sorted(tagged))
+        self.assertIsNone(second.data['next'])
+
+    def test_postgres_search_uses_search_vector(self):
+        """Test PostgreSQL search matches and ranks on the stored vector"""
+        pg = PostgresDatabaseWrapper({
+            **connection.settings_dict,
+            'ENGINE': 'django.db.backends.postgresql',
+        })
+        with patch.object(filters, 'connections', {'default': pg}):
+            queryset = filters.search_recipes(Recipe.objects.all(), 'chili')
+        sql, params = queryset.query.get_compiler(connection=pg).as_sql()
+
+        self.assertIn('"search_vector" @@ websearch_to_tsquery', sql)
+        self.assertIn('ts_rank', sql)
+        self.assertIn('chili', params)
+
+    def _create_recipes_with_relations(self, count):
+        """Create recipes that each have their own tags and ingredients"""
+        start = Recipe.objects.count()
+        for i in range(start, start + count):
+            recipe = create_recipe(user=self.user, title=f'Recipe {i}')
+            recipe.tags.add(
+                Tag.objects.create(user=self.user, name=f'Tag {i}')
+            )
+            recipe.ingredients.add(
+                Ingredient.objects.create(user=self.user, name=f'Ing {i}')
+            )
+
+    def test_list_query_count_is_constant(self):
+        """Test listing recipes does not run queries per recipe"""
+        self._create_recipes_with_relations(1)
+        with self.assertNumQueries(4):
+            res = self.client.get(RECIPES_URL)
+        self.assertEqual(len(res.data), 1)
+
+        self._create_recipes_with_relations(10)
+        with self.assertNumQueries(4):
+            res = self.client.get(RECIPES_URL)
+        self.assertEqual(len(res.data), 11)
+
+    def test_filtered_list_query_count_is_constant(self):
+        """Test filtering recipes does not run queries per recipe"""
+        self._create_recipes_with_relations(10)
+        tag_ids = ','.join(
+            str(tag_id) for tag_id in Tag.objects.values_list('id', flat=True)
+        )
+
+        with self.assertNumQueries(4):
+            res = self.client.get(RECIPES_URL, {'tags': tag_ids})
+        self.assertEqual(len(res.data), 10)
+
+    def test_detail_query_count(self):
+        """Test retrieving a recipe prefetches its tags and ingredients"""
+        recipe = create_recipe(user=self.user)
+        for i in range(5):
+            recipe.tags.add(Tag.objects.create(user=self.user, name=f'T{i}'))
+            recipe.ingredients.add(
+                Ingredient.objects.create(user=self.user, name=f'I{i}')
+            )
+
+        with self.assertNumQueries(4):
+            res = self.client.get(detail_url(recipe.id))
+        self.assertEqual(len(res.data['tags']), 5)
+        self.assertEqual(len(res.data['ingredients']), 5)
+
 
 class ImageUploadTests(TestCase):
     """Tests for the image upload API"""
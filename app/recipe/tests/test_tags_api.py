@@ -2,8 +2,15 @@
 Tests for Tags APIs
 """
 from decimal import Decimal
+from unittest.mock import patch
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db.backends.postgresql.base import DatabaseWrapper
+from django.db.models import QuerySet
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+)
 from django.urls import reverse
 
 from rest_framework import status
@@ -14,9 +21,11 @@ from core.models import (
     Recipe,
 )
 
+from recipe.filters import filter_name_prefix
 from recipe.serializers import TagSerializer
 
 TAGS_URL = reverse('recipe:tag-list')
+AUTOCOMPLETE_URL = reverse('recipe:tag-autocomplete')
 
 
 def detail_url(tag_id):
@@ -93,6 +102,48 @@ class PrivateTagsAPITests(TestCase):
         self.assertEqual(tag.name, payload['name'])
         self.assertEqual(tag.user, self.user)
 
+    def test_update_tag_duplicate_name(self):
+        """Test renaming a tag to an existing name is rejected"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        tag = Tag.objects.create(user=self.user, name='Dessert')
+
+        res = self.client.patch(detail_url(tag.id), {'name': 'Vegan'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'Dessert')
+
+    def test_update_tag_duplicate_name_assigned_only(self):
+        """Test the duplicate check ignores the assigned_only filter"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        tag = Tag.objects.create(user=self.user, name='Dessert')
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='Cake',
+            time_minutes=30,
+            price=Decimal('4.00'),
+        )
+        recipe.tags.add(tag)
+
+        res = self.client.patch(
+            f'{detail_url(tag.id)}?assigned_only=1', {'name': 'Vegan'},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('name', res.data)
+
+    def test_update_tag_duplicate_name_race(self):
+        """Test a rename losing a race to the same name is a 400"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        tag = Tag.objects.create(user=self.user, name='Dessert')
+
+        with patch.object(QuerySet, 'exists', return_value=False):
+            res = self.client.patch(detail_url(tag.id), {'name': 'Vegan'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'Dessert')
+
     def test_tag_recipe(self):
         """deleting tag successful"""
         tag = Tag.objects.create(user=self.user, name='Breakfast')
@@ -144,3 +195,97 @@ class PrivateTagsAPITests(TestCase):
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
         self.assertEqual(len(res.data), 1)
+
+    def test_list_tags_with_counts(self):
+        """Test listing tags with the number of recipes using each"""
+        item1 = Tag.objects.create(user=self.user, name='First')
+        item2 = Tag.objects.create(user=self.user, name='Second')
+        for title in ['Pongal', 'Khichdi']:
+            recipe = Recipe.objects.create(
+                title=title,
+                time_minutes=5,
+                price=Decimal('4.50'),
+                user=self.user,
+            )
+            recipe.tags.add(item1)
+
+        with self.assertNumQueries(2):
+            res = self.client.get(TAGS_URL, {'with_counts': 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        counts = {row['id']: row['recipe_count'] for row in res.data}
+        self.assertEqual(counts, {item1.id: 2, item2.id: 0})
+
+    def test_assigned_only_with_counts(self):
+        """Test assigned_only and with_counts can be combined"""
+        item1 = Tag.objects.create(user=self.user, name='First')
+        Tag.objects.create(user=self.user, name='Second')
+        recipe = Recipe.objects.create(
+            title='Pongal',
+            time_minutes=5,
+            price=Decimal('4.50'),
+            user=self.user,
+        )
+        recipe.tags.add(item1)
+
+        params = {'assigned_only': 1, 'with_counts': 1}
+        res = self.client.get(TAGS_URL, params)
+
+        self.assertEqual(len(res.data), 1)
+        self.assertEqual(res.data[0]['id'], item1.id)
+        self.assertEqual(res.data[0]['recipe_count'], 1)
+
+    def test_autocomplete_tags(self):
+        """Test autocomplete returns the user's tags starting with prefix"""
+        for name in ['Vegan', 'vegetarian', 'Dessert', 'Vegetable soup']:
+            Tag.objects.create(user=self.user, name=name)
+        Tag.objects.create(user=create_user(email='o@example.com'),
+                           name='Vegan')
+
+        res = self.client.get(AUTOCOMPLETE_URL, {'prefix': 'veg', 'limit': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [tag['name'] for tag in res.data], ['Vegan', 'Vegetable soup'],
+        )
+
+    def test_autocomplete_treats_prefix_literally(self):
+        """Test LIKE wildcards in the prefix are matched literally"""
+        Tag.objects.create(user=self.user, name='50% off')
+        Tag.objects.create(user=self.user, name='500 calories')
+
+        res = self.client.get(AUTOCOMPLETE_URL, {'prefix': '50%'})
+
+        self.assertEqual([tag['name'] for tag in res.data], ['50% off'])
+
+    def test_autocomplete_invalid_params(self):
+        """Test a missing prefix or bad limit is rejected"""
+        for params in [{}, {'prefix': ' '},
+                       {'prefix': 'a', 'limit': 0},
+                       {'prefix': 'a', 'limit': 'many'}]:
+            res = self.client.get(AUTOCOMPLETE_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AutocompleteQueryTests(SimpleTestCase):
+    """Test the PostgreSQL autocomplete query matches its index"""
+
+    def test_filters_and_sorts_on_indexed_expression(self):
+        """Test LIKE and ORDER BY both use UPPER(name) COLLATE "C" """
+        postgres = DatabaseWrapper({
+            'NAME': 'recipe', 'USER': '', 'PASSWORD': '', 'HOST': '',
+            'PORT': '', 'OPTIONS': {}, 'TIME_ZONE': None,
+            'CONN_MAX_AGE': 0, 'AUTOCOMMIT': True, 'ATOMIC_REQUESTS': False,
+        })
+        with patch('recipe.filters.connections', {'default': postgres}):
+            queryset = filter_name_prefix(
+                Tag.objects.filter(user_id=1), 'veg',
+            )[:10]
+
+        sql, _params = queryset.query.get_compiler(
+            connection=postgres,
+        ).as_sql()
+        key = '(UPPER("core_tag"."name") COLLATE "C")'
+        self.assertIn(f'{key}::text LIKE', sql)
+        self.assertIn(f'ORDER BY {key} ASC, "core_tag"."id" ASC', sql)
@@ -0,0 +1,161 @@
+"""
+Tests for bounded image upload handling
+"""
+import shutil
+import tempfile
+from io import BytesIO
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from recipe.uploads import sniff_format
+
+
+def image_upload_url(recipe_id):
+    return reverse('recipe:recipe-upload-image', args=[recipe_id])
+
+
+def encode(size=(10, 10), image_format='JPEG'):
+    buffer = BytesIO()
+    Image.new('RGB', size).save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def detail_url(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def upload_file(content, name='photo.jpg'):
+    file = BytesIO(content)
+    file.name = name
+    return file
+
+
+class SniffFormatTests(SimpleTestCase):
+    """Test image signatures are recognised from the first bytes"""
+
+    def test_known_formats(self):
+        for image_format in ('JPEG', 'PNG', 'GIF', 'WEBP'):
+            with self.subTest(image_format=image_format):
+                header = encode(image_format=image_format)[:12]
+                self.assertEqual(sniff_format(header), image_format.lower())
+
+    def test_unknown_format(self):
+        self.assertIsNone(sniff_format(b'%PDF-1.7\n%\xe2\xe3'))
+        self.assertIsNone(sniff_format(b''))
+
+
+class ImageUploadValidationTests(TestCase):
+    """Test uploads are checked before and while they are decoded"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=5,
+            price='5.00',
+        )
+
+    def upload(self, content, name='photo.jpg'):
+        return self.client.post(
+            image_upload_url(self.recipe.id),
+            {'image': upload_file(content, name)},
+            format='multipart',
+        )
+
+    def assertNoImage(self):
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    def test_upload_valid_image(self):
+        """Test a valid PNG is accepted"""
+        res = self.upload(encode(image_format='PNG'), name='photo.png')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        self.assertTrue(self.recipe.image)
+
+    def test_upload_wrong_signature(self):
+        """Test a file without an image signature is rejected"""
+        res = self.upload(b'%PDF-1.7\n' + b'0' * 1000)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', res.data)
+        self.assertNoImage()
+
+    def test_upload_tiny_file(self):
+        """Test a file shorter than any signature is rejected"""
+        res = self.upload(b'\xff\xd8')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertNoImage()
+
+    def test_upload_too_large(self):
+        """Test a body over the byte limit is rejected with 413"""
+        content = encode(size=(300, 300))
+        limits = {'MAX_BYTES': 100, 'MAX_PIXELS': 10 ** 6, 'DRAFT_SIZE': 64}
+
+        with override_settings(IMAGE_UPLOAD=limits):
+            res = self.upload(content)
+
+        self.assertEqual(
+            res.status_code,
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        )
+        self.assertNoImage()
+
+    def test_upload_too_many_pixels(self):
+        """Test an image over the pixel limit is rejected"""
+        limits = {'MAX_BYTES': 10 ** 6, 'MAX_PIXELS': 50 * 50,
+                  'DRAFT_SIZE': 64}
+
+        with override_settings(IMAGE_UPLOAD=limits):
+            res = self.upload(encode(size=(51, 50)))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', res.data)
+        self.assertNoImage()
+
+    def test_upload_truncated_image(self):
+        """Test an image whose data is cut short is rejected"""
+        content = encode(size=(200, 200))
+
+        res = self.upload(content[:len(content) // 2])
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertNoImage()
+
+    def test_detail_rejects_image(self):
+        """Test images cannot be written through the recipe detail"""
+        url = detail_url(self.recipe.id)
+
+        for payload in ({'image': upload_file(encode())},
+                        {'image': 'photo.jpg'}):
+            res = self.client.patch(url, payload, format='multipart')
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('image', res.data)
+        self.assertNoImage()
@@ -0,0 +1,180 @@
+"""bounded memory handling of recipe image uploads
+
+Upload bodies are streamed to a temporary file in chunks instead of being
+held in memory. The declared and received sizes are checked against
+IMAGE_UPLOAD['MAX_BYTES'] while the body streams in, and the first bytes
+of the file must carry a known image signature before anything decodes
+it. The image is then decoded under a pixel limit, and JPEGs are decoded
+in draft mode at a reduced scale, so one huge photo cannot spike the
+worker's memory. The file is hashed as it streams in, ready for the
+content-addressed image storage.
+
+Every other recipe endpoint parses multipart bodies with
+FieldsOnlyMultiPartParser, which refuses file parts before any of their
+data is stored.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.files.uploadhandler import (
+    FileUploadHandler,
+    TemporaryFileUploadHandler,
+)
+from django.utils.translation import gettext_lazy as _
+
+from PIL import Image
+
+from rest_framework import status
+from rest_framework.exceptions import (
+    APIException,
+    ValidationError,
+)
+from rest_framework.parsers import MultiPartParser
+
+
+# Room for the multipart boundaries and headers around the file itself
+FORM_OVERHEAD = 64 * 1024
+
+SIGNATURES = {
+    'jpeg': (b'\xff\xd8\xff',),
+    'png': (b'\x89PNG\r\n\x1a\n',),
+    'gif': (b'GIF87a', b'GIF89a'),
+}
+HEADER_SIZE = 12
+
+
+class ImageTooLarge(APIException):
+    """Raised when an upload is bigger than IMAGE_UPLOAD['MAX_BYTES']"""
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = _('The uploaded image is too large.')
+    default_code = 'image_too_large'
+
+
+def sniff_format(header):
+    """Return the image format named by a file's first bytes, or None"""
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp'
+    for image_format, signatures in SIGNATURES.items():
+        if header.startswith(signatures):
+            return image_format
+    return None
+
+
+class BoundedImageUploadHandler(TemporaryFileUploadHandler):
+    """Stream uploads to disk, rejecting oversized or non-image files"""
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_bytes = settings.IMAGE_UPLOAD['MAX_BYTES']
+
+    def _too_large(self):
+        if getattr(self, 'file', None) is not None:
+            self.file.close()
+        raise ImageTooLarge(
+            _('Images may be at most %(size)d bytes.')
+            % {'size': self.max_bytes}
+        )
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        if content_length and \
+                content_length > self.max_bytes + FORM_OVERHEAD:
+            self._too_large()
+
+    def new_file(self, field_name, file_name, content_type,
+                 content_length=None, *args, **kwargs):
+        if content_length and content_length > self.max_bytes:
+            self._too_large()
+        super().new_file(
+            field_name, file_name, content_type, content_length,
+            *args, **kwargs,
+        )
+        self.received = 0
+        self.header = b''
+        self.digest = hashlib.sha256()
+
+    def _check_header(self):
+        if sniff_format(self.header) is None:
+            self.file.close()
+            raise ValidationError({'image': [_(
+                'Upload a valid image. The file is not a JPEG, PNG, GIF '
+                'or WebP image.'
+            )]})
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_bytes:
+            self._too_large()
+
+        if len(self.header) < HEADER_SIZE:
+            self.header += raw_data[:HEADER_SIZE - len(self.header)]
+            if len(self.header) == HEADER_SIZE:
+                self._check_header()
+
+        self.digest.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        if len(self.header) < HEADER_SIZE:
+            self._check_header()
+        file = super().file_complete(file_size)
+        # Spares ContentAddressedStorage from reading the file again
+        file.content_hash = self.digest.hexdigest()
+        return file
+
+
+class ImageUploadParser(MultiPartParser):
+    """Multipart parser that only uses BoundedImageUploadHandler"""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']
+        request.upload_handlers = [BoundedImageUploadHandler(request)]
+        return super().parse(stream, media_type, parser_context)
+
+
+class NoFileUploadHandler(FileUploadHandler):
+    """Reject any file part of a multipart body"""
+
+    def new_file(self, field_name, *args, **kwargs):
+        raise ValidationError({field_name: [_(
+            'Upload images with the upload-image action.'
+        )]})
+
+    def receive_data_chunk(self, raw_data, start):
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+class FieldsOnlyMultiPartParser(MultiPartParser):
+    """Multipart parser for form fields that accepts no files"""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']
+        request.upload_handlers = [NoFileUploadHandler(request)]
+        return super().parse(stream, media_type, parser_context)
+
+
+def check_image(file):
+    """Decode an uploaded image within the configured pixel limit.
+
+    Only the header is read before the pixel count is checked. JPEGs are
+    then decoded in draft mode, close to DRAFT_SIZE, which is enough to
+    catch truncated or corrupt data at a fraction of the memory.
+    """
+    options = settings.IMAGE_UPLOAD
+    file.seek(0)
+    try:
+        with Image.open(file) as image:
+            width, height = image.size
+            if width * height > options['MAX_PIXELS']:
+                raise ValidationError(_(
+                    'Images may have at most %(pixels)d pixels.'
+                ) % {'pixels': options['MAX_PIXELS']})
+            image.draft('RGB', (options['DRAFT_SIZE'],) * 2)
+            image.load()
+    except (OSError, SyntaxError, Image.DecompressionBombError):
+        raise ValidationError(_('Upload a valid image.'))
+    finally:
+        file.seek(0)
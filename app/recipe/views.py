@@ -1,4 +1,6 @@
 """views for recipe api"""
+import codecs
+
 from drf_spectacular.utils import (
     extend_schema_view,
     extend_schema,
@@ -6,6 +8,16 @@ from drf_spectacular.utils import (
     OpenApiTypes,
 )
 
+from django.db import (
+    IntegrityError,
+    transaction,
+)
+from django.http import (
+    Http404,
+    StreamingHttpResponse,
+)
+from django.utils import timezone
+
 from rest_framework import (
     viewsets,
     mixins,
@@ -13,61 +25,176 @@ from rest_framework import (
 )
 
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import (
+    FormParser,
+    JSONParser,
+)
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
+from core.authentication import CachedTokenAuthentication
 from core.models import (
     Recipe,
     Tag,
     Ingredient,
 )
-from recipe import serializers
+from recipe import (
+    export,
+    filters,
+    images,
+    media,
+    serializers,
+)
+from recipe.importer import (
+    RecipeImporter,
+    iter_records,
+)
+from recipe.mixins import (
+    BulkMixin,
+    CachedListMixin,
+    ReplicaReadMixin,
+    CachedRetrieveMixin,
+)
+from recipe.pagination import KeysetPagination
+from recipe.uploads import (
+    FieldsOnlyMultiPartParser,
+    ImageUploadParser,
+)
+
+
+RECIPE_FILTER_PARAMETERS = [
+    OpenApiParameter(
+        'tags',
+        OpenApiTypes.STR,
+        description='Comma separated list of IDs to filter',
+    ),
+    OpenApiParameter(
+        'tags_mode',
+        OpenApiTypes.STR, enum=list(filters.MATCH_MODES),
+        description='Match any (default) or all of the tags',
+    ),
+    OpenApiParameter(
+        'ingredients',
+        OpenApiTypes.STR,
+        description='Comma separated list of IDs to filter',
+    ),
+    OpenApiParameter(
+        'ingredients_mode',
+        OpenApiTypes.STR, enum=list(filters.MATCH_MODES),
+        description='Match any (default) or all of the ingredients',
+    ),
+    OpenApiParameter(
+        'search',
+        OpenApiTypes.STR,
+        description='Search titles and descriptions, best first',
+    ),
+]
 
 
 @extend_schema_view(
-    list=extend_schema(
-        parameters=[
+    list=extend_schema(parameters=RECIPE_FILTER_PARAMETERS),
+    export=extend_schema(
+        parameters=RECIPE_FILTER_PARAMETERS + [
             OpenApiParameter(
-                'tags',
-                OpenApiTypes.STR,
-                description='Comma separated list of IDs to filter',
+                'export_format',
+                OpenApiTypes.STR, enum=list(export.FORMATS),
+                description='Export as NDJSON (default) or CSV',
             ),
-            OpenApiParameter(
-                'ingredients',
-                OpenApiTypes.STR,
-                description='Comma separated list of IDs to filter',
-            )
-        ]
-    )
+        ],
+        responses={200: OpenApiTypes.BINARY},
+    ),
+    import_recipes=extend_schema(
+        description=(
+            'Create recipes from a JSON array or newline delimited JSON. '
+            'Invalid rows are skipped and listed in the report.'
+        ),
+        request={
+            'application/json': OpenApiTypes.BINARY,
+            'application/x-ndjson': OpenApiTypes.BINARY,
+        },
+        responses={200: OpenApiTypes.OBJECT},
+    ),
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ReplicaReadMixin,
+                    BulkMixin,
+                    CachedListMixin,
+                    CachedRetrieveMixin,
+                    viewsets.ModelViewSet):
     """view for manage recipe apis"""
     serializer_class = serializers.RecipeDetailSerializer
     queryset = Recipe.objects.all()
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    # Files are only accepted by upload-image, through ImageUploadParser
+    parser_classes = [JSONParser, FormParser, FieldsOnlyMultiPartParser]
+    export_chunk_size = 500
+    import_chunk_size = 500
 
     def _params_to_ints(self, qs):
         """Convert a list of strings to integers"""
         return [int(str_id) for str_id in qs.split(',')]
 
+    def _get_match_mode(self, param):
+        """Return the any/all match mode requested for a filter"""
+        mode = self.request.query_params.get(param, filters.MATCH_ANY)
+        if mode not in filters.MATCH_MODES:
+            raise ValidationError(
+                {param: f'Must be one of: {", ".join(filters.MATCH_MODES)}'}
+            )
+
+        return mode
+
     def get_queryset(self):
         """Fetch recipes for authenticated users"""
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
         queryset = self.queryset
         if tags:
-            tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
+            queryset = filters.filter_recipes_by_related(
+                queryset,
+                'tags',
+                self._params_to_ints(tags),
+                self._get_match_mode('tags_mode'),
+            )
 
         if ingredients:
-            ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+            queryset = filters.filter_recipes_by_related(
+                queryset,
+                'ingredients',
+                self._params_to_ints(ingredients),
+                self._get_match_mode('ingredients_mode'),
+            )
 
-        return queryset.filter(
-            user=self.request.user
-        ).order_by('-id').distinct()
+        queryset = queryset.filter(user=self.request.user)
+        search = self.request.query_params.get('search')
+        if search:
+            queryset = filters.search_recipes(
+                queryset, search,
+            ).order_by('-search_rank', '-id')
+        else:
+            queryset = queryset.order_by('-id')
+
+        return self._apply_query_plan(queryset)
+
+    def _apply_query_plan(self, queryset):
+        """Load the related rows the action's serializer needs up front"""
+        if self.action == 'list':
+            return queryset.defer(
+                'description',
+                'image',
+                'image_derivatives',
+                'search_vector',
+            ).prefetch_related('tags', 'ingredients')
+        elif self.action == 'serve_media':
+            return queryset.only('id', 'user_id', 'image', 'image_derivatives')
+        elif self.action in ('retrieve', 'update', 'partial_update', 'bulk'):
+            return queryset.defer(
+                'search_vector',
+            ).prefetch_related('tags', 'ingredients')
+
+        return queryset
 
     def get_serializer_class(self):
         """Return the serializer class for request"""
@@ -82,14 +209,173 @@ class RecipeViewSet(viewsets.ModelViewSet):
         '''Create a new recipe'''
         serializer.save(user=self.request.user)
 
-    @action(methods=['POST'], detail=True, url_path='upload-image')
+    def get_bulk_serializer_class(self):
+        return serializers.RecipeImportSerializer
+
+    def get_bulk_queryset(self):
+        return self._apply_query_plan(super().get_bulk_queryset())
+
+    def perform_bulk_create(self, validated_data):
+        """Insert recipes with one bulk insert per table"""
+        return RecipeImporter(self.request.user).create(validated_data)
+
+    def perform_bulk_update(self, updates):
+        """Save field changes with bulk_update and update the links of
+        recipes whose tags or ingredients were sent by set difference"""
+        now = timezone.now()
+        fields = {'updated_at'}
+        links = {'tags': {}, 'ingredients': {}}
+        for recipe, data in updates:
+            for field, value in data.items():
+                if field in links:
+                    links[field][recipe.id] = [item['name'] for item in value]
+                else:
+                    setattr(recipe, field, value)
+                    fields.add(field)
+            recipe.updated_at = now
+
+        Recipe.objects.bulk_update(
+            [recipe for recipe, _data in updates],
+            sorted(fields),
+        )
+
+        for model, relation in ((Tag, 'tags'), (Ingredient, 'ingredients')):
+            names_by_recipe = links[relation]
+            if not names_by_recipe:
+                continue
+
+            found = serializers.get_or_create_by_name(
+                model,
+                self.request.user,
+                list(dict.fromkeys(
+                    name
+                    for names in names_by_recipe.values()
+                    for name in names
+                )),
+            )
+            field = Recipe._meta.get_field(relation)
+            through = field.remote_field.through
+            column = f'{field.m2m_reverse_field_name()}_id'
+            wanted = list(dict.fromkeys(
+                (recipe_id, found[name].id)
+                for recipe_id, names in names_by_recipe.items()
+                for name in names
+            ))
+            existing = {
+                (recipe_id, item_id): link_id
+                for link_id, recipe_id, item_id in through.objects.filter(
+                    recipe_id__in=names_by_recipe,
+                ).values_list('id', 'recipe_id', column)
+            }
+            removed = existing.keys() - set(wanted)
+            if removed:
+                through.objects.filter(
+                    id__in=[existing[pair] for pair in removed],
+                ).delete()
+            added = [pair for pair in wanted if pair not in existing]
+            if added:
+                through.objects.bulk_create([
+                    through(recipe_id=recipe_id, **{column: item_id})
+                    for recipe_id, item_id in added
+                ])
+
+    @action(methods=['GET'], detail=False)
+    def export(self, request):
+        """Stream every matching recipe as NDJSON or CSV"""
+        export_format = request.query_params.get(
+            'export_format', export.NDJSON,
+        )
+        if export_format not in export.FORMATS:
+            raise ValidationError({
+                'export_format':
+                    f'Must be one of: {", ".join(export.FORMATS)}',
+            })
+
+        # Pick the database now: the response body is generated after
+        # the view returns, outside the replica routing context.
+        queryset = self.get_queryset()
+        queryset = queryset.using(queryset.db)
+        recipes = export.iter_recipes(
+            queryset,
+            lambda recipe_id, name: media.media_url(recipe_id, name, request),
+            self.export_chunk_size,
+        )
+
+        content_type, filename = export.FORMATS[export_format]
+        response = StreamingHttpResponse(
+            export.stream(export_format, recipes),
+            content_type=content_type,
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    @action(methods=['POST'], detail=False, url_path='import')
+    def import_recipes(self, request):
+        """Create recipes from a JSON array or NDJSON request body"""
+        if request.stream is None:
+            raise ValidationError({'detail': 'The request body is empty.'})
+
+        importer = RecipeImporter(
+            request.user,
+            chunk_size=self.import_chunk_size,
+        )
+        stream = codecs.getreader('utf-8')(request.stream)
+        try:
+            report = importer.run(iter_records(stream))
+        except UnicodeDecodeError:
+            raise ValidationError(
+                {'detail': 'The request body must be UTF-8 encoded.'}
+            )
+
+        return Response(report, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'name',
+                OpenApiTypes.STR,
+                OpenApiParameter.PATH,
+                description='Stored name of the image or a derivative',
+            ),
+        ],
+        responses={(200, 'application/octet-stream'): OpenApiTypes.BINARY},
+    )
+    @action(
+        methods=['GET'],
+        detail=True,
+        url_path='media/(?P<name>.+)',
+        url_name='media',
+    )
+    def serve_media(self, request, pk=None, name=None):
+        """Send one of the recipe's stored image files"""
+        recipe = self.get_object()
+        if name not in media.media_names(recipe):
+            raise Http404
+        return media.serve(recipe.image.storage, name)
+
+    @action(
+        methods=['POST'],
+        detail=True,
+        url_path='upload-image',
+        parser_classes=[ImageUploadParser],
+    )
     def upload_image(self, request, pk=None):
         """upload an image to recipe"""
         recipe = self.get_object()
         serializer = self.get_serializer(recipe, data=request.data)
 
         if serializer.is_valid():
-            serializer.save()
+            source = recipe.image.name
+            with transaction.atomic():
+                recipe = serializer.save()
+                # Uploading the same file again keeps its resized copies
+                if recipe.image.name != source:
+                    recipe.image_derivatives = {}
+                    recipe.save(
+                        update_fields=['image_derivatives', 'updated_at'],
+                    )
+                    images.enqueue(recipe)
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -102,39 +388,197 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 'assigned_only',
                 OpenApiTypes.INT, enum=[0, 1],
                 description='Filter by items assigned to recipes',
-            )
+            ),
+            OpenApiParameter(
+                'with_counts',
+                OpenApiTypes.INT, enum=[0, 1],
+                description='Include how many recipes use each item',
+            ),
         ]
-    )
+    ),
+    autocomplete=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'prefix',
+                OpenApiTypes.STR, required=True,
+                description='Case-insensitive start of the name',
+            ),
+            OpenApiParameter(
+                'limit',
+                OpenApiTypes.INT,
+                description='Maximum number of matches, 10 by default',
+            ),
+        ]
+    ),
 )
-class BaseRecipeAttrViewSet(mixins.DestroyModelMixin,
+class BaseRecipeAttrViewSet(ReplicaReadMixin,
+                            BulkMixin,
+                            CachedListMixin,
+                            mixins.DestroyModelMixin,
                             mixins.UpdateModelMixin,
                             mixins.ListModelMixin,
                             viewsets.GenericViewSet):
     """Base viewset for recipe attributes"""
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    autocomplete_limit = 10
+    autocomplete_max_limit = 50
+
+    def _get_flag(self, param):
+        """Return a 0/1 query param as a bool"""
+        return bool(int(self.request.query_params.get(param, 0)))
+
+    def _with_counts(self):
+        """Check whether the list should include recipe counts"""
+        return self.action == 'list' and self._get_flag('with_counts')
 
     def get_queryset(self):
         """filter queryset for authenticated users"""
-        assigned_only = bool(
-            int(self.request.query_params.get('assigned_only', 0))
-        )
         queryset = self.queryset
-        if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
+        if self._get_flag('assigned_only'):
+            queryset = filters.filter_assigned(
+                queryset,
+                self.recipe_relation,
+            )
+
+        if self._with_counts():
+            queryset = filters.annotate_recipe_counts(
+                queryset,
+                self.request.user,
+            )
 
         return queryset.filter(
             user=self.request.user
-        ).order_by('-name').distinct()
+        ).order_by('-name')
+
+    def perform_update(self, serializer):
+        """Reject renaming an item to a name the user already has"""
+        error = ValidationError({'name': 'This name is already in use.'})
+        name = serializer.validated_data.get('name')
+        duplicate = self.queryset.filter(
+            user=self.request.user,
+            name=name,
+        ).exclude(pk=serializer.instance.pk)
+        if name is not None and duplicate.exists():
+            raise error
+
+        # The unique constraint catches a rename racing this check
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError:
+            raise error
+
+    def _get_autocomplete_limit(self):
+        """Return the requested number of autocomplete matches"""
+        limit = self.request.query_params.get('limit')
+        if limit is None:
+            return self.autocomplete_limit
+
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= self.autocomplete_max_limit:
+            raise ValidationError({
+                'limit': f'Must be between 1 and '
+                         f'{self.autocomplete_max_limit}',
+            })
+
+        return limit
+
+    @action(methods=['GET'], detail=False)
+    def autocomplete(self, request):
+        """Return the first names starting with a prefix"""
+        prefix = request.query_params.get('prefix', '').strip()
+        if not prefix:
+            raise ValidationError({'prefix': 'This parameter is required.'})
+
+        queryset = filters.filter_name_prefix(
+            self.get_queryset(), prefix,
+        )[:self._get_autocomplete_limit()]
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+    def _name_errors(self, names, exclude_ids=()):
+        """Return per-name errors for repeated or already used names"""
+        taken = set(
+            self.queryset.filter(
+                user=self.request.user,
+                name__in=names,
+            ).exclude(id__in=exclude_ids).values_list('name', flat=True)
+        )
+
+        errors = []
+        seen = set()
+        for name in names:
+            if name is not None and (name in taken or name in seen):
+                errors.append({'name': ['This name is already in use.']})
+            else:
+                errors.append({})
+            seen.add(name)
+        return errors
+
+    def validate_bulk_create(self, validated_data):
+        return self._name_errors([data['name'] for data in validated_data])
+
+    def validate_bulk_update(self, updates):
+        return self._name_errors(
+            [data.get('name') for _obj, data in updates],
+            exclude_ids=[obj.id for obj, _data in updates],
+        )
+
+    def perform_bulk_create(self, validated_data):
+        """Insert the new items with one bulk insert"""
+        model = self.queryset.model
+        objects = model.objects.bulk_create([
+            model(user=self.request.user, **data) for data in validated_data
+        ])
+        if all(obj.id is not None for obj in objects):
+            return objects
+
+        by_name = {
+            obj.name: obj
+            for obj in model.objects.filter(
+                user=self.request.user,
+                name__in=[obj.name for obj in objects],
+            )
+        }
+        return [by_name[obj.name] for obj in objects]
+
+    def perform_bulk_update(self, updates):
+        """Save renames with a single bulk_update"""
+        now = timezone.now()
+        for obj, data in updates:
+            for field, value in data.items():
+                setattr(obj, field, value)
+            obj.updated_at = now
+
+        self.queryset.model.objects.bulk_update(
+            [obj for obj, _data in updates],
+            ['name', 'updated_at'],
+        )
+
+    def get_serializer_class(self):
+        """Return the serializer class for request"""
+        if self._with_counts():
+            return self.count_serializer_class
+
+        return self.serializer_class
 
 
 class TagViewSet(BaseRecipeAttrViewSet):
     """Manage tags in tha database"""
     serializer_class = serializers.TagSerializer
+    count_serializer_class = serializers.TagCountSerializer
     queryset = Tag.objects.all()
+    recipe_relation = 'tags'
 
 
 class IngredientViewSet(BaseRecipeAttrViewSet):
     """Manage ingredients in tha database"""
     serializer_class = serializers.IngredientsSerializer
+    count_serializer_class = serializers.IngredientCountSerializer
     queryset = Ingredient.objects.all()
+    recipe_relation = 'ingredients'
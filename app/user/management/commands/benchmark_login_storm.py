@@ -0,0 +1,99 @@
+"""
+Measure API latency for other endpoints while logins flood the server
+"""
+import json
+import threading
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from rest_framework.authtoken.models import Token
+
+from core.benchmark import (
+    LatencyRecorder,
+    format_report,
+    http_request,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Run against a live server: measure recipe and profile latency '
+        'alone, then again while many clients log in at once.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://localhost:8001')
+        parser.add_argument('--duration', type=float, default=15)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--logins', type=int, default=32)
+
+    def _loop(self, stop, recorder, name, method, url, body, headers):
+        """Send one request after another until stop is set"""
+        while not stop.is_set():
+            status, elapsed = http_request(method, url, body, headers)
+            recorder.record(name, status, elapsed)
+
+    def _run_phase(self, label, options, workers):
+        """Run the workers for the configured duration and print a report"""
+        stop = threading.Event()
+        recorder = LatencyRecorder()
+        threads = [
+            threading.Thread(
+                target=self._loop,
+                args=(stop, recorder) + worker,
+                daemon=True,
+            )
+            for worker in workers
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(options['duration'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        self.stdout.write(format_report(recorder.report(options['duration'])))
+
+    def handle(self, *args, **options):
+        base_url = options['base_url'].rstrip('/')
+        email = f'login-storm-{uuid.uuid4().hex}@example.com'
+        password = uuid.uuid4().hex
+        user = get_user_model().objects.create_user(
+            email=email,
+            password=password,
+        )
+        token = Token.objects.create(user=user)
+        auth = {'Authorization': f'Token {token.key}'}
+
+        readers = []
+        for index in range(options['readers']):
+            if index % 2:
+                readers.append((
+                    'GET /api/user/me/', 'GET',
+                    f'{base_url}/api/user/me/', None, auth,
+                ))
+            else:
+                readers.append((
+                    'GET /api/recipe/recipes/', 'GET',
+                    f'{base_url}/api/recipe/recipes/', None, auth,
+                ))
+        login = (
+            'POST /api/user/token/', 'POST',
+            f'{base_url}/api/user/token/',
+            json.dumps({'email': email, 'password': password}).encode(),
+            {'Content-Type': 'application/json'},
+        )
+
+        try:
+            self._run_phase('Baseline', options, readers)
+            self._run_phase(
+                'During login storm',
+                options,
+                readers + [login] * options['logins'],
+            )
+        finally:
+            user.delete()
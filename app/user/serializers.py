@@ -7,8 +7,11 @@ from django.utils.translation import gettext as _
 
 from rest_framework import serializers
 
+from core.profiling import ProfiledSerializerMixin
 
-class UserSerializer(serializers.ModelSerializer):
+
+class UserSerializer(ProfiledSerializerMixin,
+                     serializers.ModelSerializer):
     """serializer for user objects"""
 
     class Meta:
@@ -32,7 +35,8 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 
-class AuthTokenSerializer(serializers.Serializer):
+class AuthTokenSerializer(ProfiledSerializerMixin,
+                          serializers.Serializer):
     """serializer for user auth token"""
     email = serializers.EmailField()
     password = serializers.CharField(
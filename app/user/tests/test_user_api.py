@@ -5,9 +5,12 @@ from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from core.authentication import clear_token_cache
+
 
 CREATE_USER_URL = reverse('user:create')
 TOKEN_URL = reverse('user:token')
@@ -150,3 +153,24 @@ class PrivateUserApiTests(TestCase):
         self.assertEqual(self.user.name, payload['name'])
         self.assertTrue(self.user.check_password(payload['password']))
         self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_update_with_cached_user(self):
+        """Test a PATCH through a stale cached user keeps newer changes"""
+        clear_token_cache()
+        self.addCleanup(clear_token_cache)
+        token = Token.objects.create(user=self.user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        client.get(ME_URL)
+        # Changed by another process, so this process' cache is not told
+        self.user.set_password('changed123')
+        get_user_model().objects.filter(pk=self.user.pk).update(
+            password=self.user.password,
+        )
+
+        res = client.patch(ME_URL, {'name': 'New name'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.name, 'New name')
+        self.assertTrue(self.user.check_password('changed123'))
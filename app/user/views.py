@@ -2,33 +2,87 @@
 Views  for user API
 """
 
-from rest_framework import generics, authentication, permissions
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import generics, permissions, status
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.exceptions import APIException
 from rest_framework.settings import api_settings
 
+from core import hashing
+from core.authentication import CachedTokenAuthentication
 from user.serializers import (
     UserSerializer,
     AuthTokenSerializer,
 )
 
 
+class PasswordHashingUnavailable(APIException):
+    """Raised when every password hashing slot is in use"""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _('Too many sign-in requests, please retry shortly.')
+    default_code = 'password_hashing_busy'
+
+    def __init__(self, wait, detail=None, code=None):
+        super().__init__(detail, code)
+        # Sent as Retry-After by the DRF exception handler
+        self.wait = wait
+
+
+@contextmanager
+def password_hashing_slot():
+    """Hold a hashing slot, or answer 503 when all are taken"""
+    try:
+        with hashing.admission():
+            yield
+    except hashing.PasswordHashingBusy as busy:
+        raise PasswordHashingUnavailable(busy.wait)
+
+
 class CreateUserView(generics.CreateAPIView):
     """create new user in the system"""
     serializer_class = UserSerializer
 
+    def post(self, request, *args, **kwargs):
+        with password_hashing_slot():
+            return super().post(request, *args, **kwargs)
+
 
 class CreateTokenView(ObtainAuthToken):
     """create new auth token for user"""
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
+    def post(self, request, *args, **kwargs):
+        # The slot also covers rehashing an outdated password hash
+        with password_hashing_slot():
+            return super().post(request, *args, **kwargs)
+
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
     """Manage the authenticated user"""
     serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
-        """Retrieve and return the authenticated user"""
-        return self.request.user
+        """Retrieve and return the authenticated user.
+
+        request.user may come from the token cache and be up to a minute
+        old, so updates start from the current row instead of writing
+        back a stale password or is_active.
+        """
+        if self.request.method in permissions.SAFE_METHODS:
+            return self.request.user
+        return get_user_model().objects.get(pk=self.request.user.pk)
+
+    def update(self, request, *args, **kwargs):
+        """Update the user, holding a hashing slot to set a password"""
+        if 'password' not in request.data:
+            return super().update(request, *args, **kwargs)
+
+        with password_hashing_slot():
+            return super().update(request, *args, **kwargs)
@@ -5,9 +5,32 @@ server {
         alias /vol/static;
     }
 
+    # Uploaded media is only sent through X-Accel-Redirect from the app
+    location /static/media {
+        return 404;
+    }
+
+    location /protected-media/ {
+        internal;
+        alias /vol/static/media/;
+        sendfile on;
+        tcp_nopush on;
+    }
+
+    # Scraped from inside the deployment only
+    location = /metrics {
+        allow 127.0.0.1;
+        allow 10.0.0.0/8;
+        allow 172.16.0.0/12;
+        allow 192.168.0.0/16;
+        deny all;
+        uwsgi_pass           ${APP_HOST}:${APP_PORT};
+        include              /etc/nginx/uwsgi_params;
+    }
+
     location / {
         uwsgi_pass           ${APP_HOST}:${APP_PORT};
         include              /etc/nginx/uwsgi_params;
         client_max_body_size 10M;
     }
-}
\ No newline at end of file
+}
@@ -6,4 +6,11 @@ python manage.py wait_for_db
 python manage.py collectstatic --noinput
 python manage.py migrate
 
-uwsgi --socket :8001 --workers 4 --master --enable-threads --module app.wsgi
+# Each uWSGI worker writes its metrics to its own file in this directory,
+# see core/metrics.py. Files left by a previous run are stale.
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+uwsgi --socket :8001 --workers 4 --master --enable-threads --module app.wsgi \
+    --attach-daemon "python manage.py process_image_jobs"